@@ -0,0 +1,62 @@
+"""Micro-benchmark for split_long_message over large generated lessons.
+
+Usage: python bench_split.py [repeats]
+
+Checks that every part fits WhatsApp's limit and that time per character
+stays flat as lessons grow (the splitter should be linear).
+"""
+import os
+import random
+import sys
+import time
+
+# test.py refuses to import without Twilio credentials; dummy ones are enough here
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACbench")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "bench")
+os.environ.setdefault("TOGETHER_API_KEY", "bench")
+
+import test  # noqa: E402
+
+test.logger.disabled = True
+
+WORDS = ["python", "loop", "function", "variable", "class", "module", "🚀", "📚",
+         "exercise", "practice", "résumé", "naïve", "👩‍💻", "https://youtube.com/watch?v=abc"]
+
+
+def generate_lesson(sections, rng):
+    """Lesson-shaped text: headed sections of bullet lines, plus a few monsters"""
+    out = []
+    for i in range(sections):
+        lines = [f"🎯 SECTION {i}:"]
+        for _ in range(rng.randint(2, 8)):
+            sentence_count = rng.randint(1, 4)
+            sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 20))) + "."
+                         for _ in range(sentence_count)]
+            lines.append("• " + " ".join(sentences))
+        if i % 50 == 7:
+            # one long paragraph with no line breaks, and one with no sentence ends
+            lines.append(" ".join(rng.choice(WORDS) + "." for _ in range(600)))
+            lines.append("x" * 5000)
+        out.append("\n".join(lines))
+    return "\n\n".join(out)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    rng = random.Random(42)
+    print(f"{'sections':>9} {'chars':>10} {'parts':>7} {'best ms':>9} {'ns/char':>9}")
+    for sections in (10, 100, 1000, 10000):
+        lesson = generate_lesson(sections, rng)
+        best = float("inf")
+        for _ in range(repeats):
+            started = time.perf_counter()
+            parts = test.split_long_message(lesson)
+            best = min(best, time.perf_counter() - started)
+        longest = max(test.message_length(part) for part in parts)
+        assert longest <= test.WHATSAPP_MAX_LENGTH, f"part of {longest} units"
+        print(f"{sections:>9} {len(lesson):>10} {len(parts):>7} "
+              f"{best * 1000:>9.2f} {best * 1e9 / len(lesson):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Cold-start benchmark for the web process.
+
+Usage: python bench_startup.py [repeats]
+
+Times each dependency's import in a fresh interpreter, then times
+`import test` plus init_web() and lists which heavy dependencies the web
+process still loads at startup. Lazily loaded ones should be missing from
+that list.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+DEPENDENCIES = [
+    "flask",
+    "flask_wtf.csrf",
+    "dotenv",
+    "requests",
+    "apscheduler.events",
+    "apscheduler.schedulers.background",
+    "apscheduler.jobstores.sqlalchemy",
+    "sqlalchemy",
+    "twilio.rest",
+    "together",
+    "reportlab.pdfgen.canvas",
+    "PIL.Image",
+]
+
+TIMER = "import time; started = time.perf_counter(); {statement}; print((time.perf_counter() - started) * 1000)"
+
+CHECK_LOADED = "import sys; print(','.join(m for m in {modules!r} if m in sys.modules))"
+
+
+def run(code, cwd, env):
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def best_of(statement, repeats, cwd, env):
+    return min(float(run(TIMER.format(statement=statement), cwd, env)) for _ in range(repeats))
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    repo = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=repo)
+    # test.py needs credentials to import; dummy ones are enough
+    env.setdefault("TWILIO_ACCOUNT_SID", "ACbench")
+    env.setdefault("TWILIO_AUTH_TOKEN", "bench")
+    env.setdefault("TOGETHER_API_KEY", "bench")
+
+    # test.py creates its SQLite files in the working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{'dependency':<36} {'import ms':>10}")
+        for module in DEPENDENCIES:
+            try:
+                print(f"{module:<36} {best_of(f'import {module}', repeats, workdir, env):>10.1f}")
+            except subprocess.CalledProcessError:
+                print(f"{module:<36} {'missing':>10}")
+
+        startup = best_of("import test; test.init_web()", repeats, workdir, env)
+        loaded = run(
+            "import logging; logging.disable(logging.CRITICAL); import test; test.init_web(); "
+            + CHECK_LOADED.format(modules=DEPENDENCIES),
+            workdir, env,
+        )
+        print(f"\n{'import test + init_web()':<36} {startup:>10.1f}")
+        print(f"loaded at startup: {loaded or '-'}")
+        print(f"deferred: {', '.join(m for m in DEPENDENCIES if m not in loaded.split(',')) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,1384 +1,5330 @@
-import os
-import re
-import sqlite3
-from twilio.rest import Client
-from flask import Flask, render_template_string, request, redirect, url_for, session, jsonify, send_file, render_template
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
-from together import Together
-from flask_wtf.csrf import CSRFProtect, generate_csrf
-from io import BytesIO
-from reportlab.lib.pagesizes import landscape, letter
-from reportlab.pdfgen import canvas
-from datetime import datetime, timedelta
-import mysql.connector
-import logging
-import uuid
-import time
-import threading
-from dotenv import load_dotenv
-load_dotenv()
-
-# === CONFIGURATION ===
-TWILIO_ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID")
-TWILIO_AUTH_TOKEN = os.environ.get("TWILIO_AUTH_TOKEN")
-TOGETHER_API_KEY = os.environ.get("TOGETHER_API_KEY")
-TWILIO_WHATSAPP_NUMBER = "whatsapp:+14155238886"  # Twilio WhatsApp sandbox
-
-if not all([TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN]):
-    raise ValueError("Missing Twilio credentials in environment variables")
-
-# === Setup Together client ===
-together = Together(api_key=TOGETHER_API_KEY)
-
-# === Setup Twilio client ===
-twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-
-# === Flask & Scheduler Setup ===
-app = Flask(__name__)
-app.secret_key = os.environ.get("FLASK_SECRET_KEY", "your-fixed-secret-key-change-this")
-csrf = CSRFProtect(app)
-
-# FIXED: Persistent scheduler with SQLite job store
-jobstores = {
-    'default': SQLAlchemyJobStore(url='sqlite:///jobs.sqlite')
-}
-scheduler = BackgroundScheduler(jobstores=jobstores)
-
-# Setup logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-# === FIXED: ENHANCED PROGRESS STORE WITH USER NAMES ===
-progress_store = {}  # key: (phone, course), value: int (completed days)
-user_schedules = {}  # Store user schedule information
-user_names = {}  # NEW: Store user names for certificates
-
-def store_user_name(phone, name):
-    """Store user name for certificate generation"""
-    user_names[phone] = name
-    logger.info(f"✅ User name stored: {phone} - {name}")
-
-def get_user_name(phone):
-    """Get user name for certificate generation"""
-    return user_names.get(phone, phone)  # Return phone if name not found
-
-def increment_progress(phone, course):
-    key = (phone, course)
-    progress_store[key] = progress_store.get(key, 0) + 1
-    logger.info(f"📈 Progress updated: {phone} - {course} - Day {progress_store[key]}")
-
-def get_progress(phone, course):
-    key = (phone, course)
-    return progress_store.get(key, 0)
-
-def reset_progress(phone, course):
-    progress_store[(phone, course)] = 0
-    logger.info(f"🔄 Progress reset: {phone} - {course}")
-
-def is_course_completed(phone, course, total_days):
-    """Check if course is actually completed"""
-    progress = get_progress(phone, course)
-    return progress >= total_days
-
-def split_long_message(message, max_length=1500):
-    """Split long messages into multiple parts that fit within WhatsApp limits"""
-    if len(message) <= max_length:
-        return [message]
-    
-    parts = []
-    current_part = ""
-    
-    # Split by sections first
-    sections = message.split('\n\n')
-    
-    for section in sections:
-        # If adding this section would exceed limit, start new part
-        if len(current_part) + len(section) + 2 > max_length and current_part:
-            parts.append(current_part.strip())
-            current_part = section
-        else:
-            if current_part:
-                current_part += '\n\n' + section
-            else:
-                current_part = section
-    
-    if current_part:
-        parts.append(current_part.strip())
-    
-    # Add part indicators
-    if len(parts) > 1:
-        for i, part in enumerate(parts):
-            parts[i] = f"📚 Part {i+1}/{len(parts)}\n\n{part}"
-    
-    logger.info(f"✂️ Split message into {len(parts)} parts")
-    return parts
-
-def generate_detailed_course_content(course, part, total_days):
-    """Generate detailed course content with YouTube links and references"""
-    try:
-        prompt = f"""
-Create a DETAILED lesson {part} of {total_days} for the course: '{course}'.
-
-Structure the lesson with these EXACT sections:
-
-🎯 DAY {part} OBJECTIVES:
-• List 3-4 specific learning objectives for this day
-
-🧠 CORE CONCEPTS:
-• Explain 2-3 main concepts in detail with examples
-• Use simple, clear explanations
-• Include practical real-world applications
-
-💻 HANDS-ON EXERCISE:
-• Provide one practical coding/project exercise
-• Include step-by-step instructions
-• Mention expected output/result
-
-🎥 VIDEO REFERENCES:
-• Include 2-3 relevant YouTube video links
-• Choose popular, high-quality tutorials
-• Videos should be under 15 minutes
-
-📚 ADDITIONAL RESOURCES:
-• Provide 2-3 web article/documentation links
-• Include official documentation if available
-• Choose beginner-friendly resources
-
-💡 KEY TAKEAWAYS:
-• Summarize 3-4 main points to remember
-• Focus on practical applications
-
-Make sure the content is comprehensive but well-structured. Include proper YouTube URLs and web links.
-
-Course: {course}
-Day: {part} of {total_days}
-"""
-        logger.info(f"🤖 Generating detailed content for {course} - Day {part}/{total_days}")
-        response = together.chat.completions.create(
-            model="meta-llama/Llama-3-70b-chat-hf",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=2000
-        )
-        content = response.choices[0].message.content.strip()
-        logger.info(f"✅ Detailed content generated for Day {part} ({len(content)} chars)")
-        return content
-    except Exception as e:
-        logger.error(f"❌ Error generating detailed content: {str(e)}")
-        # Fallback detailed content
-        return f"""🎯 DAY {part} OBJECTIVES:
-• Understand key concepts of {course}
-• Practice with hands-on exercises
-• Explore additional learning resources
-
-🧠 CORE CONCEPTS:
-Today we focus on fundamental concepts that form the foundation of {course}. These concepts are essential for building your skills.
-
-💻 HANDS-ON EXERCISE:
-Try building a small project applying today's concepts. Start simple and gradually add complexity.
-
-🎥 VIDEO REFERENCES:
-• Search YouTube for "{course} tutorial day {part}"
-• Look for official documentation videos
-
-📚 ADDITIONAL RESOURCES:
-• Official documentation
-• MDN Web Docs (for web technologies)
-• Stack Overflow for specific questions
-
-💡 KEY TAKEAWAYS:
-• Practice consistently
-• Build projects to reinforce learning
-• Use multiple learning resources"""
-
-def send_whatsapp(to_phone, message):
-    """Send WhatsApp message via Twilio with proper length handling"""
-    try:
-        # Rate limiting - wait 2 seconds between messages
-        time.sleep(2)
-        
-        if not to_phone or not to_phone.startswith('+'):
-            logger.error(f"❌ Invalid phone number: {to_phone}")
-            return False
-        
-        # Format phone number for WhatsApp
-        whatsapp_to = f"whatsapp:{to_phone}"
-        
-        logger.info(f"📤 Sending WhatsApp ({len(message)} chars) to: {to_phone}")
-        
-        twilio_client.messages.create(
-            body=message,
-            from_=TWILIO_WHATSAPP_NUMBER,
-            to=whatsapp_to
-        )
-        logger.info(f"✅ Successfully sent WhatsApp to: {to_phone}")
-        return True
-    except Exception as e:
-        logger.error(f"❌ Error sending WhatsApp: {str(e)}")
-        return False
-
-def send_course_lesson(phone, course, day, total_days):
-    """Send a detailed course lesson with proper formatting"""
-    try:
-        logger.info(f"🎯 SENDING DETAILED LESSON: {phone} - {course} - Day {day}")
-        
-        # Generate detailed content
-        content = generate_detailed_course_content(course, day, total_days)
-        
-        # Create the main message
-        header = f"🎓 {course} - Day {day}/{total_days}\n\n"
-        footer = f"\n\n---\n📚 Course Progress: {day}/{total_days} days\n💬 Reply STOP to unsubscribe"
-        
-        full_message = header + content + footer
-        
-        # Split into multiple messages if too long
-        message_parts = split_long_message(full_message)
-        
-        # Send all parts
-        success_count = 0
-        for i, part in enumerate(message_parts):
-            if send_whatsapp(phone, part):
-                success_count += 1
-                # Add small delay between parts to avoid rate limiting
-                if i < len(message_parts) - 1:
-                    time.sleep(2)
-        
-        if success_count == len(message_parts):
-            increment_progress(phone, course)
-            logger.info(f"✅ Successfully delivered Day {day} ({len(message_parts)} parts) to {phone}")
-            
-            # Check if course is completed and send completion message
-            if day == total_days:
-                completion_message = (
-                    f"🎉 CONGRATULATIONS! 🎉\n\n"
-                    f"You have successfully completed the {course} course!\n\n"
-                    f"📊 Final Progress: {total_days}/{total_days} days completed\n\n"
-                    f"🏆 You can now download your certificate from the LearnHub website.\n\n"
-                    f"Thank you for learning with us! 👨‍🎓👩‍🎓"
-                )
-                send_whatsapp(phone, completion_message)
-            
-            return True
-        else:
-            logger.error(f"❌ Failed to send all parts of Day {day} to {phone}")
-            return False
-            
-    except Exception as e:
-        logger.error(f"❌ Error sending course lesson: {str(e)}")
-        return False
-
-def remove_existing_jobs(phone, course):
-    """Remove existing jobs for a user and course"""
-    try:
-        jobs_removed = 0
-        for job in scheduler.get_jobs():
-            if job.id and job.id.startswith(f"{phone}_{course}_"):
-                scheduler.remove_job(job.id)
-                jobs_removed += 1
-                logger.info(f"🗑️ Removed existing job: {job.id}")
-        return jobs_removed
-    except Exception as e:
-        logger.error(f"❌ Error removing existing jobs: {str(e)}")
-        return 0
-
-def schedule_course_messages_detailed(phone, course, days, time_str, user_name=None):
-    """Schedule detailed course messages with proper time handling"""
-    try:
-        logger.info(f"🚀 DETAILED COURSE MODE: Scheduling {course} for {phone} over {days} days at {time_str}")
-        
-        # Store user name if provided
-        if user_name:
-            store_user_name(phone, user_name)
-        
-        # Remove any existing jobs for this user/course
-        removed_count = remove_existing_jobs(phone, course)
-        if removed_count > 0:
-            logger.info(f"🗑️ Removed {removed_count} existing jobs")
-        
-        # Reset progress for this course
-        reset_progress(phone, course)
-        
-        # Create a unique schedule ID
-        schedule_id = str(uuid.uuid4())[:8]
-        
-        # Convert user's preferred time to 24-hour format
-        time_obj = datetime.strptime(time_str, "%I:%M %p")
-        now = datetime.now()
-        
-        # Create today's scheduled time with user's preferred time
-        scheduled_time_today = now.replace(
-            hour=time_obj.hour, 
-            minute=time_obj.minute, 
-            second=0, 
-            microsecond=0
-        )
-        
-        # FIXED: SMART TIME HANDLING LOGIC
-        current_progress = get_progress(phone, course)
-        day_to_start = current_progress + 1
-        
-        # Send welcome message immediately
-        welcome_message = (
-            f"Welcome to {course}! 🎉\n\n"
-            f"Your {days}-day detailed learning journey starts NOW!\n\n"
-            "📚 What you'll get each day:\n"
-            "• Clear learning objectives\n"
-            "• Detailed core concepts\n"
-            "• Hands-on exercises\n"
-            "• YouTube video references\n"
-            "• Additional resources\n"
-            "• Key takeaways\n\n"
-            f"⏰ Lessons will arrive daily at {time_str}\n\n"
-            "Reply STOP to unsubscribe."
-        )
-        
-        if not send_whatsapp(phone, welcome_message):
-            logger.error("❌ Failed to send welcome message")
-            return False
-        
-        # FIXED: SMART SCHEDULING BASED ON TIME
-        if scheduled_time_today <= now:
-            # PAST TIME: Send today's lesson immediately, schedule next days at selected time
-            logger.info(f"⏰ Past time detected: {time_str} - Sending Day {day_to_start} immediately")
-            
-            # Send current day immediately
-            if day_to_start <= days:
-                send_success = send_course_lesson(phone, course, day_to_start, days)
-                if send_success:
-                    logger.info(f"✅ Day {day_to_start} sent immediately (past time)")
-                    day_to_start += 1
-                else:
-                    logger.error(f"❌ Failed to send Day {day_to_start}")
-            
-            # Schedule remaining days starting from tomorrow at selected time
-            for day in range(day_to_start, days + 1):
-                days_to_add = day - 1  # Calculate days from today
-                scheduled_time = now + timedelta(days=days_to_add)
-                scheduled_time = scheduled_time.replace(
-                    hour=time_obj.hour, 
-                    minute=time_obj.minute, 
-                    second=0, 
-                    microsecond=0
-                )
-                
-                job_id = f"{phone}_{course}_day{day}_{schedule_id}"
-                
-                scheduler.add_job(
-                    send_course_lesson,
-                    'date',
-                    run_date=scheduled_time,
-                    args=[phone, course, day, days],
-                    id=job_id,
-                    replace_existing=True
-                )
-                logger.info(f"✅ Scheduled Day {day} for {scheduled_time} (past time handling)")
-                
-        else:
-            # FUTURE TIME: Schedule all lessons starting from today at selected time
-            logger.info(f"⏰ Future time detected: {time_str} - Scheduling all lessons at selected time")
-            
-            for day in range(1, days + 1):
-                days_to_add = day - 1  # Day 1 = today, Day 2 = tomorrow, etc.
-                scheduled_time = now + timedelta(days=days_to_add)
-                scheduled_time = scheduled_time.replace(
-                    hour=time_obj.hour, 
-                    minute=time_obj.minute, 
-                    second=0, 
-                    microsecond=0
-                )
-                
-                job_id = f"{phone}_{course}_day{day}_{schedule_id}"
-                
-                scheduler.add_job(
-                    send_course_lesson,
-                    'date',
-                    run_date=scheduled_time,
-                    args=[phone, course, day, days],
-                    id=job_id,
-                    replace_existing=True
-                )
-                logger.info(f"✅ Scheduled Day {day} for {scheduled_time} (future time handling)")
-        
-        # Store schedule information
-        user_schedules[(phone, course)] = {
-            'schedule_id': schedule_id,
-            'total_days': days,
-            'start_time': datetime.now(),
-            'user_name': user_name,
-            'preferred_time': time_str,
-            'scheduled_days': days
-        }
-        
-        logger.info(f"🎯 Successfully scheduled {days} days of detailed content with smart time handling")
-        return True
-        
-    except Exception as e:
-        logger.error(f"❌ Failed to schedule detailed course: {str(e)}")
-        return False
-
-# Health check endpoint
-@app.route("/health")
-def health_check():
-    return jsonify({
-        "status": "healthy",
-        "scheduler_running": scheduler.running,
-        "jobs_count": len(scheduler.get_jobs()),
-        "timestamp": datetime.now().isoformat()
-    })
-
-# ... (KEEP THE SAME HTML TEMPLATE AS BEFORE - it already has the name field)
-
-FULL_TEMPLATE = '''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>LearnHub - Personalized Learning Scheduler</title>
-    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css">
-    <script src="https://cdn.tailwindcss.com"></script>
-    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: {
-                            50: '#f0f9ff',
-                            100: '#e0f2fe',
-                            200: '#bae6fd',
-                            300: '#7dd3fc',
-                            400: '#38bdf8',
-                            500: '#0ea5e9',
-                            600: '#0284c7',
-                            700: '#0369a1',
-                            800: '#075985',
-                            900: '#0c4a6e',
-                        },
-                        secondary: {
-                            50: '#f5f3ff',
-                            100: '#ede9fe',
-                            200: '#ddd6fe',
-                            300: '#c4b5fd',
-                            400: '#a78bfa',
-                            500: '#8b5cf6',
-                            600: '#7c3aed',
-                            700: '#6d28d9',
-                            800: '#5b21b6',
-                            900: '#4c1d95',
-                        }
-                    },
-                    fontFamily: {
-                        sans: ['Inter', 'sans-serif'],
-                    },
-                    animation: {
-                        'float': 'float 6s ease-in-out infinite',
-                        'pulse-slow': 'pulse 4s cubic-bezier(0.4, 0, 0.6, 1) infinite',
-                    }
-                }
-            }
-        }
-    </script>
-    <style>
-        @keyframes float {
-            0% { transform: translateY(0px); }
-            50% { transform: translateY(-10px); }
-            100% { transform: translateY(0px); }
-        }
-        
-        .progress-ring__circle {
-            transition: stroke-dashoffset 0.5s;
-            transform: rotate(-90deg);
-            transform-origin: 50% 50%;
-        }
-        
-        .gradient-text {
-            background-clip: text;
-            -webkit-background-clip: text;
-            color: transparent;
-        }
-        
-        .card-hover-effect {
-            transition: all 0.3s ease;
-        }
-        
-        .card-hover-effect:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 20px 25px -5px rgba(0, 0, 0, 0.1), 0 10px 10px -5px rgba(0, 0, 0, 0.04);
-        }
-        
-        .course-icon {
-            transition: all 0.3s ease;
-        }
-        
-        .course-card:hover .course-icon {
-            transform: scale(1.1);
-        }
-        
-        .glow-effect {
-            box-shadow: 0 0 15px rgba(59, 130, 246, 0.3);
-        }
-        
-        .input-focus:focus {
-            box-shadow: 0 0 0 3px rgba(59, 130, 246, 0.3);
-            border-color: #3b82f6;
-        }
-        
-        .test-mode-banner {
-            background: linear-gradient(90deg, #ff6b6b, #ff8e53);
-            color: white;
-            padding: 8px 16px;
-            border-radius: 8px;
-            margin-bottom: 16px;
-            text-align: center;
-            font-weight: bold;
-        }
-        
-        .time-info-banner {
-            background: linear-gradient(90deg, #60a5fa, #3b82f6);
-            color: white;
-            padding: 8px 16px;
-            border-radius: 8px;
-            margin-bottom: 16px;
-            text-align: center;
-            font-weight: bold;
-        }
-    </style>
-</head>
-<body class="bg-gradient-to-br from-primary-50 to-primary-100 min-h-screen">
-    <div class="container mx-auto px-4 py-12 max-w-6xl">
-        {% if test_mode %}
-        <div class="test-mode-banner">
-            🚀 TEST MODE: 1 Day = 1 Minute - Lessons will arrive every minute instead of daily
-        </div>
-        {% endif %}
-        
-        {% if time_str %}
-        <div class="time-info-banner">
-            ⏰ Smart Time Detection: Lessons will be delivered at {{ time_str }} based on your selection
-        </div>
-        {% endif %}
-        
-        <!-- Header Section -->
-        <header class="text-center mb-16">
-            <div class="flex justify-center mb-6">
-                <div class="w-20 h-20 rounded-xl bg-white shadow-md flex items-center justify-center">
-                    <svg xmlns="http://www.w3.org/2000/svg" class="h-10 w-10 text-primary-600" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                        <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9.663 17h4.673M12 3v1m6.364 1.636l-.707.707M21 12h-1M4 12H3m3.343-5.657l-.707-.707m2.828 9.9a5 5 0 117.072 0l-.548.547A3.374 3.374 0 0014 18.469V19a2 2 0 11-4 0v-.531c0-.895-.356-1.754-.988-2.386l-.548-.547z" />
-                    </svg>
-                </div>
-            </div>
-            <h1 class="text-4xl md:text-5xl font-bold text-gray-900 mb-4">
-                <span class="gradient-text bg-gradient-to-r from-primary-600 to-secondary-600">LearnHub</span>
-            </h1>
-            <p class="text-lg md:text-xl text-gray-600 max-w-2xl mx-auto">
-                Your personalized learning journey, tailored to your schedule and goals
-            </p>
-        </header>
-        
-        {% if template == 'course_selection' %}
-        <!-- Course Selection Section -->
-        <section class="mb-20">
-            <div class="grid grid-cols-1 md:grid-cols-3 gap-8 mb-16">
-                <!-- Programming Languages -->
-                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
-                    <div class="p-6">
-                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
-                            <span>🐍</span>
-                        </div>
-                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Python Programming</h3>
-                        <p class="text-gray-600 text-center mb-6">Master Python from basics to advanced concepts with real-world applications</p>
-                        <form method="POST" action="/schedule">
-                            <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
-                            <input type="hidden" name="course" value="Python Programming">
-                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
-                                Select Course
-                            </button>
-                        </form>
-                    </div>
-                </div>
-
-                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
-                    <div class="p-6">
-                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
-                            <span>☕</span>
-                        </div>
-                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Java Development</h3>
-                        <p class="text-gray-600 text-center mb-6">Learn Java programming, OOP concepts, and build robust applications</p>
-                        <form method="POST" action="/schedule">
-                            <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
-                            <input type="hidden" name="course" value="Java Development">
-                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
-                                Select Course
-                            </button>
-                        </form>
-                    </div>
-                </div>
-
-                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
-                    <div class="p-6">
-                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
-                            <span>🟨</span>
-                        </div>
-                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">JavaScript Mastery</h3>
-                        <p class="text-gray-600 text-center mb-6">From fundamentals to advanced JS concepts including ES6+ features</p>
-                        <form method="POST" action="/schedule">
-                            <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
-                            <input type="hidden" name="course" value="JavaScript Mastery">
-                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
-                                Select Course
-                            </button>
-                        </form>
-                    </div>
-                </div>
-
-                <!-- Web Development -->
-                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
-                    <div class="p-6">
-                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
-                            <span>🌐</span>
-                        </div>
-                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Full-Stack Web Development</h3>
-                        <p class="text-gray-600 text-center mb-6">Build complete web applications with frontend and backend technologies</p>
-                        <form method="POST" action="/schedule">
-                            <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
-                            <input type="hidden" name="course" value="Full-Stack Web Development">
-                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
-                                Select Course
-                            </button>
-                        </form>
-                    </div>
-                </div>
-
-                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
-                    <div class="p-6">
-                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
-                            <span>⚛️</span>
-                        </div>
-                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">React Framework</h3>
-                        <p class="text-gray-600 text-center mb-6">Master React.js for building modern, interactive user interfaces</p>
-                        <form method="POST" action="/schedule">
-                            <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
-                            <input type="hidden" name="course" value="React Framework">
-                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
-                                Select Course
-                            </button>
-                        </form>
-                    </div>
-                </div>
-
-                <!-- Data Science -->
-                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
-                    <div class="p-6">
-                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
-                            <span>📊</span>
-                        </div>
-                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Data Science Fundamentals</h3>
-                        <p class="text-gray-600 text-center mb-6">Learn data analysis, visualization, and machine learning basics</p>
-                        <form method="POST" action="/schedule">
-                            <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
-                            <input type="hidden" name="course" value="Data Science Fundamentals">
-                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
-                                Select Course
-                            </button>
-                        </form>
-                    </div>
-                </div>
-
-                <!-- Mobile Development -->
-                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
-                    <div class="p-6">
-                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
-                            <span>📱</span>
-                        </div>
-                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Mobile App Development</h3>
-                        <p class="text-gray-600 text-center mb-6">Build cross-platform mobile apps with React Native or Flutter</p>
-                        <form method="POST" action="/schedule">
-                            <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
-                            <input type="hidden" name="course" value="Mobile App Development">
-                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
-                                Select Course
-                            </button>
-                        </form>
-                    </div>
-                </div>
-
-                <!-- Cloud & DevOps -->
-                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
-                    <div class="p-6">
-                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
-                            <span>☁️</span>
-                        </div>
-                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Cloud Computing & DevOps</h3>
-                        <p class="text-gray-600 text-center mb-6">Learn AWS, Docker, Kubernetes and CI/CD pipelines</p>
-                        <form method="POST" action="/schedule">
-                            <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
-                            <input type="hidden" name="course" value="Cloud Computing & DevOps">
-                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
-                                Select Course
-                            </button>
-                        </form>
-                    </div>
-                </div>
-
-                <!-- Cybersecurity -->
-                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
-                    <div class="p-6">
-                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
-                            <span>🔒</span>
-                        </div>
-                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Cybersecurity Essentials</h3>
-                        <p class="text-gray-600 text-center mb-6">Learn to protect systems and networks from digital attacks</p>
-                        <form method="POST" action="/schedule">
-                            <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
-                            <input type="hidden" name="course" value="Cybersecurity Essentials">
-                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
-                                Select Course
-                            </button>
-                        </form>
-                    </div>
-                </div>
-
-                <!-- Design -->
-                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
-                    <div class="p-6">
-                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
-                            <span>🎨</span>
-                        </div>
-                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">UI/UX Design</h3>
-                        <p class="text-gray-600 text-center mb-6">Master design principles, tools like Figma, and user experience concepts</p>
-                        <form method="POST" action="/schedule">
-                            <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
-                            <input type="hidden" name="course" value="UI/UX Design">
-                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
-                                Select Course
-                            </button>
-                        </form>
-                    </div>
-                </div>
-
-                <!-- AI/ML -->
-                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
-                    <div class="p-6">
-                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
-                            <span>🤖</span>
-                        </div>
-                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">AI & Machine Learning</h3>
-                        <p class="text-gray-600 text-center mb-6">Introduction to AI concepts and practical machine learning applications</p>
-                        <form method="POST" action="/schedule">
-                            <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
-                            <input type="hidden" name="course" value="AI & Machine Learning">
-                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
-                                Select Course
-                            </button>
-                        </form>
-                    </div>
-                </div>
-
-                <!-- Blockchain -->
-                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
-                    <div class="p-6">
-                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
-                            <span>⛓️</span>
-                        </div>
-                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Blockchain Development</h3>
-                        <p class="text-gray-600 text-center mb-6">Learn smart contracts, DApps, and blockchain fundamentals</p>
-                        <form method="POST" action="/schedule">
-                            <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
-                            <input type="hidden" name="course" value="Blockchain Development">
-                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
-                                Select Course
-                            </button>
-                        </form>
-                    </div>
-                </div>
-            </div>
-            
-            <!-- How It Works Section -->
-            <div class="bg-white rounded-xl shadow-md overflow-hidden">
-                <div class="p-8 md:p-10">
-                    <h2 class="text-2xl md:text-3xl font-bold text-center text-gray-900 mb-10">How LearnHub Works</h2>
-                    <div class="grid grid-cols-1 md:grid-cols-3 gap-8">
-                        <div class="text-center">
-                            <div class="w-20 h-20 bg-primary-100 rounded-full flex items-center justify-center mx-auto mb-5 relative">
-                                <span class="text-primary-600 text-2xl font-bold">1</span>
-                                <div class="absolute -bottom-5 left-1/2 transform -translate-x-1/2 w-0 h-0 border-l-8 border-r-8 border-t-8 border-l-transparent border-r-transparent border-t-primary-100"></div>
-                            </div>
-                            <h3 class="text-lg font-semibold text-gray-800 mb-3">Choose Your Course</h3>
-                            <p class="text-gray-600">Select from our expert-curated learning paths designed for all skill levels</p>
-                        </div>
-                        
-                        <div class="text-center">
-                            <div class="w-20 h-20 bg-primary-100 rounded-full flex items-center justify-center mx-auto mb-5 relative">
-                                <span class="text-primary-600 text-2xl font-bold">2</span>
-                                <div class="absolute -bottom-5 left-1/2 transform -translate-x-1/2 w-0 h-0 border-l-8 border-r-8 border-t-8 border-l-transparent border-r-transparent border-t-primary-100"></div>
-                            </div>
-                            <h3 class="text-lg font-semibold text-gray-800 mb-3">Personalize Your Plan</h3>
-                            <p class="text-gray-600">Set your preferred schedule and learning pace that fits your lifestyle</p>
-                        </div>
-                        
-                        <div class="text-center">
-                            <div class="w-20 h-20 bg-primary-100 rounded-full flex items-center justify-center mx-auto mb-5 relative">
-                                <span class="text-primary-600 text-2xl font-bold">3</span>
-                                <div class="absolute -bottom-5 left-1/2 transform -translate-x-1/2 w-0 h-0 border-l-8 border-r-8 border-t-8 border-l-transparent border-r-transparent border-t-primary-100"></div>
-                            </div>
-                            <h3 class="text-lg font-semibold text-gray-800 mb-3">Start Learning</h3>
-                            <p class="text-gray-600">Receive daily bite-sized lessons via WhatsApp and track your progress</p>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </section>
-        
-        {% elif template == 'user_form' %}
-        <!-- Schedule Form Section -->
-        <section class="max-w-2xl mx-auto">
-            <div class="bg-white rounded-xl shadow-xl overflow-hidden glow-effect">
-                <div class="p-8">
-                    <div class="flex justify-between items-center mb-8">
-                        <div>
-                            <h2 class="text-2xl font-bold text-gray-900">Schedule Your Learning</h2>
-                            <p class="text-gray-600">Complete your enrollment for {{ course }}</p>
-                        </div>
-                        <div class="flex items-center">
-                            <span class="bg-primary-100 text-primary-800 text-sm font-semibold px-3 py-1 rounded-full">Step 2 of 2</span>
-                        </div>
-                    </div>
-                    
-                    {% if error %}
-                    <div class="bg-red-50 border-l-4 border-red-500 p-4 mb-6 rounded-r">
-                        <div class="flex">
-                            <div class="flex-shrink-0">
-                                <svg class="h-5 w-5 text-red-500" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
-                                    <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zM8.707 7.293a1 1 0 00-1.414 1.414L8.586 10l-1.293 1.293a1 1 0 101.414 1.414L10 11.414l1.293 1.293a1 1 0 001.414-1.414L11.414 10l1.293-1.293a1 1 0 00-1.414-1.414L10 8.586 8.707 7.293z" clip-rule="evenodd" />
-                                </svg>
-                            </div>
-                            <div class="ml-3">
-                                <p class="text-sm text-red-700">{{ error }}</p>
-                            </div>
-                        </div>
-                    </div>
-                    {% endif %}
-                    
-                    <form method="POST" class="space-y-6" onsubmit="return validateForm()">
-                        <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
-                        <input type="hidden" name="course" value="{{ course }}">
-                        
-                        <!-- FIXED: ADDED NAME FIELD -->
-                        <div>
-                            <label for="name" class="block text-sm font-medium text-gray-700 mb-1">Full Name</label>
-                            <div class="relative">
-                                <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none">
-                                    <i class="fas fa-user text-gray-400"></i>
-                                </div>
-                                <input type="text" name="name" id="name" class="block w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg input-focus focus:outline-none focus:ring-primary-500 focus:border-primary-500" placeholder="Enter your full name" required>
-                            </div>
-                            <p class="mt-1 text-sm text-gray-500">This name will be printed on your completion certificate</p>
-                        </div>
-                        
-                        <div>
-                            <label for="phone" class="block text-sm font-medium text-gray-700 mb-1">WhatsApp Number</label>
-                            <div class="relative">
-                                <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none">
-                                    <i class="fab fa-whatsapp text-gray-400"></i>
-                                </div>
-                                <input type="tel" name="phone" id="phone" class="block w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg input-focus focus:outline-none focus:ring-primary-500 focus:border-primary-500" placeholder="+1234567890" required>
-                            </div>
-                            <p class="mt-1 text-sm text-gray-500">Enter your WhatsApp number with country code (e.g., +1 for US)</p>
-                            <p class="mt-1 text-sm text-primary-600 font-medium">📱 First, join our WhatsApp sandbox by sending "join {{ sandbox_code }}" to {{ twilio_whatsapp_number }}</p>
-                        </div>
-                        
-                        <div>
-                            <label for="days" class="block text-sm font-medium text-gray-700 mb-1">Learning Duration (Days)</label>
-                            <div class="relative">
-                                <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none">
-                                    <svg class="h-5 w-5 text-gray-400" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
-                                        <path fill-rule="evenodd" d="M6 2a1 1 0 00-1 1v1H4a2 2 0 00-2 2v10a2 2 0 002 2h12a2 2 0 002-2V6a2 2 0 00-2-2h-1V3a1 1 0 10-2 0v1H7V3a1 1 0 00-1-1zm0 5a1 1 0 000 2h8a1 1 0 100-2H6z" clip-rule="evenodd" />
-                                    </svg>
-                                </div>
-                                <input type="number" name="days" id="days" min="1" max="365" class="block w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg input-focus focus:outline-none focus:ring-primary-500 focus:border-primary-500" placeholder="30" required>
-                            </div>
-                            <p class="mt-1 text-sm text-gray-500">How many days would you like to complete the course in?</p>
-                            {% if test_mode %}
-                            <p class="mt-1 text-sm text-orange-600 font-medium">⏰ TEST MODE: Each day = 1 minute for quick testing</p>
-                            {% endif %}
-                        </div>
-                        
-                        <div>
-                            <label for="time" class="block text-sm font-medium text-gray-700 mb-1">Preferred Learning Time</label>
-                            <div class="relative">
-                                <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none">
-                                    <svg class="h-5 w-5 text-gray-400" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
-                                        <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zm1-12a1 1 0 10-2 0v4a1 1 0 00.293.707l2.828 2.829a1 1 0 101.415-1.415L11 9.586V6z" clip-rule="evenodd" />
-                                    </svg>
-                                </div>
-                                <select name="time" id="time" class="block w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg input-focus focus:outline-none focus:ring-primary-500 focus:border-primary-500" required>
-                                    <option value="">Select a time</option>
-                                    {% for hour in range(1, 13) %}
-                                        <option value="{{ hour }}:00 AM">{{ hour }}:00 AM</option>
-                                        <option value="{{ hour }}:30 AM">{{ hour }}:30 AM</option>
-                                    {% endfor %}
-                                    {% for hour in range(1, 13) %}
-                                        <option value="{{ hour }}:00 PM">{{ hour }}:00 PM</option>
-                                        <option value="{{ hour }}:30 PM">{{ hour }}:30 PM</option>
-                                    {% endfor %}
-                                </select>
-                            </div>
-                            <p class="mt-1 text-sm text-gray-500">When would you like to receive your daily lessons?</p>
-                            <p class="mt-1 text-sm text-blue-600 font-medium">⏰ Smart Scheduling: If time is past today, first lesson comes immediately. Future times start at selected time.</p>
-                        </div>
-                        
-                        <div class="pt-2">
-                            <button type="submit" class="w-full flex justify-center py-4 px-6 border border-transparent rounded-lg shadow-sm text-lg font-medium text-white bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-primary-500 transition duration-300 transform hover:-translate-y-1">
-                                Schedule My Learning
-                                <svg class="ml-2 -mr-1 w-5 h-5" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
-                                    <path fill-rule="evenodd" d="M10.293 5.293a1 1 0 011.414 0l4 4a1 1 0 010 1.414l-4 4a1 1 0 01-1.414-1.414L12.586 11H5a1 1 0 110-2h7.586l-2.293-2.293a1 1 0 010-1.414z" clip-rule="evenodd" />
-                                </svg>
-                            </button>
-                        </div>
-                    </form>
-                </div>
-            </div>
-        </section>
-        
-        <script>
-            function validateForm() {
-                const name = document.getElementById('name').value;
-                const phone = document.getElementById('phone').value;
-                const days = document.getElementById('days').value;
-                const time = document.getElementById('time').value;
-                
-                // Basic validation
-                if (!name || !phone || !days || !time) {
-                    alert('Please fill in all required fields');
-                    return false;
-                }
-                
-                // Name validation
-                if (name.trim().length < 2) {
-                    alert('Please enter your full name');
-                    return false;
-                }
-                
-                // Phone validation - basic check for country code
-                const phoneRegex = /^\+[1-9]\d{1,14}$/;
-                if (!phoneRegex.test(phone)) {
-                    alert('Please enter a valid WhatsApp number with country code (e.g., +1234567890)');
-                    return false;
-                }
-                
-                // Days validation
-                if (isNaN(days) || days <= 0 || days > 365) {
-                    alert('Please enter a valid number of days (1-365)');
-                    return false;
-                }
-                
-                return true;
-            }
-        </script>
-        
-        {% elif template == 'confirm' %}
-        <!-- Confirmation Section -->
-        <section class="max-w-2xl mx-auto">
-            <div class="bg-white rounded-xl shadow-xl overflow-hidden text-center">
-                <div class="p-10">
-                    <div class="w-24 h-24 bg-green-100 rounded-full flex items-center justify-center mx-auto mb-6">
-                        <svg class="w-12 h-12 text-green-600" fill="none" stroke="currentColor" viewBox="0 0 24 24" xmlns="http://www.w3.org/2000/svg">
-                            <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M5 13l4 4L19 7"></path>
-                        </svg>
-                    </div>
-                    
-                    <h2 class="text-2xl md:text-3xl font-bold text-gray-900 mb-3">Course Scheduled Successfully!</h2>
-                    <p class="text-lg text-gray-600 mb-8">
-                        Your <span class="font-semibold text-primary-600">{{ course }}</span> course will begin as scheduled.
-                    </p>
-                    
-                    <!-- Progress Tracker - Moved to top -->
-                    <div class="bg-white border border-gray-200 rounded-xl p-6 mb-10">
-                        <h3 class="font-semibold text-lg text-gray-900 mb-6 flex items-center justify-center">
-                            <svg class="w-5 h-5 mr-2 text-primary-600" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 19v-6a2 2 0 00-2-2H5a2 2 0 00-2 2v6a2 2 0 002 2h2a2 2 0 002-2zm0 0V9a2 2 0 012-2h2a2 2 0 012 2v10m-6 0a2 2 0 002 2h2a2 2 0 002-2m0 0V5a2 2 0 012-2h2a2 2 0 012 2v14a2 2 0 01-2 2h-2a2 2 0 01-2-2z" />
-                            </svg>
-                            Your Learning Progress
-                        </h3>
-                        
-                        <div class="space-y-4">
-                            {% for day in range(1, total_days+1) %}
-                            <div class="flex items-center gap-4">
-                                <div class="flex-shrink-0 w-10 h-10 rounded-full flex items-center justify-center
-                                    {% if day <= completed_days %}
-                                        bg-green-100 text-green-800
-                                    {% elif day == completed_days + 1 %}
-                                        bg-yellow-100 text-yellow-800
-                                    {% else %}
-                                        bg-gray-100 text-gray-500
-                                    {% endif %}">
-                                    <span class="font-medium">{{ day }}</span>
-                                </div>
-                                <div class="flex-1">
-                                    <div class="flex justify-between items-center">
-                                        <span class="font-medium text-gray-800">
-                                            Day {{ day }}
-                                            {% if day <= completed_days %}
-                                                <span class="ml-2 text-green-600 text-sm">Completed</span>
-                                            {% elif day == completed_days + 1 %}
-                                                <span class="ml-2 text-yellow-600 text-sm">In Progress</span>
-                                            {% else %}
-                                                <span class="ml-2 text-gray-500 text-sm">Upcoming</span>
-                                            {% endif %}
-                                        </span>
-                                        <span class="text-sm text-gray-500">
-                                            {% if day <= completed_days %}
-                                                {{ (day/total_days*100)|round|int }}%
-                                            {% elif day == completed_days + 1 %}
-                                                {{ (completed_days/total_days*100)|round|int }}%
-                                            {% else %}
-                                                0%
-                                            {% endif %}
-                                        </span>
-                                    </div>
-                                    <div class="w-full bg-gray-200 h-2 rounded-full mt-1">
-                                        {% if day <= completed_days %}
-                                            <div class="bg-green-500 h-2 rounded-full" style="width:100%"></div>
-                                        {% elif day == completed_days + 1 %}
-                                            <div class="bg-yellow-500 h-2 rounded-full" style="width:{{ (completed_days/total_days*100)|round|int }}%"></div>
-                                        {% endif %}
-                                    </div>
-                                </div>
-                            </div>
-                            {% endfor %}
-                        </div>
-                    </div>
-                    
-                    <!-- What's Next Section - Moved below progress tracker -->
-                    <div class="bg-primary-50 rounded-xl p-6 mb-10 text-left">
-                        <h3 class="font-semibold text-primary-800 text-lg mb-4 flex items-center">
-                            <svg class="w-5 h-5 mr-2" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
-                                <path d="M10 2a6 6 0 00-6 6v3.586l-.707.707A1 1 0 004 14h12a1 1 0 00.707-1.707L16 11.586V8a6 6 0 00-6-6zM10 18a3 3 0 01-3-3h6a3 3 0 01-3 3z" />
-                            </svg>
-                            What's Next?
-                        </h3>
-                        <ul class="space-y-3">
-                            <li class="flex items-start">
-                                <svg class="flex-shrink-0 w-5 h-5 text-primary-600 mt-0.5 mr-2" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
-                                    <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zm3.707-9.293a1 1 0 00-1.414-1.414L9 10.586 7.707 9.293a1 1 0 00-1.414 1.414l2 2a1 1 0 001.414 0l4-4z" clip-rule="evenodd" />
-                                </svg>
-                                <span class="text-gray-700">
-                                    {% if time_str %}
-                                    Lessons will arrive daily at <strong>{{ time_str }}</strong>
-                                    {% else %}
-                                    Check your WhatsApp for the first lesson
-                                    {% endif %}
-                                </span>
-                            </li>
-                            <li class="flex items-start">
-                                <svg class="flex-shrink-0 w-5 h-5 text-primary-600 mt-0.5 mr-2" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
-                                    <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zm3.707-9.293a1 1 0 00-1.414-1.414L9 10.586 7.707 9.293a1 1 0 00-1.414 1.414l2 2a1 1 0 001.414 0l4-4z" clip-rule="evenodd" />
-                                </svg>
-                                <span class="text-gray-700">Save <span class="font-mono text-primary-600">{{ twilio_whatsapp_number }}</span> to your contacts</span>
-                            </li>
-                            <li class="flex items-start">
-                                <svg class="flex-shrink-0 w-5 h-5 text-primary-600 mt-0.5 mr-2" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
-                                    <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zm3.707-9.293a1 1 0 00-1.414-1.414L9 10.586 7.707 9.293a1 1 0 00-1.414 1.414l2 2a1 1 0 001.414 0l4-4z" clip-rule="evenodd" />
-                                </svg>
-                                <span class="text-gray-700">Join our <a href="#" class="text-primary-600 hover:underline">community forum</a> for peer support and additional resources</span>
-                            </li>
-                        </ul>
-                    </div>
-                    
-                    <!-- Action Buttons -->
-                    <div class="grid grid-cols-1 md:grid-cols-2 gap-4">
-                        <a href="/" class="px-6 py-3 border border-gray-300 rounded-lg text-gray-700 font-medium hover:bg-gray-50 transition duration-300 flex items-center justify-center">
-                            <svg class="w-5 h-5 mr-2" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M3 12l2-2m0 0l7-7 7 7M5 10v10a1 1 0 001 1h3m10-11l2 2m-2-2v10a1 1 0 01-1 1h-3m-6 0a1 1 0 001-1v-4a1 1 0 011-1h2a1 1 0 011 1v4a1 1 0 001 1m-6 0h6" />
-                            </svg>
-                            Back to Home
-                        </a>
-                        <a href="/progress" class="px-6 py-3 bg-primary-600 rounded-lg text-white font-medium hover:bg-primary-700 transition duration-300 flex items-center justify-center">
-                            <svg class="w-5 h-5 mr-2" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 19v-6a2 2 0 00-2-2H5a2 2 0 00-2 2v6a2 2 0 002 2h2a2 2 0 002-2zm0 0V9a2 2 0 012-2h2a2 2 0 012 2v10m-6 0a2 2 0 002 2h2a2 2 0 002-2m0 0V5a2 2 0 012-2h2a2 2 0 012 2v14a2 2 0 01-2 2h-2a2 2 0 01-2-2z" />
-                            </svg>
-                            View Progress
-                        </a>
-                    </div>
-                    
-                    <!-- FIXED: Only show certificate button when course is actually completed -->
-                    {% if completed_days >= total_days %}
-                    <div class="mt-8">
-                        <a href="/certificate" class="inline-flex items-center px-8 py-3 border border-transparent text-lg font-medium rounded-full shadow-sm text-white bg-gradient-to-r from-green-500 to-green-600 hover:from-green-600 hover:to-green-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-green-500 transition duration-300 transform hover:-translate-y-1">
-                            <svg class="w-6 h-6 mr-2" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 12l2 2 4-4m6 2a9 9 0 11-18 0 9 9 0 0118 0z" />
-                            </svg>
-                            Download Certificate
-                        </a>
-                    </div>
-                    {% endif %}
-                </div>
-            </div>
-        </section>
-        {% endif %}
-        
-        <!-- Footer -->
-        <footer class="mt-20 text-center text-gray-500 text-sm">
-            <div class="flex justify-center space-x-6 mb-4">
-                <a href="#" class="text-gray-400 hover:text-gray-500">
-                    <span class="sr-only">Twitter</span>
-                    <svg class="h-6 w-6" fill="currentColor" viewBox="0 0 24 24">
-                        <path d="M8.29 20.251c7.547 0 11.675-6.253 11.675-11.675 0-.178 0-.355-.012-.53A8.348 8.348 0 0022 5.92a8.19 8.19 0 01-2.357.646 4.118 4.118 0 001.804-2.27 8.224 8.224 0 01-2.605.996 4.107 4.107 0 00-6.993 3.743 11.65 11.65 0 01-8.457-4.287 4.106 4.106 0 001.27 5.477A4.072 4.072 0 012.8 9.713v.052a4.105 4.105 0 003.292 4.022 4.095 4.095 0 01-1.853.07 4.108 4.108 0 003.834 2.85A8.233 8.233 0 012 18.407a11.616 11.616 0 006.29 1.84" />
-                    </svg>
-                </a>
-                <a href="#" class="text-gray-400 hover:text-gray-500">
-                    <span class="sr-only">GitHub</span>
-                    <svg class="h-6 w-6" fill="currentColor" viewBox="0 0 24 24">
-                        <path fill-rule="evenodd" d="M12 2C6.477 2 2 6.484 2 12.017c0 4.425 2.865 8.18 6.839 9.504.5.092.682-.217.682-.483 0-.237-.008-.868-.013-1.703-2.782.605-3.369-1.343-3.369-1.343-.454-1.158-1.11-1.466-1.11-1.466-.908-.62.069-.608.069-.608 1.003.07 1.531 1.032 1.531 1.032.892 1.53 2.341 1.088 2.91.832.092-.647.35-1.088.636-1.338-2.22-.253-4.555-1.113-4.555-4.951 0-1.093.39-1.988 1.029-2.688-.103-.253-.446-1.272.098-2.65 0 0 .84-.27 2.75 1.026A9.564 9.564 0 0112 6.844c.85.004 1.705.115 2.504.337 1.909-1.296 2.747-1.027 2.747-1.027.546 1.379.202 2.398.1 2.651.64.7 1.028 1.595 1.028 2.688 0 3.848-2.339 4.695-4.566 4.943.359.309.678.92.678 1.855 0 1.338-.012 2.419-.012 2.747 0 .268.18.58.688.482A10.019 10.019 0 0022 12.017C22 6.484 17.522 2 12 2z" clip-rule="evenodd" />
-                    </svg>
-                </a>
-            </div>
-            <p>&copy; 2023 LearnHub. All rights reserved.</p>
-            <p class="mt-1">
-                <a href="#" class="hover:text-primary-600">Privacy Policy</a> · 
-                <a href="#" class="hover:text-primary-600">Terms of Service</a>
-            </p>
-        </footer>
-    </div>
-    
-    <script>
-        // Animate course cards on hover
-        document.addEventListener('DOMContentLoaded', function() {
-            const courseCards = document.querySelectorAll('.course-card');
-            courseCards.forEach(card => {
-                card.addEventListener('mouseenter', () => {
-                    card.querySelector('.course-icon').classList.add('animate-float');
-                });
-                card.addEventListener('mouseleave', () => {
-                    card.querySelector('.course-icon').classList.remove('animate-float');
-                });
-            });
-            
-            // Animate progress rings
-            const progressRings = document.querySelectorAll('.progress-ring');
-            progressRings.forEach(ring => {
-                const circle = ring.querySelector('.progress-ring__circle');
-                const radius = circle.r.baseVal.value;
-                const circumference = 2 * Math.PI * radius;
-                const progress = ring.dataset.progress;
-                
-                circle.style.strokeDasharray = circumference;
-                circle.style.strokeDashoffset = circumference - (progress / 100) * circumference;
-            });
-        });
-    </script>
-</body>
-</html>
-'''
-
-@app.route('/', methods=['GET', 'POST'])
-def select_course():
-    if request.method == "POST":
-        course = request.form.get("course")
-        if course:
-            return redirect(url_for("schedule_form", course=course))
-    return render_template_string(
-        FULL_TEMPLATE,
-        template='course_selection',
-        csrf_token=generate_csrf()
-    )
-
-@app.route("/schedule", methods=["GET", "POST"])
-def schedule_form():
-    course = request.args.get("course") or request.form.get("course")
-    if not course:
-        return redirect(url_for("select_course"))
-    
-    if request.method == "POST":
-        try:
-            name = request.form.get("name", "").strip()
-            phone = request.form.get("phone", "").strip()
-            days = request.form.get("days", "").strip()
-            time_str = request.form.get("time", "").strip()
-            
-            # Validation
-            if not all([name, phone, days, time_str]):
-                raise ValueError("All fields are required")
-            
-            if len(name) < 2:
-                raise ValueError("Please enter a valid name")
-            
-            if not phone.startswith('+'):
-                raise ValueError("Please enter a valid WhatsApp number with country code (e.g., +1 for US)")
-            
-            if not days.isdigit() or int(days) <= 0 or int(days) > 365:
-                raise ValueError("Please enter a valid number of days (1-365)")
-            
-            # Schedule the course with SMART TIME HANDLING
-            if schedule_course_messages_detailed(phone, course, int(days), time_str, name):
-                session['phone'] = phone
-                session['course'] = course
-                session['total_days'] = int(days)
-                session['user_name'] = name
-                session['time_str'] = time_str  # Store time for display
-                return redirect(url_for('progress'))
-            else:
-                raise Exception("Failed to schedule course messages")
-                
-        except ValueError as e:
-            error_message = str(e)
-            return render_template_string(
-                FULL_TEMPLATE,
-                template='user_form',
-                course=course,
-                error=error_message,
-                sandbox_code="aloud-coming",
-                twilio_whatsapp_number="+14155238886",
-                csrf_token=generate_csrf()
-            )
-        except Exception as e:
-            error_message = f"An error occurred: {str(e)}"
-            return render_template_string(
-                FULL_TEMPLATE,
-                template='user_form',
-                course=course,
-                error=error_message,
-                sandbox_code="sea-sun",
-                twilio_whatsapp_number="+14155238886",
-                csrf_token=generate_csrf()
-            )
-    
-    return render_template_string(
-        FULL_TEMPLATE,
-        template='user_form',
-        course=course,
-        sandbox_code="sea-sun",
-        twilio_whatsapp_number="+14155238886",
-        csrf_token=generate_csrf()
-    )
-
-@app.route("/progress")
-def progress():
-    phone = session.get('phone')
-    course = session.get('course')
-    total_days = session.get('total_days', 0)
-    time_str = session.get('time_str', '')
-    
-    if not phone or not course or not total_days:
-        return redirect(url_for('select_course'))
-    
-    completed_days = get_progress(phone, course)
-    
-    logger.info(f"📊 Progress check: {phone} - {course} - {completed_days}/{total_days} days")
-    
-    return render_template_string(
-        FULL_TEMPLATE,
-        template='confirm',
-        course=course,
-        total_days=total_days,
-        completed_days=completed_days,
-        time_str=time_str,
-        twilio_whatsapp_number="+14155238886",
-        csrf_token=generate_csrf()
-    )
-
-@app.route("/debug-schedules")
-def debug_schedules():
-    """Debug endpoint to see scheduled jobs"""
-    jobs = []
-    for job in scheduler.get_jobs():
-        jobs.append({
-            'id': job.id,
-            'next_run': job.next_run_time,
-            'args': job.args
-        })
-    
-    return jsonify({
-        'total_jobs': len(jobs),
-        'jobs': jobs,
-        'progress_store': progress_store,
-        'user_schedules': user_schedules,
-        'user_names': user_names
-    })
-
-@app.route("/send-now")
-def send_now():
-    """Send a lesson immediately for testing"""
-    phone = session.get('phone')
-    course = session.get('course')
-    total_days = session.get('total_days', 3)
-    
-    if not phone or not course:
-        return "No phone or course in session"
-    
-    try:
-        current_progress = get_progress(phone, course)
-        day_to_send = current_progress + 1
-        
-        if day_to_send > total_days:
-            return "Course already completed!"
-        
-        success = send_course_lesson(phone, course, day_to_send, total_days)
-        return f"Day {day_to_send} {'sent successfully!' if success else 'failed to send'}"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-@app.route("/course-agent", methods=["GET", "POST"])
-def course_agent():
-    return render_template_string(
-        FULL_TEMPLATE,
-        template='course_selection',
-        csrf_token=generate_csrf()
-    )
-
-@app.route("/signup", methods=["POST"])
-def signup():
-    fullname = request.form["fullname"].strip()
-    phone = request.form["phone"].strip()
-    password = request.form["password"]
-
-    try:
-        conn = sqlite3.connect("userform.db")
-        cur = conn.cursor()
-        cur.execute("INSERT INTO users (fullname, phone, password) VALUES (?, ?, ?)", 
-                    (fullname, phone, password))
-        conn.commit()
-        conn.close()
-
-        session["phone"] = phone
-        return redirect(url_for("schedule_form"))
-    except Exception as e:
-        return f"Signup failed: {str(e)}"
-
-@app.route("/certificate")
-def certificate():
-    if "phone" not in session:
-        return redirect(url_for("schedule_form"))
-
-    phone = session["phone"]
-    course = session.get("course", "Your Course")
-    total_days = session.get("total_days", 0)
-    
-    # FIXED: Check if course is actually completed
-    if not is_course_completed(phone, course, total_days):
-        return redirect(url_for('progress'))
-
-    date = datetime.now().strftime("%B %d, %Y")
-
-    # FIXED: Get user name from our stored names
-    name = get_user_name(phone)
-
-    return render_template("cert.html", name=name, course=course, date=date)
-
-# Graceful shutdown
-import atexit
-atexit.register(lambda: scheduler.shutdown())
-
-if __name__ == "__main__":
-    # FIXED: Start persistent scheduler
-    if not scheduler.running:
-        scheduler.start()
-        job_count = len(scheduler.get_jobs())
-        logger.info(f"✅ Persistent scheduler started with {job_count} jobs")
-    
-    port = int(os.environ.get("PORT", 8000))
-    logger.info(f"🚀 Starting Flask app on port {port}")
-    app.run(host='0.0.0.0', port=port, debug=False)
+import abc
+import os
+import re
+import sqlite3
+from twilio.base.exceptions import TwilioRestException
+from flask import Flask, request, redirect, url_for, session, jsonify, send_file, render_template, make_response, Response
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.events import (
+    EVENT_JOB_ADDED, EVENT_JOB_REMOVED, EVENT_ALL_JOBS_REMOVED,
+    EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED, EVENT_JOB_ERROR
+)
+from flask_wtf.csrf import CSRFProtect, generate_csrf
+from werkzeug.middleware.proxy_fix import ProxyFix
+import io
+from io import BytesIO
+from datetime import datetime, timedelta, timezone
+import logging
+import uuid
+import time
+import random
+import threading
+import asyncio
+import weakref
+import heapq
+import json
+import base64
+import bisect
+import hashlib
+import zlib
+import hmac
+import socket
+import csv
+import queue
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+load_dotenv()
+
+# === CONFIGURATION ===
+TWILIO_ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.environ.get("TWILIO_AUTH_TOKEN")
+TOGETHER_API_KEY = os.environ.get("TOGETHER_API_KEY")
+TWILIO_WHATSAPP_NUMBER = "whatsapp:+14155238886"  # Twilio WhatsApp sandbox
+APP_DB_PATH = os.environ.get("APP_DB_PATH", "learnhub.sqlite")  # Shared app database
+JOBSTORE_DB_PATH = os.environ.get("JOBSTORE_DB_PATH", "jobs.sqlite")  # APScheduler job store
+PROXY_HOPS = int(os.environ.get("PROXY_HOPS", 1))  # reverse proxies in front of gunicorn (Render has one); 0 trusts none
+
+if not all([TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN]):
+    raise ValueError("Missing Twilio credentials in environment variables")
+
+# === UPSTREAM CLIENT SETTINGS ===
+# Each upstream gets its own keep-alive connection pool, (connect, read)
+# timeouts, a bounded retry budget with jittered backoff and a circuit breaker.
+TOGETHER_POOL_SIZE = int(os.environ.get("TOGETHER_POOL_SIZE", 16))
+TOGETHER_CONNECT_TIMEOUT = float(os.environ.get("TOGETHER_CONNECT_TIMEOUT", 5))
+TOGETHER_READ_TIMEOUT = float(os.environ.get("TOGETHER_READ_TIMEOUT", 90))
+TOGETHER_MAX_RETRIES = int(os.environ.get("TOGETHER_MAX_RETRIES", 2))
+TWILIO_POOL_SIZE = int(os.environ.get("TWILIO_POOL_SIZE", 16))
+TWILIO_CONNECT_TIMEOUT = float(os.environ.get("TWILIO_CONNECT_TIMEOUT", 5))
+TWILIO_READ_TIMEOUT = float(os.environ.get("TWILIO_READ_TIMEOUT", 15))
+TWILIO_MAX_RETRIES = int(os.environ.get("TWILIO_MAX_RETRIES", 3))
+RETRY_BACKOFF_BASE = float(os.environ.get("RETRY_BACKOFF_BASE", 0.5))
+RETRY_BACKOFF_MAX = float(os.environ.get("RETRY_BACKOFF_MAX", 8))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS", 30))
+
+def make_pooled_session(pool_size):
+    """requests Session whose HTTPS pool keeps up to pool_size connections alive"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0))
+    return session
+
+# === Lazily built upstream clients ===
+# together and twilio.rest are the slowest imports in the app (together alone
+# is most of a second), and a web worker serving the course page never needs
+# them, so the clients are built on first use instead of at import time.
+_together_client = None
+_twilio_client = None
+_client_lock = threading.Lock()
+
+def get_together_client():
+    """Shared Together client; one pooled session for every thread, retries are handled by call_upstream"""
+    global _together_client
+    with _client_lock:
+        if _together_client is None:
+            import together as together_sdk
+            together_sdk.requestssession = make_pooled_session(TOGETHER_POOL_SIZE)
+            _together_client = together_sdk.Together(
+                api_key=TOGETHER_API_KEY,
+                timeout=(TOGETHER_CONNECT_TIMEOUT, TOGETHER_READ_TIMEOUT),
+                max_retries=0
+            )
+            logger.info("🤖 Together client ready")
+        return _together_client
+
+def get_twilio_client():
+    """Shared Twilio client with a pooled session and (connect, read) timeouts"""
+    global _twilio_client
+    with _client_lock:
+        if _twilio_client is None:
+            from twilio.rest import Client
+            from twilio.http.http_client import TwilioHttpClient
+            http_client = TwilioHttpClient(pool_connections=True, timeout=TWILIO_READ_TIMEOUT)
+            http_client.session = make_pooled_session(TWILIO_POOL_SIZE)
+            http_client.timeout = (TWILIO_CONNECT_TIMEOUT, TWILIO_READ_TIMEOUT)  # requests accepts a (connect, read) pair
+            _twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=http_client)
+            logger.info("📞 Twilio client ready")
+        return _twilio_client
+
+# === Flask & Scheduler Setup ===
+app = Flask(__name__)
+app.secret_key = os.environ.get("FLASK_SECRET_KEY", "your-fixed-secret-key-change-this")
+csrf = CSRFProtect(app)
+if PROXY_HOPS:
+    # TLS ends at the proxy: take scheme and host from its X-Forwarded headers so
+    # request.url is the https URL browsers and Twilio's webhook signatures use
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=PROXY_HOPS, x_host=PROXY_HOPS)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# FIXED: Persistent scheduler with SQLite job store
+# Built on first use: APScheduler's SQLAlchemy job store pulls in SQLAlchemy,
+# which web workers only need when an enrollment still has legacy jobs.
+# Listeners registered through add_scheduler_listener are attached on creation.
+_scheduler = None
+_scheduler_lock = threading.Lock()
+_scheduler_listeners = []
+
+def get_scheduler():
+    """The process-wide BackgroundScheduler (not started)"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from apscheduler.schedulers.background import BackgroundScheduler
+            if owns_global_jobs():
+                from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+                jobstores = {
+                    'default': SQLAlchemyJobStore(url=f'sqlite:///{JOBSTORE_DB_PATH}')
+                }
+            else:
+                # Other delivery shards only run their own dispatcher tick and
+                # must not fire the shared job store's jobs a second time
+                from apscheduler.jobstores.memory import MemoryJobStore
+                jobstores = {'default': MemoryJobStore()}
+            _scheduler = BackgroundScheduler(jobstores=jobstores, job_defaults=scheduler_job_defaults())
+            for callback, mask in _scheduler_listeners:
+                _scheduler.add_listener(callback, mask)
+        return _scheduler
+
+def add_scheduler_listener(callback, mask):
+    """Register a scheduler event listener, now or once the scheduler is built"""
+    with _scheduler_lock:
+        _scheduler_listeners.append((callback, mask))
+        if _scheduler is not None:
+            _scheduler.add_listener(callback, mask)
+
+def scheduler_running():
+    return _scheduler is not None and _scheduler.running
+
+@contextmanager
+def jobstore_connection():
+    """Read-only sqlite3 connection to the job store, for queries that must not unpickle jobs"""
+    conn = sqlite3.connect(f"file:{JOBSTORE_DB_PATH}?mode=ro", uri=True, timeout=5)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+# === METRICS ===
+# A small in-process registry rendered in the Prometheus text format on
+# /metrics. Values are per process, so scrape every gunicorn worker. Delivery
+# workers serve no HTTP, so with METRICS_PORT set each one serves its own
+# /metrics on METRICS_PORT (shard N on METRICS_PORT + N).
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))  # 0 disables the worker listener
+def format_metric_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def format_metric_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class Metric:
+    """Base class: a named family of samples keyed by label values"""
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def label_key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self):
+        """Yield (suffix, label pairs, value) for rendering"""
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield "", tuple(zip(self.labelnames, key)), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_metric_labels(labels)} {format_metric_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """A settable value, or one computed at scrape time by a callback
+
+    The callback returns a number, or a dict of label-value tuples to numbers.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = self.label_key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def samples(self):
+        if self.callback is None:
+            yield from super().samples()
+            return
+        try:
+            result = self.callback()
+        except Exception as e:
+            logger.warning(f"⚠️ Metric {self.name} unavailable: {str(e)}")
+            return
+        if not isinstance(result, dict):
+            result = {(): result}
+        for key, value in result.items():
+            yield "", tuple(zip(self.labelnames, key)), value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self.label_key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block; labels may be updated inside it"""
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self.lock:
+            items = [(key, (list(entry[0]), entry[1], entry[2])) for key, entry in self.values.items()]
+        for key, (counts, total, count) in items:
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield "_bucket", labels + (("le", format_metric_value(float(bound))),), cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, count
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, buckets, labelnames=()):
+        return self.register(Histogram(name, documentation, buckets, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+def start_metrics_server(port):
+    """Serve this process's metrics on :port/metrics from a daemon thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes would flood the log
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"📊 Worker metrics on :{port}/metrics")
+    return server
+
+LLM_GENERATION_SECONDS = metrics.histogram(
+    "learnhub_llm_generation_seconds", "Time to generate one lesson with the LLM",
+    (0.5, 1, 2, 5, 10, 20, 30, 60, 120), ("mode", "outcome"))
+LESSON_FIRST_PART_SECONDS = metrics.histogram(
+    "learnhub_lesson_first_part_seconds", "Time from starting a streamed lesson to queueing its first part",
+    (0.5, 1, 2, 5, 10, 20, 30, 60))
+LESSON_CACHE_LOOKUPS = metrics.counter(
+    "learnhub_lesson_cache_lookups_total", "Lesson content cache lookups", ("result",))
+TWILIO_SEND_SECONDS = metrics.histogram(
+    "learnhub_twilio_send_seconds", "Latency of one WhatsApp send through Twilio, retries included",
+    (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30), ("outcome",))
+TWILIO_SEND_FAILURES = metrics.counter(
+    "learnhub_twilio_send_failures_total", "WhatsApp sends that failed", ("reason",))
+LESSON_PARTS = metrics.histogram(
+    "learnhub_lesson_parts", "WhatsApp messages needed per lesson", (1, 2, 3, 4, 5, 6, 8, 10, 15))
+LESSON_DELIVERY_SECONDS = metrics.histogram(
+    "learnhub_lesson_delivery_seconds", "Time to generate and send a whole lesson",
+    (1, 5, 10, 30, 60, 120, 300, 600, 1800), ("outcome",))
+SCHEDULER_LAG_SECONDS = metrics.histogram(
+    "learnhub_scheduler_lag_seconds", "Delay between a job's scheduled run time and its submission",
+    (0.1, 0.5, 1, 5, 15, 30, 60, 300, 900), ("job",))
+SCHEDULER_JOB_EVENTS = metrics.counter(
+    "learnhub_scheduler_job_events_total", "Scheduler jobs that errored or missed their run time", ("job", "event"))
+DELIVERY_LAG_SECONDS = metrics.histogram(
+    "learnhub_delivery_lag_seconds", "Delay between a lesson's next_send_at and the dispatcher claiming it",
+    (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+
+# === UPSTREAM RESILIENCE ===
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+class CircuitBreaker:
+    """Opens after consecutive upstream failures, lets one trial call through after a cool-down"""
+
+    def __init__(self, name, failure_threshold, reset_seconds):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return 'open'
+        return 'half-open'
+
+    def before_call(self):
+        with self.lock:
+            state = self.state
+            if state == 'open' or (state == 'half-open' and self.trial_in_flight):
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            if state == 'half-open':
+                self.trial_in_flight = True
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info(f"🟢 {self.name} circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning(f"🔴 {self.name} circuit opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+together_breaker = CircuitBreaker("Together", CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+twilio_breaker = CircuitBreaker("Twilio", CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+
+def is_together_retryable(error):
+    """Timeouts, connection errors, rate limits and 5xx from Together"""
+    import requests
+    from together import error as together_errors
+    return isinstance(error, (
+        together_errors.Timeout,
+        together_errors.APIConnectionError,
+        together_errors.RateLimitError,
+        together_errors.ServiceUnavailableError,
+        together_errors.APIError,
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+    ))
+
+def is_twilio_retryable(error):
+    """Only failures where Twilio cannot have accepted the message, so a retry never duplicates it"""
+    if isinstance(error, TwilioRestException):
+        return error.status in (429, 503)
+    # ConnectTimeout is a ConnectionError; a ReadTimeout may already have been delivered
+    import requests
+    return isinstance(error, requests.exceptions.ConnectionError)
+
+def call_upstream(breaker, is_retryable, max_retries, func, *args, **kwargs):
+    """Call an upstream with circuit breaking and jittered exponential backoff retries"""
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.record_success()  # The upstream answered; the request itself was bad
+                raise
+            breaker.record_failure()
+            if attempt >= max_retries:
+                raise
+            delay = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** attempt))
+            attempt += 1
+            logger.warning(f"🔁 {breaker.name} call failed ({str(e)}), retry {attempt}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+# === APP DATABASE ===
+# SQLite in WAL mode so readers never block the writer, shared by every process
+# through the same file. Connections are pooled per process.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 30000))
+
+class PoolExhaustedError(Exception):
+    """Raised when no pooled connection is returned within DB_BUSY_TIMEOUT_MS"""
+
+class SQLiteConnectionPool:
+    """Fixed-size pool of SQLite connections, recreated after a fork"""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self._pid = None
+        self._idle = None
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Never share connections inherited from a parent process
+                self._pid = os.getpid()
+                self._idle = queue.LifoQueue()
+                self._created = 0
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                if self._created < self.size:
+                    self._created += 1
+                    return self._connect()
+            idle = self._idle
+        try:
+            return idle.get(timeout=DB_BUSY_TIMEOUT_MS / 1000)
+        except queue.Empty:
+            raise PoolExhaustedError(
+                f"All {self.size} connections to {self.path} stayed in use for {DB_BUSY_TIMEOUT_MS}ms; raise DB_POOL_SIZE"
+            ) from None
+
+    def release(self, conn):
+        if self._pid == os.getpid():
+            self._idle.put(conn)
+
+db_pool = SQLiteConnectionPool(APP_DB_PATH, DB_POOL_SIZE)
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled connection to the shared app database, commit on success"""
+    conn = db_pool.acquire()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        db_pool.release(conn)
+
+def ensure_column(conn, table, column, definition):
+    """Add a column to an existing table created by an older version"""
+    columns = [row["name"] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+# === PROGRESS & USER STORE ===
+# Progress and learner names live behind a pluggable store so every web and
+# worker process reads the same values. PROGRESS_STORE=sqlite (default) is
+# durable and shared; PROGRESS_STORE=memory keeps the old per-process dicts.
+PROGRESS_STORE = os.environ.get("PROGRESS_STORE", "sqlite")
+PROGRESS_BATCH_SIZE = int(os.environ.get("PROGRESS_BATCH_SIZE", 200))
+PROGRESS_BATCH_WINDOW_MS = int(os.environ.get("PROGRESS_BATCH_WINDOW_MS", 5))
+
+class ProgressStore(abc.ABC):
+    """Interface for progress and user name persistence"""
+
+    @abc.abstractmethod
+    def increment_progress(self, phone, course):
+        """Add one completed day and return the new total"""
+
+    @abc.abstractmethod
+    def get_progress(self, phone, course):
+        pass
+
+    @abc.abstractmethod
+    def reset_progress(self, phone, course):
+        pass
+
+    @abc.abstractmethod
+    def store_user_name(self, phone, name):
+        pass
+
+    @abc.abstractmethod
+    def get_user_name(self, phone):
+        """Return the stored name, or None"""
+
+    def increment_progress_in(self, conn, phone, course):
+        """Add one completed day inside an open app DB transaction; False if this store cannot"""
+        return False
+
+    def reset_progress_many(self, keys):
+        """Reset progress for many (phone, course) pairs at once"""
+        for phone, course in keys:
+            self.reset_progress(phone, course)
+
+    def store_user_names(self, names):
+        """Store many (phone, name) pairs at once"""
+        for phone, name in names:
+            self.store_user_name(phone, name)
+
+    @abc.abstractmethod
+    def snapshot(self):
+        """All progress and names, for debugging"""
+
+class MemoryProgressStore(ProgressStore):
+    """Process-local dicts; only consistent with a single process"""
+
+    def __init__(self):
+        self.progress = {}  # key: (phone, course), value: int (completed days)
+        self.names = {}
+        self.lock = threading.Lock()
+
+    def increment_progress(self, phone, course):
+        with self.lock:
+            self.progress[(phone, course)] = self.progress.get((phone, course), 0) + 1
+            return self.progress[(phone, course)]
+
+    def get_progress(self, phone, course):
+        return self.progress.get((phone, course), 0)
+
+    def reset_progress(self, phone, course):
+        with self.lock:
+            self.progress[(phone, course)] = 0
+
+    def store_user_name(self, phone, name):
+        self.names[phone] = name
+
+    def get_user_name(self, phone):
+        return self.names.get(phone)
+
+    def snapshot(self):
+        return {
+            'progress': {f"{phone}|{course}": days for (phone, course), days in self.progress.items()},
+            'user_names': dict(self.names)
+        }
+
+class SQLiteProgressStore(ProgressStore):
+    """Durable store on the shared app database with group-committed writes
+
+    Writers hand their statement to a single writer thread, which commits
+    everything queued within a few milliseconds in one transaction. Callers
+    wait for that commit, so a write is visible to every process on return.
+    """
+
+    def __init__(self):
+        self._writes = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        with db_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS progress (
+                    phone TEXT NOT NULL,
+                    course TEXT NOT NULL,
+                    completed_days INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (phone, course)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS user_names (
+                    phone TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def _write(self, sql, params):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="progress-writer", daemon=True)
+                self._writer.start()
+        pending = {'done': threading.Event(), 'error': None}
+        self._writes.put((sql, params, pending))
+        pending['done'].wait()
+        if pending['error'] is not None:
+            raise pending['error']
+
+    def _write_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            deadline = time.monotonic() + PROGRESS_BATCH_WINDOW_MS / 1000
+            while len(batch) < PROGRESS_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._writes.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                with db_connection() as conn:
+                    for sql, params, _ in batch:
+                        conn.execute(sql, params)
+            except Exception:
+                # Apply one by one so a single bad write does not fail the batch
+                for sql, params, pending in batch:
+                    try:
+                        with db_connection() as conn:
+                            conn.execute(sql, params)
+                    except Exception as e:
+                        pending['error'] = e
+            finally:
+                for _, _, pending in batch:
+                    pending['done'].set()
+
+    def increment_progress(self, phone, course):
+        self._write(
+            "INSERT INTO progress (phone, course, completed_days, updated_at) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT (phone, course) DO UPDATE SET completed_days = completed_days + 1, updated_at = excluded.updated_at",
+            (phone, course, time.time())
+        )
+        return self.get_progress(phone, course)
+
+    def increment_progress_in(self, conn, phone, course):
+        conn.execute(
+            "INSERT INTO progress (phone, course, completed_days, updated_at) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT (phone, course) DO UPDATE SET completed_days = completed_days + 1, updated_at = excluded.updated_at",
+            (phone, course, time.time())
+        )
+        logger.info(f"📈 Progress updated: {phone} - {course}")
+        return True
+
+    def get_progress(self, phone, course):
+        with db_connection() as conn:
+            row = conn.execute(
+                "SELECT completed_days FROM progress WHERE phone = ? AND course = ?", (phone, course)
+            ).fetchone()
+        return row["completed_days"] if row else 0
+
+    def reset_progress(self, phone, course):
+        self._write(
+            "INSERT OR REPLACE INTO progress (phone, course, completed_days, updated_at) VALUES (?, ?, 0, ?)",
+            (phone, course, time.time())
+        )
+
+    def store_user_name(self, phone, name):
+        self._write(
+            "INSERT OR REPLACE INTO user_names (phone, name, updated_at) VALUES (?, ?, ?)",
+            (phone, name, time.time())
+        )
+
+    def get_user_name(self, phone):
+        with db_connection() as conn:
+            row = conn.execute("SELECT name FROM user_names WHERE phone = ?", (phone,)).fetchone()
+        return row["name"] if row else None
+
+    def reset_progress_many(self, keys):
+        now = time.time()
+        with db_connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO progress (phone, course, completed_days, updated_at) VALUES (?, ?, 0, ?)",
+                [(phone, course, now) for phone, course in keys]
+            )
+
+    def store_user_names(self, names):
+        now = time.time()
+        with db_connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO user_names (phone, name, updated_at) VALUES (?, ?, ?)",
+                [(phone, name, now) for phone, name in names]
+            )
+
+    def snapshot(self):
+        with db_connection() as conn:
+            progress = conn.execute("SELECT phone, course, completed_days FROM progress").fetchall()
+            names = conn.execute("SELECT phone, name FROM user_names").fetchall()
+        return {
+            'progress': {f"{row['phone']}|{row['course']}": row["completed_days"] for row in progress},
+            'user_names': {row["phone"]: row["name"] for row in names}
+        }
+
+PROGRESS_STORES = {
+    'sqlite': SQLiteProgressStore,
+    'memory': MemoryProgressStore,
+}
+
+progress_backend = PROGRESS_STORES[PROGRESS_STORE]()
+
+def store_user_name(phone, name):
+    """Store user name for certificate generation"""
+    progress_backend.store_user_name(phone, name)
+    logger.info(f"✅ User name stored: {phone} - {name}")
+
+def get_user_name(phone):
+    """Get user name for certificate generation"""
+    return progress_backend.get_user_name(phone) or phone  # Return phone if name not found
+
+def increment_progress(phone, course):
+    completed = progress_backend.increment_progress(phone, course)
+    logger.info(f"📈 Progress updated: {phone} - {course} - Day {completed}")
+
+def get_progress(phone, course):
+    return progress_backend.get_progress(phone, course)
+
+def reset_progress(phone, course):
+    progress_backend.reset_progress(phone, course)
+    logger.info(f"🔄 Progress reset: {phone} - {course}")
+
+def is_course_completed(phone, course, total_days):
+    """Check if course is actually completed"""
+    progress = get_progress(phone, course)
+    return progress >= total_days
+
+# === MESSAGE SPLITTING ===
+# Twilio rejects WhatsApp bodies over 1600 characters, counted in UTF-16 code
+# units, so an emoji outside the BMP costs two.
+WHATSAPP_MAX_LENGTH = int(os.environ.get("WHATSAPP_MAX_LENGTH", "1600"))
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+
+def message_length(text):
+    """Length of text as WhatsApp counts it (UTF-16 code units)"""
+    return len(text.encode('utf-16-le')) // 2
+
+def part_header(index, total=None):
+    """Header prepended to each part of a multi-part message"""
+    if total is None:
+        return f"📚 Part {index}\n\n"
+    return f"📚 Part {index}/{total}\n\n"
+
+def hard_split(text, budget):
+    """Cut text into chunks of at most budget code units, never inside a surrogate pair"""
+    chunks = []
+    start = 0
+    used = 0
+    for i, char in enumerate(text):
+        width = 2 if ord(char) > 0xFFFF else 1
+        if used + width > budget:
+            chunks.append(text[start:i])
+            start = i
+            used = 0
+        used += width
+    chunks.append(text[start:])
+    return chunks
+
+# Boundaries tried in order for text that does not fit: sections, lines,
+# sentences, then raw characters. Each entry is (joiner, split function).
+SPLIT_LEVELS = (
+    ('\n\n', lambda text, budget: text.split('\n\n')),
+    ('\n', lambda text, budget: text.split('\n')),
+    (' ', lambda text, budget: SENTENCE_END_RE.split(text)),
+    ('', hard_split),
+)
+
+def split_pieces(text, budget, level=0):
+    """Yield (joiner, piece, length) tuples where every piece fits in budget
+
+    The joiner is the text that separated the piece from the previous one
+    and is dropped when the piece starts a new part.
+    """
+    joiner, split = SPLIT_LEVELS[level]
+    for chunk in split(text, budget):
+        if not chunk.strip():
+            continue
+        length = message_length(chunk)
+        if length <= budget:
+            yield joiner, chunk, length
+            continue
+        first = True
+        for inner_joiner, piece, piece_length in split_pieces(chunk, budget, level + 1):
+            yield (joiner if first else inner_joiner), piece, piece_length
+            first = False
+
+class PartPacker:
+    """Greedily pack pieces into parts of at most budget code units"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.current = []
+        self.used = 0
+
+    def add(self, joiner, piece, length):
+        """Add a piece, return the finished part body if it had to be closed"""
+        finished = None
+        if self.current and self.used + len(joiner) + length > self.budget:
+            finished = self.flush()
+        if self.current:
+            self.current.append(joiner)
+            self.used += len(joiner)
+        self.current.append(piece)
+        self.used += length
+        return finished
+
+    def flush(self):
+        """Close the current part and return its body (None when empty)"""
+        if not self.current:
+            return None
+        body = ''.join(self.current).strip()
+        self.current = []
+        self.used = 0
+        return body
+
+def split_long_message(message, max_length=WHATSAPP_MAX_LENGTH):
+    """Split long messages into multiple parts that fit within WhatsApp limits"""
+    if message_length(message) <= max_length:
+        return [message]
+    
+    # Reserve room for the "Part i/n" header up front. n is only known after
+    # packing, so assume one digit and repack in the rare case it needs more.
+    digits = 1
+    while True:
+        widest = '9' * digits
+        packer = PartPacker(max_length - message_length(part_header(widest, widest)))
+        parts = []
+        for joiner, piece, length in split_pieces(message, packer.budget):
+            finished = packer.add(joiner, piece, length)
+            if finished:
+                parts.append(finished)
+        last = packer.flush()
+        if last:
+            parts.append(last)
+        if len(str(len(parts))) <= digits:
+            break
+        digits = len(str(len(parts)))
+    
+    # Add part indicators
+    if len(parts) > 1:
+        parts = [part_header(i + 1, len(parts)) + part for i, part in enumerate(parts)]
+    
+    logger.info(f"✂️ Split message into {len(parts)} parts")
+    return parts
+
+class IncrementalSplitter:
+    """Cut text that arrives in pieces into WhatsApp-sized parts as it goes
+
+    A part is released as soon as the next piece would overflow it, which
+    also means more parts follow, so streamed parts are numbered without a
+    total ("📚 Part i"). A message that fits in one part is only released by
+    finish() and has no part header, like split_long_message.
+    """
+
+    def __init__(self, max_length=WHATSAPP_MAX_LENGTH):
+        self.packer = PartPacker(max_length - message_length(part_header(999)))
+        self.pending = ""  # text after the last complete section
+        self.released = 0
+
+    def feed(self, text):
+        """Add text, return any parts that are now complete"""
+        self.pending += text
+        end = self.pending.rfind('\n\n')
+        if end == -1:
+            return []
+        complete, self.pending = self.pending[:end], self.pending[end + 2:]
+        return self._add(complete)
+
+    def finish(self):
+        """Flush everything left, return the final parts"""
+        parts = self._add(self.pending)
+        self.pending = ""
+        body = self.packer.flush()
+        if body:
+            parts.append(body if self.released == 0 else self._release(body))
+        return parts
+
+    def _add(self, text):
+        parts = []
+        for joiner, piece, length in split_pieces(text, self.packer.budget):
+            finished = self.packer.add(joiner, piece, length)
+            if finished:
+                parts.append(self._release(finished))
+        return parts
+
+    def _release(self, body):
+        self.released += 1
+        return part_header(self.released) + body
+
+# === LESSON GENERATION SETTINGS ===
+LESSON_MODEL = "meta-llama/Llama-3-70b-chat-hf"
+LESSON_MAX_TOKENS = 1200  # lessons are written from an outline slot, see COURSE CURRICULUM
+LLM_STREAMING = os.environ.get("LLM_STREAMING", "true").lower() in ("1", "true", "yes")
+
+# === LESSON CONTENT CACHE ===
+# A lesson only depends on (course, day, total_days) and the prompt, so one
+# generation is shared by every learner on that lesson. SQLite keeps it across
+# restarts and workers, an in-process LRU sits in front of it.
+LESSON_PROMPT_VERSION = "v2"  # Bump when the lesson prompt changes
+CONTENT_CACHE_TTL_SECONDS = int(os.environ.get("CONTENT_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+CONTENT_CACHE_MAX_ROWS = int(os.environ.get("CONTENT_CACHE_MAX_ROWS", 5000))
+CONTENT_CACHE_MEMORY_SIZE = int(os.environ.get("CONTENT_CACHE_MEMORY_SIZE", 256))
+
+_content_cache_memory = OrderedDict()  # key: cache_key, value: (content, created_at)
+_content_cache_lock = threading.Lock()
+
+def init_content_cache():
+    """Create the lesson cache table if it does not exist yet"""
+    with db_connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS lesson_cache (
+                cache_key TEXT PRIMARY KEY,
+                course TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                total_days INTEGER NOT NULL,
+                prompt_version TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_lesson_cache_last_access ON lesson_cache (last_access)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_lesson_cache_created_at ON lesson_cache (created_at)")
+
+def normalize_course_name(course):
+    """Normalize a course name so 'Python  programming' and 'python programming' share lessons"""
+    return " ".join(course.split()).casefold()
+
+def lesson_cache_key(course, day, total_days):
+    return f"{LESSON_PROMPT_VERSION}|{normalize_course_name(course)}|{day}|{total_days}"
+
+def _remember_in_memory(key, content, created_at):
+    with _content_cache_lock:
+        _content_cache_memory[key] = (content, created_at)
+        _content_cache_memory.move_to_end(key)
+        while len(_content_cache_memory) > CONTENT_CACHE_MEMORY_SIZE:
+            _content_cache_memory.popitem(last=False)
+
+def get_cached_lesson(course, day, total_days):
+    """Return cached lesson content, or None on a miss or expired entry"""
+    key = lesson_cache_key(course, day, total_days)
+    now = time.time()
+    with _content_cache_lock:
+        entry = _content_cache_memory.get(key)
+        if entry is not None:
+            if now - entry[1] < CONTENT_CACHE_TTL_SECONDS:
+                _content_cache_memory.move_to_end(key)
+                LESSON_CACHE_LOOKUPS.inc(result="hit")
+                return entry[0]
+            del _content_cache_memory[key]
+    try:
+        with db_connection() as conn:
+            row = conn.execute(
+                "SELECT content, created_at FROM lesson_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                LESSON_CACHE_LOOKUPS.inc(result="miss")
+                return None
+            if now - row["created_at"] >= CONTENT_CACHE_TTL_SECONDS:
+                conn.execute("DELETE FROM lesson_cache WHERE cache_key = ?", (key,))
+                LESSON_CACHE_LOOKUPS.inc(result="expired")
+                return None
+            conn.execute("UPDATE lesson_cache SET last_access = ? WHERE cache_key = ?", (now, key))
+        _remember_in_memory(key, row["content"], row["created_at"])
+        LESSON_CACHE_LOOKUPS.inc(result="hit")
+        return row["content"]
+    except Exception as e:
+        logger.warning(f"⚠️ Lesson cache read failed: {str(e)}")
+        LESSON_CACHE_LOOKUPS.inc(result="error")
+        return None
+
+def store_cached_lesson(course, day, total_days, content):
+    """Persist generated lesson content and evict expired or excess entries"""
+    key = lesson_cache_key(course, day, total_days)
+    now = time.time()
+    _remember_in_memory(key, content, now)
+    try:
+        with db_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO lesson_cache "
+                "(cache_key, course, day, total_days, prompt_version, content, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, normalize_course_name(course), day, total_days, LESSON_PROMPT_VERSION, content, now, now)
+            )
+            conn.execute("DELETE FROM lesson_cache WHERE created_at < ?", (now - CONTENT_CACHE_TTL_SECONDS,))
+            excess = conn.execute("SELECT COUNT(*) FROM lesson_cache").fetchone()[0] - CONTENT_CACHE_MAX_ROWS
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM lesson_cache WHERE cache_key IN "
+                    "(SELECT cache_key FROM lesson_cache ORDER BY last_access ASC LIMIT ?)",
+                    (excess,)
+                )
+                logger.info(f"🧹 Evicted {excess} lessons from cache")
+    except Exception as e:
+        logger.warning(f"⚠️ Lesson cache write failed: {str(e)}")
+
+init_content_cache()
+
+# === SINGLE-FLIGHT GENERATION ===
+# When a whole cohort's Day N fires at once, every learner misses the cache
+# for the same lesson. The first caller for a key becomes the leader and
+# generates; everyone else waits on the leader's Future and gets the same
+# text. Futures are concurrent.futures ones so threads and the asyncio
+# engine share the same table. A leader that ends with None (e.g. a failed
+# stream, or a do() whose func raised) hands the key to the next waiter
+# instead of failing everyone; a func that returns None shares that result.
+LESSON_GENERATIONS_SHARED = metrics.counter(
+    "learnhub_lesson_generations_shared_total", "Lesson requests served by another caller's in-flight generation")
+
+class SingleFlight:
+    EMPTY = object()  # finish() value for a leader whose func returned None: waiters get None, no retry
+
+    def __init__(self):
+        self.calls = {}  # key: lesson or outline key, value: Future of the result
+        self.lock = threading.Lock()
+
+    def join(self, key):
+        """Return (future, is_leader); the leader must call finish(key, value)"""
+        with self.lock:
+            future = self.calls.get(key)
+            if future is not None:
+                return future, False
+            future = self.calls[key] = Future()
+            return future, True
+
+    def finish(self, key, value):
+        with self.lock:
+            future = self.calls.pop(key)
+        future.set_result(value)
+
+    def do(self, key, func, *args):
+        """Run func(*args) once for all concurrent callers with the same key"""
+        while True:
+            future, leader = self.join(key)
+            if not leader:
+                LESSON_GENERATIONS_SHARED.inc()
+                value = future.result()
+                if value is self.EMPTY:
+                    return None
+                if value is not None:
+                    return value
+                continue  # the leader failed; try again, possibly as leader
+            value = None
+            try:
+                value = func(*args)
+                if value is None:
+                    value = self.EMPTY
+                return None if value is self.EMPTY else value
+            finally:
+                self.finish(key, value)
+
+lesson_flight = SingleFlight()
+
+# === COURSE CURRICULUM ===
+# A course is planned once per (course, total_days): one short line per day
+# with its title and topics. Each lesson is then written from its own slot
+# and its neighbours' titles, so days build on each other instead of
+# repeating, and the per-lesson prompt and max_tokens stay small.
+OUTLINE_PROMPT_VERSION = "v1"  # Bump when the outline prompt changes
+OUTLINE_TOKENS_PER_DAY = 40
+OUTLINE_MAX_TOKENS = 4000  # longer courses keep the days that fit; the rest get no slot
+OUTLINE_LINE_RE = re.compile(r"^\W*day\s*(\d+)\s*[:.)\-\u2013\u2014]\s*(.+)$", re.IGNORECASE)
+OUTLINE_RETRY_SECONDS = int(os.environ.get("OUTLINE_RETRY_SECONDS", 600))  # after a failed plan, lessons go without one this long
+
+_course_outlines = {}  # key: outline_key, value: {day: (title, topics)}, or the monotonic time to retry a failed plan
+_course_outlines_lock = threading.Lock()
+
+def init_course_outlines():
+    """Create the course outline table if it does not exist yet"""
+    with db_connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS course_outlines (
+                outline_key TEXT PRIMARY KEY,
+                course TEXT NOT NULL,
+                total_days INTEGER NOT NULL,
+                prompt_version TEXT NOT NULL,
+                outline TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+
+def outline_key(course, total_days):
+    return f"outline|{OUTLINE_PROMPT_VERSION}|{normalize_course_name(course)}|{total_days}"
+
+def build_outline_prompt(course, total_days):
+    """Prompt for a whole course plan, one line per day"""
+    return f"""
+Plan a {total_days}-day course: '{course}'. One short lesson is sent per day on WhatsApp.
+
+Reply with exactly {total_days} lines and nothing else, one per day, in order:
+Day N: <lesson title> | <2-3 key topics, comma separated>
+
+Go from fundamentals to advanced, never repeat a topic, and end with a project or review.
+"""
+
+def parse_course_outline(text, total_days):
+    """{day: (title, topics)} for every well-formed 'Day N: title | topics' line"""
+    outline = {}
+    for line in text.splitlines():
+        match = OUTLINE_LINE_RE.match(line.strip())
+        if not match:
+            continue
+        day = int(match.group(1))
+        if 1 <= day <= total_days and day not in outline:
+            title, _, topics = match.group(2).partition("|")
+            outline[day] = (title.strip(" *"), topics.strip(" *"))
+    return outline
+
+def load_course_outline(key):
+    try:
+        with db_connection() as conn:
+            row = conn.execute("SELECT outline FROM course_outlines WHERE outline_key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return {int(day): tuple(slot) for day, slot in json.loads(row["outline"]).items()}
+    except Exception as e:
+        logger.warning(f"⚠️ Course outline read failed: {str(e)}")
+        return None
+
+def generate_course_outline(course, total_days):
+    """Ask the LLM for the course plan and persist it; None if that fails"""
+    key = outline_key(course, total_days)
+    outline = load_course_outline(key)  # another worker may have planned it meanwhile
+    if outline:
+        return outline
+    try:
+        logger.info(f"🗺️ Planning curriculum for {course} ({total_days} days)")
+        with LLM_GENERATION_SECONDS.time(mode="outline", outcome="error") as labels:
+            response = call_upstream(
+                together_breaker, is_together_retryable, TOGETHER_MAX_RETRIES,
+                get_together_client().chat.completions.create,
+                model=LESSON_MODEL,
+                messages=[{"role": "user", "content": build_outline_prompt(course, total_days)}],
+                temperature=0.3,
+                max_tokens=min(OUTLINE_MAX_TOKENS, 100 + OUTLINE_TOKENS_PER_DAY * total_days)
+            )
+            outline = parse_course_outline(response.choices[0].message.content, total_days)
+            if not outline:
+                raise ValueError("no 'Day N:' lines in the outline")
+            labels["outcome"] = "success"
+    except Exception as e:
+        logger.error(f"❌ Error planning curriculum for {course}: {str(e)}")
+        return None
+    if len(outline) < total_days:
+        logger.warning(f"⚠️ Curriculum for {course} covers {len(outline)} of {total_days} days")
+    try:
+        with db_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO course_outlines "
+                "(outline_key, course, total_days, prompt_version, outline, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalize_course_name(course), total_days, OUTLINE_PROMPT_VERSION,
+                 json.dumps(outline), time.time())
+            )
+    except Exception as e:
+        logger.warning(f"⚠️ Course outline write failed: {str(e)}")
+    logger.info(f"✅ Curriculum planned for {course} ({len(outline)} days)")
+    return outline
+
+def get_course_outline(course, total_days):
+    """Outline for a course, planned once and shared; None if it cannot be planned"""
+    key = outline_key(course, total_days)
+    with _course_outlines_lock:
+        outline = _course_outlines.get(key)
+    if isinstance(outline, dict):
+        return outline
+    if outline is not None and time.monotonic() < outline:
+        return None  # planning failed recently; don't pay for another outline call per lesson
+    outline = load_course_outline(key) or lesson_flight.do(key, generate_course_outline, course, total_days)
+    with _course_outlines_lock:
+        _course_outlines[key] = outline or time.monotonic() + OUTLINE_RETRY_SECONDS
+    return outline
+
+init_course_outlines()
+
+LESSON_SECTIONS = """Use exactly these sections with short bullets:
+🎯 DAY {part} OBJECTIVES: 3 objectives
+🧠 CORE CONCEPTS: 2-3 concepts, each with a short example
+💻 HANDS-ON EXERCISE: one exercise, steps and expected result
+🎥 VIDEO REFERENCES: 2 YouTube tutorial links under 15 minutes
+📚 ADDITIONAL RESOURCES: 2 documentation or article links
+💡 KEY TAKEAWAYS: 3 points"""
+
+def lesson_focus(outline, part):
+    """What one day should cover, from its outline slot when there is one"""
+    if part not in outline:
+        return "Pick the next logical topic for this point in the course."
+    title, topics = outline[part]
+    return f"{title}" + (f" (topics: {topics})" if topics else "")
+
+def build_lesson_prompt(course, part, total_days):
+    """Short prompt for one lesson, written from its outline slot when there is one"""
+    outline = get_course_outline(course, total_days) or {}
+    context = []
+    if part - 1 in outline:
+        context.append(f"Yesterday covered: {outline[part - 1][0]}. Do not repeat it.")
+    if part + 1 in outline:
+        context.append(f"Tomorrow covers: {outline[part + 1][0]}. Do not cover it yet.")
+    context = "\n".join(context)
+    return f"""
+Write day {part} of {total_days} of the course '{course}'.
+Today's lesson: {lesson_focus(outline, part)}
+{context}
+
+{LESSON_SECTIONS.format(part=part)}
+
+No introduction or closing remarks.
+"""
+
+def fallback_course_content(course, part):
+    """Static lesson used when the LLM is unavailable"""
+    return f"""🎯 DAY {part} OBJECTIVES:
+• Understand key concepts of {course}
+• Practice with hands-on exercises
+• Explore additional learning resources
+
+🧠 CORE CONCEPTS:
+Today we focus on fundamental concepts that form the foundation of {course}. These concepts are essential for building your skills.
+
+💻 HANDS-ON EXERCISE:
+Try building a small project applying today's concepts. Start simple and gradually add complexity.
+
+🎥 VIDEO REFERENCES:
+• Search YouTube for "{course} tutorial day {part}"
+• Look for official documentation videos
+
+📚 ADDITIONAL RESOURCES:
+• Official documentation
+• MDN Web Docs (for web technologies)
+• Stack Overflow for specific questions
+
+💡 KEY TAKEAWAYS:
+• Practice consistently
+• Build projects to reinforce learning
+• Use multiple learning resources"""
+
+def generate_detailed_course_content(course, part, total_days):
+    """Generate detailed course content with YouTube links and references"""
+    cached = get_cached_lesson(course, part, total_days)
+    if cached is not None:
+        logger.info(f"⚡ Lesson cache hit for {course} - Day {part}/{total_days}")
+        return cached
+    return lesson_flight.do(lesson_cache_key(course, part, total_days), generate_uncached_content, course, part, total_days)
+
+def generate_uncached_content(course, part, total_days):
+    """Call the LLM for one lesson and cache it; static content if that fails"""
+    try:
+        prompt = build_lesson_prompt(course, part, total_days)
+        logger.info(f"🤖 Generating detailed content for {course} - Day {part}/{total_days}")
+        with LLM_GENERATION_SECONDS.time(mode="full", outcome="error") as labels:
+            response = call_upstream(
+                together_breaker, is_together_retryable, TOGETHER_MAX_RETRIES,
+                get_together_client().chat.completions.create,
+                model=LESSON_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                max_tokens=LESSON_MAX_TOKENS
+            )
+            content = response.choices[0].message.content.strip()
+            labels["outcome"] = "success"
+        logger.info(f"✅ Detailed content generated for Day {part} ({len(content)} chars)")
+        store_cached_lesson(course, part, total_days, content)
+        return content
+    except Exception as e:
+        logger.error(f"❌ Error generating detailed content: {str(e)}")
+        # Fallback detailed content
+        return fallback_course_content(course, part)
+
+def stream_course_content(course, part, total_days):
+    """Yield lesson text from Together as it is generated"""
+    prompt = build_lesson_prompt(course, part, total_days)
+    logger.info(f"🤖 Streaming detailed content for {course} - Day {part}/{total_days}")
+    stream = call_upstream(
+        together_breaker, is_together_retryable, TOGETHER_MAX_RETRIES,
+        get_together_client().chat.completions.create,
+        model=LESSON_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.7,
+        max_tokens=LESSON_MAX_TOKENS,
+        stream=True
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+# === BATCHED LESSON GENERATION ===
+# Pre-generation writes several days of a course in one request: the course
+# context and section instructions are sent once instead of once per day, and
+# one round-trip yields several lessons. Each day comes back behind a
+# "=== DAY N ===" marker; a day only counts once the next marker (or the final
+# "=== END ===") shows it was not cut off by max_tokens. Days that are missing
+# from the reply are left to the normal one-lesson path.
+LESSON_BATCH_DAYS = int(os.environ.get("LESSON_BATCH_DAYS", 4))  # 1 disables batching
+LESSON_BATCH_MAX_TOKENS = 6000  # stays inside the model's 8k context with the prompt
+LESSON_BATCH_MARKER_RE = re.compile(r"^\W*=+\s*(DAY\s+(\d+)|END)\s*=+\W*$", re.IGNORECASE | re.MULTILINE)
+
+def build_lesson_batch_prompt(course, days, total_days):
+    """Prompt for several lessons of one course in a single delimited reply"""
+    outline = get_course_outline(course, total_days) or {}
+    plan = "\n".join(f"Day {day}: {lesson_focus(outline, day)}" for day in days)
+    return f"""
+Write days {", ".join(str(day) for day in days)} of {total_days} of the course '{course}'.
+{plan}
+
+Start each day with its own line "=== DAY N ===" (N is the day number) and finish
+the reply with the line "=== END ===". Each day must stand alone and not repeat the others.
+
+{LESSON_SECTIONS.format(part="N")}
+
+No introduction or closing remarks.
+"""
+
+def parse_lesson_batch(text, days):
+    """{day: content} for every requested day whose lesson arrived complete"""
+    lessons = {}
+    markers = list(LESSON_BATCH_MARKER_RE.finditer(text))
+    for marker, following in zip(markers, markers[1:]):
+        if not marker.group(2):
+            continue
+        day = int(marker.group(2))
+        content = text[marker.end():following.start()].strip()
+        if day in days and content and day not in lessons:
+            lessons[day] = content
+    return lessons
+
+def generate_lesson_batch(course, days, total_days):
+    """Generate and cache several days of a course in one LLM call
+
+    Days another caller is already generating are skipped. Returns the number
+    of lessons stored.
+    """
+    claimed = {}
+    for day in days:
+        key = lesson_cache_key(course, day, total_days)
+        _, leader = lesson_flight.join(key)
+        if leader:
+            claimed[day] = key
+    if not claimed:
+        return 0
+    lessons = {}
+    try:
+        if len(claimed) == 1:
+            day = next(iter(claimed))
+            lessons[day] = generate_uncached_content(course, day, total_days)
+            return 1
+        batch = sorted(claimed)
+        logger.info(f"🤖 Generating {course} days {batch[0]}-{batch[-1]}/{total_days} in one batch")
+        with LLM_GENERATION_SECONDS.time(mode="batch", outcome="error") as labels:
+            response = call_upstream(
+                together_breaker, is_together_retryable, TOGETHER_MAX_RETRIES,
+                get_together_client().chat.completions.create,
+                model=LESSON_MODEL,
+                messages=[{"role": "user", "content": build_lesson_batch_prompt(course, batch, total_days)}],
+                temperature=0.7,
+                max_tokens=min(LESSON_BATCH_MAX_TOKENS, LESSON_MAX_TOKENS * len(batch))
+            )
+            lessons = parse_lesson_batch(response.choices[0].message.content, claimed)
+            labels["outcome"] = "success"
+        for day, content in lessons.items():
+            store_cached_lesson(course, day, total_days, content)
+        logger.info(f"✅ Batch produced {len(lessons)} of {len(batch)} lessons for {course}")
+        return len(lessons)
+    except Exception as e:
+        logger.error(f"❌ Error generating lesson batch for {course}: {str(e)}")
+        return 0
+    finally:
+        for day, key in claimed.items():
+            # None lets anyone waiting on a day the batch missed generate it alone
+            lesson_flight.finish(key, lessons.get(day))
+
+def plan_lesson_batches(lessons, batch_days=LESSON_BATCH_DAYS):
+    """Group (course, day, total_days) lessons into per-course runs of up to batch_days days"""
+    by_course = {}
+    for course, day, total_days in lessons:
+        by_course.setdefault((course, total_days), set()).add(day)
+    batches = []
+    for (course, total_days), days in by_course.items():
+        days = sorted(days)
+        for start in range(0, len(days), max(1, batch_days)):
+            batches.append((course, days[start:start + max(1, batch_days)], total_days))
+    return batches
+
+# === OUTBOUND WHATSAPP DISPATCHER ===
+# Messages are queued per recipient and delivered by a small pool of workers.
+# Token buckets per sender number and per recipient replace fixed sleeps, and a
+# recipient is only ever owned by one worker at a time so parts stay in order.
+TWILIO_SENDER_RATE = float(os.environ.get("TWILIO_SENDER_RATE", 1.0))  # messages/sec per sender number
+TWILIO_SENDER_BURST = int(os.environ.get("TWILIO_SENDER_BURST", 1))
+RECIPIENT_RATE = float(os.environ.get("RECIPIENT_RATE", 0.5))  # messages/sec per recipient
+RECIPIENT_BURST = int(os.environ.get("RECIPIENT_BURST", 1))
+OUTBOUND_WORKERS = int(os.environ.get("OUTBOUND_WORKERS", 8))
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take a token if one is available, else return the seconds until one is"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def is_full(self):
+        with self.lock:
+            return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+class OutboundDispatcher:
+    """Rate-limited outbound queue with per-recipient ordering
+
+    Its sender and recipient token buckets are the process-wide WhatsApp rate
+    limits: anything that sends without going through the queue (the async
+    delivery engine) takes its tokens from sender_bucket and recipient_bucket.
+    """
+
+    def __init__(self, workers, sender_rate, sender_burst, recipient_rate, recipient_burst):
+        self.workers = workers
+        self.sender_rate = sender_rate
+        self.sender_burst = sender_burst
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self._cond = threading.Condition()
+        self._queues = {}  # key: phone, value: deque of (from_number, message, send, future)
+        self._ready = deque()  # phones with queued messages that no worker owns
+        self._delayed = []  # heap of (ready_at, phone) waiting on their recipient bucket
+        self._scheduled = set()  # phones currently in _ready, _delayed or owned by a worker
+        self._sender_buckets = {}
+        self._recipient_buckets = {}
+        self._threads = []
+
+    def submit(self, to_phone, message, from_number=TWILIO_WHATSAPP_NUMBER, send=None):
+        """Queue a message and return a Future resolving to the result of send (deliver_whatsapp)"""
+        future = Future()
+        with self._cond:
+            self._ensure_started()
+            self._queues.setdefault(to_phone, deque()).append((from_number, message, send or deliver_whatsapp, future))
+            if to_phone not in self._scheduled:
+                self._scheduled.add(to_phone)
+                self._ready.append(to_phone)
+                self._cond.notify()
+        return future
+
+    def queue_depth(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"outbound-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"📮 Outbound dispatcher started with {self.workers} workers")
+
+    def sender_bucket(self, from_number):
+        """The token bucket pacing everything sent from this number"""
+        with self._cond:
+            bucket = self._sender_buckets.get(from_number)
+            if bucket is None:
+                bucket = self._sender_buckets[from_number] = TokenBucket(self.sender_rate, self.sender_burst)
+            return bucket
+
+    def recipient_bucket(self, to_phone):
+        """The token bucket pacing everything sent to this recipient"""
+        with self._cond:
+            bucket = self._recipient_buckets.get(to_phone)
+            if bucket is None:
+                if len(self._recipient_buckets) > 10000:
+                    # Forget idle recipients; a full bucket is the same as a new one
+                    for phone, idle in list(self._recipient_buckets.items()):
+                        if phone not in self._scheduled and idle.is_full():
+                            del self._recipient_buckets[phone]
+                bucket = self._recipient_buckets[to_phone] = TokenBucket(self.recipient_rate, self.recipient_burst)
+            return bucket
+
+    def _next_message(self):
+        """Wait for a recipient whose bucket has a token and pop its next message"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    self._ready.append(heapq.heappop(self._delayed)[1])
+                if self._ready:
+                    to_phone = self._ready.popleft()
+                    wait = self.recipient_bucket(to_phone).try_acquire()
+                    if wait > 0:
+                        heapq.heappush(self._delayed, (now + wait, to_phone))
+                        continue
+                    from_number, message, send, future = self._queues[to_phone].popleft()
+                    return to_phone, from_number, message, send, future
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._cond.wait(timeout)
+
+    def _release(self, to_phone):
+        """Hand the recipient back to the ready queue, or forget it when drained"""
+        with self._cond:
+            if self._queues.get(to_phone):
+                self._ready.append(to_phone)
+                self._cond.notify()
+                return
+            self._queues.pop(to_phone, None)
+            self._scheduled.discard(to_phone)
+
+    def _worker(self):
+        while True:
+            to_phone, from_number, message, send, future = self._next_message()
+            try:
+                self.sender_bucket(from_number).acquire()
+                future.set_result(send(to_phone, message, from_number))
+            except Exception as e:
+                logger.error(f"❌ Outbound worker error: {str(e)}")
+                future.set_result(False)
+            finally:
+                self._release(to_phone)
+
+outbound_dispatcher = OutboundDispatcher(
+    OUTBOUND_WORKERS, TWILIO_SENDER_RATE, TWILIO_SENDER_BURST, RECIPIENT_RATE, RECIPIENT_BURST
+)
+
+def deliver_whatsapp(to_phone, message, from_number=TWILIO_WHATSAPP_NUMBER):
+    """Send one WhatsApp message via Twilio right away (no rate limiting)
+
+    Returns the Twilio message SID, or False if the send failed.
+    """
+    try:
+        # Format phone number for WhatsApp
+        whatsapp_to = f"whatsapp:{to_phone}"
+        
+        logger.info(f"📤 Sending WhatsApp ({len(message)} chars) to: {to_phone}")
+        
+        with TWILIO_SEND_SECONDS.time(outcome="failure") as labels:
+            sent = call_upstream(
+                twilio_breaker, is_twilio_retryable, TWILIO_MAX_RETRIES,
+                get_twilio_client().messages.create,
+                body=message,
+                from_=from_number,
+                to=whatsapp_to
+            )
+            labels["outcome"] = "success"
+        logger.info(f"✅ Successfully sent WhatsApp to: {to_phone}")
+        return sent.sid
+    except Exception as e:
+        logger.error(f"❌ Error sending WhatsApp: {str(e)}")
+        TWILIO_SEND_FAILURES.inc(reason=twilio_failure_reason(e))
+        return False
+
+def twilio_failure_reason(error):
+    """Metric label for a failed send"""
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, TwilioRestException):
+        return f"http_{error.status}"
+    return type(error).__name__
+
+def queue_whatsapp(to_phone, message):
+    """Queue a WhatsApp message on the outbound dispatcher, returns a Future of the SID or False"""
+    if not to_phone or not to_phone.startswith('+'):
+        logger.error(f"❌ Invalid phone number: {to_phone}")
+        future = Future()
+        future.set_result(False)
+        return future
+    return outbound_dispatcher.submit(to_phone, message)
+
+def send_whatsapp(to_phone, message):
+    """Send WhatsApp message via Twilio with proper length handling"""
+    return queue_whatsapp(to_phone, message).result()
+
+# === LESSON OUTBOX ===
+# Every lesson part is written to lesson_outbox before it is handed to Twilio,
+# and its state (pending -> sending -> sent/failed) and message SID are
+# recorded as it goes. A failed part is retried on its own with backoff by
+# retry_lesson_outbox, so learners never get parts 1-2 twice because part 3
+# failed. Parts never overtake each other: one whose predecessors are not
+# all sent is held and goes out right after them. Rows name the worker that owns them; once that worker no longer
+# holds a leader lease its unfinished parts are recovered: 'pending' ones
+# were never sent, 'sending' ones are looked up in Twilio's message log
+# before anything is resent, and a lesson whose generation died before any
+# part went out is dropped so it is generated again, and one whose stream
+# broke off after some parts went out is finished with a full copy of the
+# lesson (resume_lesson_parts). A lesson moves to
+# 'delivered' (and progress advances) in one conditional update, so that
+# happens exactly once; its enrollment only moves on once the lesson is
+# delivered or has failed for good.
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 6))
+OUTBOX_RETRY_BASE_SECONDS = float(os.environ.get("OUTBOX_RETRY_BASE_SECONDS", 60))
+OUTBOX_RETRY_MAX_SECONDS = float(os.environ.get("OUTBOX_RETRY_MAX_SECONDS", 3600))
+OUTBOX_RETRY_INTERVAL_SECONDS = int(os.environ.get("OUTBOX_RETRY_INTERVAL_SECONDS", 60))
+OUTBOX_RETRY_BATCH_SIZE = int(os.environ.get("OUTBOX_RETRY_BATCH_SIZE", 200))
+OUTBOX_RECONCILE_LOOKBACK = 20  # recent Twilio messages to a recipient checked for an unconfirmed part
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+LESSON_OUTBOX_RETRIES = metrics.counter(
+    "learnhub_lesson_outbox_retries_total", "Lesson parts resent by the outbox", ("outcome",))
+LESSON_OUTBOX_RECOVERED = metrics.counter(
+    "learnhub_lesson_outbox_recovered_total", "Unfinished lesson parts taken over from a dead worker", ("result",))
+
+def init_lesson_outbox():
+    """Create the lesson delivery and outbox tables if they do not exist yet"""
+    with db_connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS lesson_deliveries (
+                phone TEXT NOT NULL,
+                course TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                total_days INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                parts INTEGER,
+                owner TEXT NOT NULL,
+                shard_key INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (phone, course, day)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS lesson_outbox (
+                phone TEXT NOT NULL,
+                course TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                part INTEGER NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                twilio_sid TEXT,
+                next_attempt_at REAL,
+                owner TEXT NOT NULL,
+                shard_key INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (phone, course, day, part)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_lesson_deliveries_status ON lesson_deliveries (status)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_lesson_outbox_status ON lesson_outbox (status, next_attempt_at)")
+
+def open_lesson_delivery(phone, course, day, total_days):
+    """Start tracking a lesson; None if it is new, else the existing delivery's status"""
+    now = time.time()
+    with db_connection() as conn:
+        created = conn.execute(
+            "INSERT OR IGNORE INTO lesson_deliveries "
+            "(phone, course, day, total_days, status, parts, owner, shard_key, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 'sending', NULL, ?, ?, ?, ?)",
+            (phone, course, day, total_days, WORKER_ID, phone_shard_key(phone), now, now)
+        ).rowcount
+        if created:
+            return None
+        row = conn.execute(
+            "SELECT status FROM lesson_deliveries WHERE phone = ? AND course = ? AND day = ?", (phone, course, day)
+        ).fetchone()
+    return row["status"]
+
+def lesson_delivery_status(phone, course, day):
+    """Status of a lesson in the outbox, or None if it is not there"""
+    with db_connection() as conn:
+        row = conn.execute(
+            "SELECT status FROM lesson_deliveries WHERE phone = ? AND course = ? AND day = ?", (phone, course, day)
+        ).fetchone()
+    return row["status"] if row else None
+
+def record_lesson_parts(phone, course, day, bodies, first_part=1, final=False):
+    """Write parts to the outbox as pending; final=True also fixes the lesson's part count"""
+    now = time.time()
+    with db_connection() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO lesson_outbox "
+            "(phone, course, day, part, body, status, attempts, owner, shard_key, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 'pending', 0, ?, ?, ?)",
+            [(phone, course, day, part, body, WORKER_ID, phone_shard_key(phone), now)
+             for part, body in enumerate(bodies, first_part)]
+        )
+        if final:
+            conn.execute(
+                "UPDATE lesson_deliveries SET parts = ?, updated_at = ? WHERE phone = ? AND course = ? AND day = ?",
+                (first_part + len(bodies) - 1, now, phone, course, day)
+            )
+
+def close_lesson_delivery(phone, course, day, parts=None, failed=False):
+    """Fix the part count of a streamed lesson, or give up on a lesson that cannot be completed"""
+    with db_connection() as conn:
+        if failed:
+            conn.execute(
+                "UPDATE lesson_deliveries SET status = 'failed', updated_at = ? "
+                "WHERE phone = ? AND course = ? AND day = ? AND status = 'sending'",
+                (time.time(), phone, course, day)
+            )
+        else:
+            conn.execute(
+                "UPDATE lesson_deliveries SET parts = ?, updated_at = ? WHERE phone = ? AND course = ? AND day = ?",
+                (parts, time.time(), phone, course, day)
+            )
+
+LESSON_RESUME_NOTE = "⚠️ The rest of this lesson was cut off, so here it is again in full.\n\n"
+
+def resume_lesson_parts(phone, course, day, total_days, content):
+    """Record the whole lesson after the parts of a stream that broke off; returns the new (part, body) pairs
+
+    The parts already recorded stay as they are and the full lesson follows
+    them, so the learner still gets every section and the lesson can finish.
+    """
+    with db_connection() as conn:
+        recorded = conn.execute(
+            "SELECT COALESCE(MAX(part), 0) FROM lesson_outbox WHERE phone = ? AND course = ? AND day = ?",
+            (phone, course, day)
+        ).fetchone()[0]
+    bodies = split_long_message(
+        LESSON_RESUME_NOTE + lesson_header(course, day, total_days) + content + lesson_footer(day, total_days))
+    record_lesson_parts(phone, course, day, bodies, first_part=recorded + 1, final=True)
+    logger.info(f"🩹 Resending Day {day} for {phone} in full after part {recorded}")
+    return list(enumerate(bodies, recorded + 1))
+
+def start_part_send(phone, course, day, part):
+    """Mark a part as handed to Twilio; from here a crash leaves it unconfirmed
+
+    Returns False, and holds the part for the retry tick without using an
+    attempt, while an earlier part of the lesson is not sent yet. Also False
+    once the lesson is no longer being sent (the learner sent STOP, or it
+    failed or was reset); such a part is left alone.
+    """
+    now = time.time()
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        delivery = conn.execute(
+            "SELECT status FROM lesson_deliveries WHERE phone = ? AND course = ? AND day = ?", (phone, course, day)
+        ).fetchone()
+        if delivery is None or delivery["status"] != 'sending':
+            conn.execute(
+                "UPDATE lesson_outbox SET status = 'failed', next_attempt_at = NULL, updated_at = ? "
+                "WHERE phone = ? AND course = ? AND day = ? AND part = ? AND status != 'sent'",
+                (now, phone, course, day, part)
+            )
+            logger.info(f"🛑 Not sending part {part} of Day {day} to {phone}, the lesson is "
+                        f"{delivery['status'] if delivery else 'gone'}")
+            return False
+        unsent = conn.execute(
+            "SELECT COUNT(*) FROM lesson_outbox WHERE phone = ? AND course = ? AND day = ? AND part < ? AND status != 'sent'",
+            (phone, course, day, part)
+        ).fetchone()[0]
+        if unsent:
+            conn.execute(
+                "UPDATE lesson_outbox SET status = 'failed', next_attempt_at = ?, owner = ?, updated_at = ? "
+                "WHERE phone = ? AND course = ? AND day = ? AND part = ?",
+                (now, WORKER_ID, now, phone, course, day, part)
+            )
+            logger.info(f"⏸️ Holding part {part} of Day {day} for {phone} until the earlier parts are sent")
+            return False
+        conn.execute(
+            "UPDATE lesson_outbox SET status = 'sending', attempts = attempts + 1, owner = ?, updated_at = ? "
+            "WHERE phone = ? AND course = ? AND day = ? AND part = ?",
+            (WORKER_ID, now, phone, course, day, part)
+        )
+    return True
+
+def finish_part_send(phone, course, day, part, sid):
+    """Record the SID of a sent part, or schedule a retry (failing the lesson when out of attempts)"""
+    now = time.time()
+    with db_connection() as conn:
+        if sid:
+            conn.execute(
+                "UPDATE lesson_outbox SET status = 'sent', twilio_sid = ?, next_attempt_at = NULL, updated_at = ? "
+                "WHERE phone = ? AND course = ? AND day = ? AND part = ?",
+                (sid, now, phone, course, day, part)
+            )
+            return
+        row = conn.execute(
+            "SELECT attempts FROM lesson_outbox WHERE phone = ? AND course = ? AND day = ? AND part = ?",
+            (phone, course, day, part)
+        ).fetchone()
+        if row is None:
+            return  # the learner re-enrolled meanwhile
+        delay = min(OUTBOX_RETRY_MAX_SECONDS, OUTBOX_RETRY_BASE_SECONDS * 2 ** (row["attempts"] - 1))
+        conn.execute(
+            "UPDATE lesson_outbox SET status = 'failed', next_attempt_at = ?, updated_at = ? "
+            "WHERE phone = ? AND course = ? AND day = ? AND part = ?",
+            (now + random.uniform(delay / 2, delay), now, phone, course, day, part)
+        )
+        if row["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+            conn.execute(
+                "UPDATE lesson_deliveries SET status = 'failed', updated_at = ? "
+                "WHERE phone = ? AND course = ? AND day = ? AND status = 'sending'",
+                (now, phone, course, day)
+            )
+            logger.error(f"❌ Giving up on Day {day} of {course} for {phone}: part {part} failed {row['attempts']} times")
+
+def deliver_lesson_part(phone, course, day, part, body, from_number=TWILIO_WHATSAPP_NUMBER):
+    """deliver_whatsapp for an outbox part, recording its state around the send
+
+    Returns the SID, False if the send failed, or None if the part is held
+    behind an earlier one or the lesson is no longer being sent.
+    """
+    if not start_part_send(phone, course, day, part):
+        return None
+    sid = deliver_whatsapp(phone, body, from_number)
+    finish_part_send(phone, course, day, part, sid)
+    return sid
+
+def queue_lesson_part(phone, course, day, part, body):
+    """Queue a recorded outbox part on the outbound dispatcher, returns a Future of the SID or False"""
+    return outbound_dispatcher.submit(
+        phone, body, send=lambda to_phone, message, from_number: deliver_lesson_part(
+            to_phone, course, day, part, message, from_number)
+    )
+
+def finish_lesson_delivery(phone, course, day):
+    """Mark the lesson delivered if every part is sent; True only for the call that did it
+
+    Progress is advanced in the same transaction when the progress store
+    lives in the app database.
+    """
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        delivered = conn.execute(
+            "UPDATE lesson_deliveries SET status = 'delivered', updated_at = ? "
+            "WHERE phone = ? AND course = ? AND day = ? AND status = 'sending' AND parts IS NOT NULL "
+            "AND parts = (SELECT COUNT(*) FROM lesson_outbox "
+            "WHERE phone = ? AND course = ? AND day = ? AND status = 'sent')",
+            (time.time(), phone, course, day, phone, course, day)
+        ).rowcount == 1
+        applied = delivered and progress_backend.increment_progress_in(conn, phone, course)
+    if delivered and not applied:
+        increment_progress(phone, course)
+    return delivered
+
+def forget_lesson_deliveries(keys):
+    """Drop the outbox of (phone, course) pairs that are starting the course over"""
+    with db_connection() as conn:
+        conn.executemany("DELETE FROM lesson_outbox WHERE phone = ? AND course = ?", keys)
+        conn.executemany("DELETE FROM lesson_deliveries WHERE phone = ? AND course = ?", keys)
+
+def find_sent_message(phone, body, since):
+    """SID of a message with this body Twilio accepted for phone after `since`, else None"""
+    messages = call_upstream(
+        twilio_breaker, is_twilio_retryable, TWILIO_MAX_RETRIES,
+        get_twilio_client().messages.list,
+        to=f"whatsapp:{phone}",
+        limit=OUTBOX_RECONCILE_LOOKBACK
+    )
+    for message in messages:
+        if message.body != body or message.status in ("failed", "undelivered"):
+            continue
+        if message.date_created is None or message.date_created.timestamp() >= since - 60:
+            return message.sid
+    return None
+
+def outbox_shard_clause(prefix=""):
+    if _delivery_shard is None:
+        return "", ()
+    return f"AND {prefix}shard_key % ? = ? ", (DELIVERY_SHARDS, _delivery_shard)
+
+def recover_orphaned_parts():
+    """Take over unfinished parts and lessons whose worker no longer holds a leader lease"""
+    shard_clause, shard_params = outbox_shard_clause()
+    orphaned = f"owner NOT IN (SELECT holder FROM leader_locks WHERE expires_at >= ?) {shard_clause}"
+    now = time.time()
+    with db_connection() as conn:
+        unconfirmed = conn.execute(
+            f"SELECT phone, course, day, part, body, updated_at FROM lesson_outbox WHERE status = 'sending' AND {orphaned}",
+            (now,) + shard_params
+        ).fetchall()
+        # Generation died with its worker before any part was handed to Twilio:
+        # forget the lesson so the next claim of the enrollment generates it again
+        unstarted = conn.execute(
+            f"SELECT phone, course, day FROM lesson_deliveries d WHERE status = 'sending' AND parts IS NULL "
+            f"AND NOT EXISTS (SELECT 1 FROM lesson_outbox o "
+            f"WHERE o.phone = d.phone AND o.course = d.course AND o.day = d.day AND o.attempts > 0) AND {orphaned}",
+            (now,) + shard_params
+        ).fetchall()
+        keys = [(row["phone"], row["course"], row["day"]) for row in unstarted]
+        conn.executemany("DELETE FROM lesson_outbox WHERE phone = ? AND course = ? AND day = ?", keys)
+        conn.executemany("DELETE FROM lesson_deliveries WHERE phone = ? AND course = ? AND day = ?", keys)
+        # Never handed to Twilio: safe to send again
+        never_sent = conn.execute(
+            f"UPDATE lesson_outbox SET status = 'failed', next_attempt_at = ?, owner = ?, updated_at = ? "
+            f"WHERE status = 'pending' AND {orphaned}",
+            (now, WORKER_ID, now, now) + shard_params
+        ).rowcount
+        # A streamed lesson that died after some parts went out: take it over and send the rest
+        dead_streams = conn.execute(
+            f"SELECT phone, course, day, total_days FROM lesson_deliveries "
+            f"WHERE status = 'sending' AND parts IS NULL AND {orphaned}",
+            (now,) + shard_params
+        ).fetchall()
+        conn.executemany(
+            "UPDATE lesson_deliveries SET owner = ?, updated_at = ? WHERE phone = ? AND course = ? AND day = ?",
+            [(WORKER_ID, now, row["phone"], row["course"], row["day"]) for row in dead_streams]
+        )
+    if unstarted:
+        LESSON_OUTBOX_RECOVERED.inc(len(unstarted), result="regenerate")
+        logger.info(f"🩹 {len(unstarted)} lessons were interrupted before sending and will be generated again")
+    if never_sent:
+        LESSON_OUTBOX_RECOVERED.inc(never_sent, result="unsent")
+    for row in unconfirmed:
+        try:
+            sid = find_sent_message(row["phone"], row["body"], row["updated_at"])
+        except Exception as e:
+            logger.error(f"❌ Could not check part {row['part']} of Day {row['day']} for {row['phone']}: {str(e)}")
+            continue  # leave it unconfirmed and look again on the next tick
+        with db_connection() as conn:
+            conn.execute(
+                "UPDATE lesson_outbox SET status = ?, twilio_sid = ?, next_attempt_at = ?, owner = ?, updated_at = ? "
+                "WHERE phone = ? AND course = ? AND day = ? AND part = ? AND status = 'sending'",
+                ('sent' if sid else 'failed', sid, None if sid else now, WORKER_ID, now,
+                 row["phone"], row["course"], row["day"], row["part"])
+            )
+        LESSON_OUTBOX_RECOVERED.inc(result="sent" if sid else "resend")
+    if unconfirmed or never_sent:
+        logger.info(f"🩹 Recovered {len(unconfirmed) + never_sent} lesson parts from stopped workers")
+    # After the unconfirmed parts are settled, so the full copy is not held behind them
+    for row in dead_streams:
+        phone, course, day, total_days = row["phone"], row["course"], row["day"], row["total_days"]
+        try:
+            content = generate_detailed_course_content(course, day, total_days)
+            for part, body in resume_lesson_parts(phone, course, day, total_days, content):
+                queue_lesson_part(phone, course, day, part, body)
+            LESSON_OUTBOX_RECOVERED.inc(result="resume")
+        except Exception as e:
+            logger.error(f"❌ Could not resume Day {day} for {phone}: {str(e)}")
+            close_lesson_delivery(phone, course, day, failed=True)
+
+def claim_retry_parts(limit=OUTBOX_RETRY_BATCH_SIZE):
+    """Take failed parts that are due for another attempt, and no earlier part is waiting out its backoff"""
+    shard_clause, shard_params = outbox_shard_clause("o.")
+    now = time.time()
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT o.phone, o.course, o.day, o.part, o.body, d.total_days FROM lesson_outbox o "
+            "JOIN lesson_deliveries d ON d.phone = o.phone AND d.course = o.course AND d.day = o.day "
+            f"WHERE o.status = 'failed' AND o.next_attempt_at <= ? AND d.status = 'sending' {shard_clause}"
+            "AND NOT EXISTS (SELECT 1 FROM lesson_outbox e "
+            "WHERE e.phone = o.phone AND e.course = o.course AND e.day = o.day AND e.part < o.part "
+            "AND e.status != 'sent' AND NOT (e.status = 'failed' AND e.next_attempt_at <= ?)) "
+            "ORDER BY o.phone, o.course, o.day, o.part LIMIT ?",
+            (now,) + shard_params + (now, limit)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE lesson_outbox SET status = 'pending', owner = ?, updated_at = ? "
+            "WHERE phone = ? AND course = ? AND day = ? AND part = ?",
+            [(WORKER_ID, now, row["phone"], row["course"], row["day"], row["part"]) for row in rows]
+        )
+    return rows
+
+def complete_lesson(phone, course, day, total_days):
+    """finish_lesson_delivery plus the course completion message; True if this call delivered it"""
+    if not finish_lesson_delivery(phone, course, day):
+        return False
+    logger.info(f"✅ Day {day} of {course} fully delivered to {phone}")
+    if day == total_days:
+        queue_whatsapp(phone, build_completion_message(course, total_days))
+    return True
+
+def finish_retried_part(row, future):
+    """Done callback of a resent part: count it, and finish the lesson if it was the last one missing"""
+    try:
+        result = future.result()
+        LESSON_OUTBOX_RETRIES.inc(outcome="sent" if result else "held" if result is None else "failed")
+        if result:
+            complete_lesson(row["phone"], row["course"], row["day"], row["total_days"])
+    except Exception as e:
+        logger.error(f"❌ Error finishing retried part {row['part']} of Day {row['day']}: {str(e)}")
+
+def retry_lesson_outbox():
+    """Scheduler tick: recover dead workers' parts, resend failed ones, finish completed lessons
+
+    Resent parts are only queued on the outbound dispatcher and the tick does
+    not wait for them. Each one finishes its lesson when it goes out, and the
+    next tick picks up anything that slipped through.
+    """
+    try:
+        recover_orphaned_parts()
+        rows = claim_retry_parts()
+        if rows:
+            logger.info(f"🔁 Retrying {len(rows)} lesson parts")
+            for row in rows:
+                future = queue_lesson_part(row["phone"], row["course"], row["day"], row["part"], row["body"])
+                future.add_done_callback(lambda future, row=row: finish_retried_part(row, future))
+        shard_clause, shard_params = outbox_shard_clause()
+        with db_connection() as conn:
+            ready = conn.execute(
+                "SELECT phone, course, day, total_days FROM lesson_deliveries d "
+                f"WHERE status = 'sending' AND parts IS NOT NULL {shard_clause}"
+                "AND parts = (SELECT COUNT(*) FROM lesson_outbox o "
+                "WHERE o.phone = d.phone AND o.course = d.course AND o.day = d.day AND o.status = 'sent')",
+                shard_params
+            ).fetchall()
+        return sum(1 for row in ready if complete_lesson(row["phone"], row["course"], row["day"], row["total_days"]))
+    except Exception as e:
+        logger.error(f"❌ Error retrying lesson outbox: {str(e)}")
+        return 0
+
+init_lesson_outbox()
+
+def stream_lesson_parts(phone, course, day, total_days, header, footer):
+    """Queue lesson parts while the LLM is still generating the rest
+
+    Parts go through the lesson outbox as they are produced; if the stream
+    breaks off after that, the full lesson is generated and sent after them.
+    Returns the futures of the queued parts, or None if streaming failed
+    before anything was queued or another caller is already generating this
+    lesson, so the caller can fall back to a normal send (which waits on that
+    generation instead of starting its own).
+    """
+    key = lesson_cache_key(course, day, total_days)
+    _, leader = lesson_flight.join(key)
+    if not leader:
+        return None
+    splitter = IncrementalSplitter()
+    futures = []
+    chunks = []
+    content = None
+    started = time.perf_counter()
+
+    def queue_part(body):
+        part = len(futures) + 1
+        record_lesson_parts(phone, course, day, [body], first_part=part)
+        futures.append(queue_lesson_part(phone, course, day, part, body))
+
+    try:
+        try:
+            for part in splitter.feed(header):
+                queue_part(part)
+            for text in stream_course_content(course, day, total_days):
+                chunks.append(text)
+                for part in splitter.feed(text):
+                    if not futures:
+                        LESSON_FIRST_PART_SECONDS.observe(time.perf_counter() - started)
+                    queue_part(part)
+                    logger.info(f"⚡ Part {len(futures)} of Day {day} queued while generating")
+            LLM_GENERATION_SECONDS.observe(time.perf_counter() - started, mode="stream", outcome="success")
+        except Exception as e:
+            LLM_GENERATION_SECONDS.observe(time.perf_counter() - started, mode="stream", outcome="error")
+            logger.error(f"❌ Streaming generation failed: {str(e)}")
+            if not futures:
+                return None
+            # Some parts are already out and the rest of the text is lost: follow them with the full lesson
+            content = generate_uncached_content(course, day, total_days)
+            for part, body in resume_lesson_parts(phone, course, day, total_days, content):
+                futures.append(queue_lesson_part(phone, course, day, part, body))
+            return futures
+        
+        content = "".join(chunks).strip() or None
+        if content is None:
+            return None  # nothing generated (the short header alone never fills a part)
+        store_cached_lesson(course, day, total_days, content)
+        for part in splitter.feed(footer) + splitter.finish():
+            queue_part(part)
+        close_lesson_delivery(phone, course, day, parts=len(futures))
+        logger.info(f"✂️ Streamed Day {day} in {len(futures)} parts")
+        return futures
+    finally:
+        # Hand the text to anyone who waited on this generation (None lets one of them retry)
+        lesson_flight.finish(key, content)
+
+def lesson_header(course, day, total_days):
+    return f"🎓 {course} - Day {day}/{total_days}\n\n"
+
+def lesson_footer(day, total_days):
+    return f"\n\n---\n📚 Course Progress: {day}/{total_days} days\n💬 Reply STOP to unsubscribe"
+
+def build_completion_message(course, total_days):
+    return (
+        f"🎉 CONGRATULATIONS! 🎉\n\n"
+        f"You have successfully completed the {course} course!\n\n"
+        f"📊 Final Progress: {total_days}/{total_days} days completed\n\n"
+        f"🏆 You can now download your certificate from the LearnHub website.\n\n"
+        f"Thank you for learning with us! 👨‍🎓👩‍🎓"
+    )
+
+def send_course_lesson(phone, course, day, total_days):
+    """Send a detailed course lesson with proper formatting
+
+    Parts go through the lesson outbox. A lesson already in the outbox (say,
+    claimed again after a crash) is never started twice; whatever it is
+    missing is resent by retry_lesson_outbox, which also advances progress
+    once the last part is out.
+    """
+    started = time.perf_counter()
+    opened = False
+    try:
+        logger.info(f"🎯 SENDING DETAILED LESSON: {phone} - {course} - Day {day}")
+        existing = open_lesson_delivery(phone, course, day, total_days)
+        if existing is not None:
+            logger.info(f"📮 Day {day} for {phone} is already in the outbox ({existing})")
+            return existing == 'delivered'
+        opened = True
+        
+        # Create the main message
+        header = lesson_header(course, day, total_days)
+        footer = lesson_footer(day, total_days)
+        
+        # On a cache miss, stream the lesson so Part 1 goes out while the rest is generated
+        futures = None
+        if LLM_STREAMING and get_cached_lesson(course, day, total_days) is None:
+            futures = stream_lesson_parts(phone, course, day, total_days, header, footer)
+        
+        if futures is None:
+            # Generate detailed content
+            content = generate_detailed_course_content(course, day, total_days)
+            full_message = header + content + footer
+            
+            # Split into multiple messages if too long
+            message_parts = split_long_message(full_message)
+            
+            # Record and queue all parts at once; the dispatcher keeps them in order and paces them
+            record_lesson_parts(phone, course, day, message_parts, final=True)
+            futures = [queue_lesson_part(phone, course, day, part, body)
+                       for part, body in enumerate(message_parts, 1)]
+        
+        success_count = sum(1 for future in futures if future.result())
+        LESSON_PARTS.observe(len(futures))
+        LESSON_DELIVERY_SECONDS.observe(
+            time.perf_counter() - started, outcome="success" if success_count == len(futures) else "failure"
+        )
+        
+        if complete_lesson(phone, course, day, total_days):
+            logger.info(f"✅ Successfully delivered Day {day} ({len(futures)} parts) to {phone}")
+            return True
+        else:
+            logger.error(f"❌ Sent {success_count} of {len(futures)} parts of Day {day} to {phone}, the outbox retries the rest")
+            return False
+            
+    except Exception as e:
+        logger.error(f"❌ Error sending course lesson: {str(e)}")
+        if opened:
+            try:
+                close_lesson_delivery(phone, course, day, failed=True)
+            except Exception as e:
+                logger.error(f"❌ Could not mark Day {day} failed for {phone}: {str(e)}")
+        return False
+
+# === JOB INDEX ===
+# Secondary index from (phone, course) to lesson job ids, kept in sync through
+# scheduler events, so re-enrolling a user only touches that user's jobs
+# instead of unpickling and scanning the whole jobstore.
+LESSON_JOB_ID_RE = re.compile(r"^(?P<phone>\+\d+)_(?P<course>.+)_day(?P<day>\d+)_(?P<schedule_id>[0-9a-f]{8})$")
+
+def init_job_index():
+    """Create the job index table if it does not exist yet"""
+    with db_connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_index (
+                job_id TEXT PRIMARY KEY,
+                phone TEXT NOT NULL,
+                course TEXT NOT NULL,
+                schedule_id TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_job_index_user ON job_index (phone, course)")
+
+def index_job(job_id):
+    """Record a lesson job in the index; other jobs are ignored"""
+    match = LESSON_JOB_ID_RE.match(job_id or "")
+    if not match:
+        return
+    with db_connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO job_index (job_id, phone, course, schedule_id) VALUES (?, ?, ?, ?)",
+            (job_id, match.group("phone"), match.group("course"), match.group("schedule_id"))
+        )
+
+def unindex_job(job_id):
+    with db_connection() as conn:
+        conn.execute("DELETE FROM job_index WHERE job_id = ?", (job_id,))
+
+def lookup_job_ids(phone, course):
+    """Lesson job ids for a user and course, straight from the index"""
+    with db_connection() as conn:
+        rows = conn.execute("SELECT job_id FROM job_index WHERE phone = ? AND course = ?", (phone, course)).fetchall()
+    return [row["job_id"] for row in rows]
+
+def rebuild_job_index():
+    """Re-sync the index with the jobstore (one full scan, run at scheduler start)"""
+    job_ids = [job.id for job in get_scheduler().get_jobs()]
+    with db_connection() as conn:
+        conn.execute("DELETE FROM job_index")
+    for job_id in job_ids:
+        index_job(job_id)
+    logger.info(f"🗂️ Job index rebuilt from {len(job_ids)} jobs")
+
+def on_job_index_event(event):
+    """Scheduler listener keeping the job index in sync as jobs are added, run and removed"""
+    try:
+        if event.code == EVENT_JOB_ADDED:
+            index_job(event.job_id)
+        elif event.code == EVENT_JOB_REMOVED:
+            unindex_job(event.job_id)
+        elif event.code == EVENT_ALL_JOBS_REMOVED:
+            with db_connection() as conn:
+                conn.execute("DELETE FROM job_index")
+    except Exception as e:
+        logger.error(f"❌ Error updating job index: {str(e)}")
+
+init_job_index()
+add_scheduler_listener(on_job_index_event, EVENT_JOB_ADDED | EVENT_JOB_REMOVED | EVENT_ALL_JOBS_REMOVED)
+
+def metric_job_name(job_id):
+    """Collapse per-learner job ids so they don't explode metric cardinality"""
+    return "lesson" if LESSON_JOB_ID_RE.match(job_id) else job_id
+
+def on_job_metrics_event(event):
+    """Record scheduler lag and failed/missed runs"""
+    try:
+        job = metric_job_name(event.job_id)
+        if event.code == EVENT_JOB_SUBMITTED:
+            now = datetime.now(timezone.utc)
+            for run_time in event.scheduled_run_times:
+                SCHEDULER_LAG_SECONDS.observe(max(0.0, (now - run_time).total_seconds()), job=job)
+        elif event.code == EVENT_JOB_MISSED:
+            SCHEDULER_JOB_EVENTS.inc(job=job, event="missed")
+        elif event.code == EVENT_JOB_ERROR:
+            SCHEDULER_JOB_EVENTS.inc(job=job, event="error")
+    except Exception as e:
+        logger.error(f"❌ Error recording scheduler metrics: {str(e)}")
+
+add_scheduler_listener(on_job_metrics_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED | EVENT_JOB_ERROR)
+
+# === JOB COUNT ===
+# /health used to call len(scheduler.get_jobs()), which unpickles every job.
+# The count is now kept by scheduler events and re-counted with a plain SQL
+# COUNT(*) every JOB_COUNT_RECOUNT_SECONDS, which also corrects drift from
+# jobs added or removed by other processes sharing the jobstore.
+JOB_COUNT_RECOUNT_SECONDS = int(os.environ.get("JOB_COUNT_RECOUNT_SECONDS", "60"))
+
+def count_stored_jobs():
+    """Row count of the job store, without unpickling any job"""
+    if not os.path.exists(JOBSTORE_DB_PATH):
+        return 0
+    with jobstore_connection() as conn:
+        try:
+            return conn.execute("SELECT COUNT(*) FROM apscheduler_jobs").fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0  # the scheduler has not created its table yet
+
+class JobCounter:
+    def __init__(self, recount_seconds):
+        self.recount_seconds = recount_seconds
+        self.count = None
+        self.counted_at = 0.0
+        self.lock = threading.Lock()
+
+    def value(self):
+        """Current job total, re-counted at most once per recount_seconds"""
+        with self.lock:
+            if self.count is not None and time.monotonic() - self.counted_at < self.recount_seconds:
+                return self.count
+        try:
+            count = count_stored_jobs()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not count jobs: {str(e)}")
+            with self.lock:
+                return self.count or 0
+        with self.lock:
+            self.count = count
+            self.counted_at = time.monotonic()
+            return count
+
+    def on_event(self, event):
+        with self.lock:
+            if self.count is None:
+                return
+            if event.code == EVENT_JOB_ADDED:
+                self.count += 1
+            elif event.code == EVENT_JOB_REMOVED:
+                self.count = max(0, self.count - 1)
+            elif event.code == EVENT_ALL_JOBS_REMOVED:
+                self.count = 0
+
+job_counter = JobCounter(JOB_COUNT_RECOUNT_SECONDS)
+add_scheduler_listener(job_counter.on_event, EVENT_JOB_ADDED | EVENT_JOB_REMOVED | EVENT_ALL_JOBS_REMOVED)
+
+_jobstore_writer = None
+
+def remove_stored_job(job_id):
+    """Delete a job straight from the shared job store; raises JobLookupError if it is not there
+
+    For processes whose scheduler is not running the job store (web workers,
+    shards other than 0): their scheduler only knows its own pending jobs.
+    """
+    global _jobstore_writer
+    with _scheduler_lock:
+        if _jobstore_writer is None:
+            from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+            _jobstore_writer = SQLAlchemyJobStore(url=f'sqlite:///{JOBSTORE_DB_PATH}')
+    _jobstore_writer.remove_job(job_id)
+
+def remove_existing_jobs(phone, course):
+    """Remove existing jobs for a user and course"""
+    try:
+        jobs_removed = 0
+        for job_id in lookup_job_ids(phone, course):
+            try:
+                if scheduler_running() and owns_global_jobs():
+                    get_scheduler().remove_job(job_id)
+                else:
+                    remove_stored_job(job_id)
+            except JobLookupError:
+                # Already ran or removed by another process
+                unindex_job(job_id)
+                continue
+            unindex_job(job_id)
+            jobs_removed += 1
+            logger.info(f"🗑️ Removed existing job: {job_id}")
+        return jobs_removed
+    except Exception as e:
+        logger.error(f"❌ Error removing existing jobs: {str(e)}")
+        return 0
+
+# === ENROLLMENTS & LESSON DISPATCHER ===
+# One compact row per (phone, course) replaces the per-day APScheduler 'date'
+# jobs. A single minute-granularity tick finds due rows through the
+# (status, next_send_at) index and fans them out in batches.
+DISPATCH_BATCH_SIZE = int(os.environ.get("DISPATCH_BATCH_SIZE", 50))
+DISPATCH_CONCURRENCY = int(os.environ.get("DISPATCH_CONCURRENCY", 8))
+DISPATCH_LEASE_MINUTES = int(os.environ.get("DISPATCH_LEASE_MINUTES", 30))
+DB_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Sharded delivery: with DELIVERY_SHARDS = K, K worker processes each own the
+# recipients whose shard_key % K equals their shard, so a phone's lessons
+# always leave from one process and stay in order. shard_key is a stored
+# crc32 of the phone, so K can change without rewriting rows. Shard 0 also
+# runs the process-wide duties (job store, pre-generation, enrollment queue).
+DELIVERY_SHARDS = max(1, int(os.environ.get("DELIVERY_SHARDS", 1)))
+_delivery_shard = None  # Shard owned by this worker process; None delivers every shard
+
+def phone_shard_key(phone):
+    return zlib.crc32(phone.encode('utf-8'))
+
+def owns_global_jobs():
+    """True unless this process is a shard other than 0"""
+    return _delivery_shard in (None, 0)
+
+def init_enrollments():
+    """Create the enrollments table if it does not exist yet"""
+    with db_connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS enrollments (
+                phone TEXT NOT NULL,
+                course TEXT NOT NULL,
+                total_days INTEGER NOT NULL,
+                start_date TEXT NOT NULL,
+                preferred_time TEXT NOT NULL,
+                next_day INTEGER NOT NULL,
+                next_send_at TEXT,
+                status TEXT NOT NULL DEFAULT 'active',
+                schedule_id TEXT NOT NULL,
+                user_name TEXT,
+                completed_at TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (phone, course)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_enrollments_due ON enrollments (status, next_send_at)")
+        ensure_column(conn, "enrollments", "shard_key", "INTEGER")
+        missing = conn.execute("SELECT DISTINCT phone FROM enrollments WHERE shard_key IS NULL").fetchall()
+        conn.executemany(
+            "UPDATE enrollments SET shard_key = ? WHERE phone = ? AND shard_key IS NULL",
+            [(phone_shard_key(row["phone"]), row["phone"]) for row in missing]
+        )
+
+def lesson_send_time(start_date, preferred_time, day):
+    """When lesson `day` is due: Day 1 on start_date, then one day apart at the preferred time"""
+    time_obj = datetime.strptime(preferred_time, "%I:%M %p")
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    return (start + timedelta(days=day - 1)).replace(hour=time_obj.hour, minute=time_obj.minute)
+
+ENROLLMENT_UPSERT_SQL = (
+    "INSERT OR REPLACE INTO enrollments "
+    "(phone, course, total_days, start_date, preferred_time, next_day, next_send_at, status, schedule_id, user_name, completed_at, updated_at, shard_key) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, ?, ?)"
+)
+
+def enrollment_values(phone, course, total_days, start_date, preferred_time, next_day, schedule_id, user_name=None, status='active'):
+    """Row values for ENROLLMENT_UPSERT_SQL"""
+    if next_day > total_days:
+        status, next_send_at = 'completed', None
+    else:
+        next_send_at = lesson_send_time(start_date, preferred_time, next_day).strftime(DB_TIME_FORMAT)
+    return (phone, course, total_days, start_date, preferred_time, next_day, next_send_at, status, schedule_id, user_name, time.time(),
+            phone_shard_key(phone))
+
+def save_enrollment(phone, course, total_days, start_date, preferred_time, next_day, schedule_id, user_name=None):
+    """Create or replace the enrollment for (phone, course)"""
+    values = enrollment_values(phone, course, total_days, start_date, preferred_time, next_day, schedule_id, user_name)
+    with db_connection() as conn:
+        conn.execute(ENROLLMENT_UPSERT_SQL, values)
+    return values[6]
+
+def get_enrollment(phone, course):
+    with db_connection() as conn:
+        return conn.execute("SELECT * FROM enrollments WHERE phone = ? AND course = ?", (phone, course)).fetchone()
+
+def claim_due_enrollments(limit=DISPATCH_BATCH_SIZE, shard=None):
+    """Take a batch of due enrollments (of one shard, if given), pushing their next_send_at out by a lease"""
+    now = datetime.now()
+    lease_until = (now + timedelta(minutes=DISPATCH_LEASE_MINUTES)).strftime(DB_TIME_FORMAT)
+    shard_clause, shard_params = "", ()
+    if shard is not None:
+        shard_clause, shard_params = "AND shard_key % ? = ? ", (DELIVERY_SHARDS, shard)
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT * FROM enrollments WHERE status = 'active' AND next_send_at <= ? "
+            f"{shard_clause}ORDER BY next_send_at LIMIT ?",
+            (now.strftime(DB_TIME_FORMAT),) + shard_params + (limit,)
+        ).fetchall()
+        for row in rows:
+            DELIVERY_LAG_SECONDS.observe(max(0.0, (now - datetime.strptime(row["next_send_at"], DB_TIME_FORMAT)).total_seconds()))
+        conn.executemany(
+            "UPDATE enrollments SET next_send_at = ?, updated_at = ? WHERE phone = ? AND course = ? AND schedule_id = ?",
+            [(lease_until, time.time(), row["phone"], row["course"], row["schedule_id"]) for row in rows]
+        )
+    return rows
+
+def advance_enrollment(row):
+    """Move an enrollment on to its next lesson, or mark it completed
+
+    Only an enrollment that is still active on the claimed day moves: a STOP
+    or PAUSE that arrived while the lesson was in flight wins, and the next
+    send time comes from the current start_date, which RESUME may have shifted.
+    """
+    next_day = row["next_day"] + 1
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        current = conn.execute(
+            "SELECT start_date, preferred_time FROM enrollments "
+            "WHERE phone = ? AND course = ? AND schedule_id = ? AND status = 'active' AND next_day = ?",
+            (row["phone"], row["course"], row["schedule_id"], row["next_day"])
+        ).fetchone()
+        if current is None:
+            logger.info(f"⏭️ Not advancing {row['phone']} - {row['course']}: stopped, paused or re-enrolled meanwhile")
+            return False
+        if next_day > row["total_days"]:
+            conn.execute(
+                "UPDATE enrollments SET next_day = ?, next_send_at = NULL, status = 'completed', completed_at = ?, updated_at = ? "
+                "WHERE phone = ? AND course = ? AND schedule_id = ? AND status = 'active'",
+                (next_day, datetime.now().strftime(DB_TIME_FORMAT), time.time(), row["phone"], row["course"], row["schedule_id"])
+            )
+        else:
+            send_at = lesson_send_time(current["start_date"], current["preferred_time"], next_day)
+            if CATCHUP_POLICY != "skip" and send_at < datetime.now() - timedelta(seconds=CATCHUP_GRACE_SECONDS):
+                # Still working through days missed during downtime: take the next paced
+                # slot rather than going out on the next tick with everyone else's backlog
+                send_at = datetime.fromtimestamp(catchup_pacer.slots(1, catchup_spacing(0))[0])
+                CATCHUP_LESSONS.inc(policy=CATCHUP_POLICY, action="rescheduled")
+            next_send_at = send_at.strftime(DB_TIME_FORMAT)
+            conn.execute(
+                "UPDATE enrollments SET next_day = ?, next_send_at = ?, updated_at = ? "
+                "WHERE phone = ? AND course = ? AND schedule_id = ? AND status = 'active'",
+                (next_day, next_send_at, time.time(), row["phone"], row["course"], row["schedule_id"])
+            )
+    return True
+
+def settle_enrollment(row):
+    """Advance a claimed enrollment once its lesson is delivered or has failed for good
+
+    A lesson the outbox is still working on (or that recovery dropped to be
+    generated again) keeps the enrollment on its day; the claim lease runs
+    out and the next dispatcher tick looks at it again.
+    """
+    status = lesson_delivery_status(row["phone"], row["course"], row["next_day"])
+    if status in ('delivered', 'failed'):
+        advance_enrollment(row)
+        return True
+    logger.info(f"📮 Day {row['next_day']} for {row['phone']} is not settled yet, checking again in {DISPATCH_LEASE_MINUTES} min")
+    return False
+
+def deliver_due_lesson(row):
+    """Send the next lesson of a claimed enrollment and advance it"""
+    try:
+        ok = send_course_lesson(row["phone"], row["course"], row["next_day"], row["total_days"])
+        if not ok:
+            logger.error(f"❌ Day {row['next_day']} failed for {row['phone']} - {row['course']}")
+        settle_enrollment(row)
+        return ok
+    except Exception as e:
+        logger.error(f"❌ Error delivering due lesson: {str(e)}")
+        return False
+
+# === CATCH-UP AFTER DOWNTIME ===
+# When no dispatcher tick of this shard has completed for more than
+# CATCHUP_GRACE_SECONDS (the worker was down), lessons more than
+# CATCHUP_GRACE_SECONDS late are backlog. Lessons that are only late because
+# a busy tick is still working through the queue are not. Before each
+# dispatcher tick the backlog is handled by CATCHUP_POLICY:
+#   skip      drop the missed lessons; the learner continues with the first
+#             lesson whose regular time is still ahead
+#   coalesce  drop all but the latest missed lesson and send that one
+#   spread    send every missed lesson, spaced over CATCHUP_WINDOW_SECONDS
+# Backlog sends are paced to at most CATCHUP_MAX_PER_MINUTE across ticks, so
+# recovery never crowds out lessons that are due on time. A learner with more
+# missed days gets each following one from the same pacer as the previous
+# one is delivered (see advance_enrollment).
+CATCHUP_POLICY = os.environ.get("CATCHUP_POLICY", "spread")  # skip | coalesce | spread
+CATCHUP_GRACE_SECONDS = int(os.environ.get("CATCHUP_GRACE_SECONDS", 300))
+CATCHUP_WINDOW_SECONDS = int(os.environ.get("CATCHUP_WINDOW_SECONDS", 3600))
+CATCHUP_MAX_PER_MINUTE = float(os.environ.get("CATCHUP_MAX_PER_MINUTE", 120))
+CATCHUP_POLICIES = ("skip", "coalesce", "spread")
+
+CATCHUP_LESSONS = metrics.counter(
+    "learnhub_catchup_lessons_total", "Overdue lessons handled by the catch-up policy", ("policy", "action"))
+
+class CatchupPacer:
+    """Hands out send times for backlog lessons no faster than one per `spacing` seconds, across ticks"""
+
+    def __init__(self):
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def slots(self, count, spacing):
+        with self.lock:
+            start = max(time.time(), self.next_slot)
+            self.next_slot = start + count * spacing
+        return [start + i * spacing for i in range(count)]
+
+catchup_pacer = CatchupPacer()
+
+def init_dispatcher_ticks():
+    """Create the dispatcher tick table if it does not exist yet"""
+    with db_connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS dispatcher_ticks (
+                shard TEXT PRIMARY KEY,
+                completed_at REAL NOT NULL
+            )
+        """)
+
+def dispatcher_tick_key():
+    return "all" if _delivery_shard is None else f"{_delivery_shard}/{DELIVERY_SHARDS}"
+
+def record_dispatcher_tick():
+    """Note that this shard's dispatcher just finished a tick"""
+    with db_connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO dispatcher_ticks (shard, completed_at) VALUES (?, ?)",
+            (dispatcher_tick_key(), time.time())
+        )
+
+def last_dispatcher_tick():
+    """When this shard's dispatcher last finished a tick, or None if it never has"""
+    with db_connection() as conn:
+        row = conn.execute("SELECT completed_at FROM dispatcher_ticks WHERE shard = ?", (dispatcher_tick_key(),)).fetchone()
+    return row["completed_at"] if row else None
+
+def catchup_spacing(backlog):
+    """Seconds between backlog sends for this process"""
+    # Like the Twilio sender rate, the drain rate is shared between shards
+    rate = CATCHUP_MAX_PER_MINUTE / (DELIVERY_SHARDS if _delivery_shard is not None else 1)
+    spacing = 60 / rate
+    if CATCHUP_POLICY == "spread" and backlog:
+        spacing = max(spacing, CATCHUP_WINDOW_SECONDS / backlog)
+    return spacing
+
+def missed_days(row, now):
+    """How many later lessons have also fallen due since the enrollment's next lesson"""
+    # next_send_at may hold a lease or an earlier catch-up slot; go by the regular time
+    due = lesson_send_time(row["start_date"], row["preferred_time"], row["next_day"])
+    return max(0, int((now - due).total_seconds() // 86400))
+
+def reschedule_backlog():
+    """Apply CATCHUP_POLICY to this shard's overdue enrollments; returns how many were handled"""
+    if CATCHUP_POLICY not in CATCHUP_POLICIES:
+        logger.error(f"❌ Unknown CATCHUP_POLICY {CATCHUP_POLICY!r}, expected one of {', '.join(CATCHUP_POLICIES)}")
+        return 0
+    last_tick = last_dispatcher_tick()
+    if last_tick is not None and time.time() - last_tick <= CATCHUP_GRACE_SECONDS:
+        return 0  # no downtime: anything late is just waiting its turn in the normal queue
+    now = datetime.now()
+    cutoff = (now - timedelta(seconds=CATCHUP_GRACE_SECONDS)).strftime(DB_TIME_FORMAT)
+    shard_clause, shard_params = "", ()
+    if _delivery_shard is not None:
+        shard_clause, shard_params = "AND shard_key % ? = ? ", (DELIVERY_SHARDS, _delivery_shard)
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT phone, course, schedule_id, total_days, start_date, preferred_time, next_day, next_send_at "
+            f"FROM enrollments WHERE status = 'active' AND next_send_at < ? {shard_clause}ORDER BY next_send_at",
+            (cutoff,) + shard_params
+        ).fetchall()
+        if not rows:
+            return 0
+        updates = []
+        if CATCHUP_POLICY == "skip":
+            for row in rows:
+                updates.append((row, row["next_day"] + missed_days(row, now) + 1, None))
+        else:
+            slots = catchup_pacer.slots(len(rows), catchup_spacing(len(rows)))
+            for row, slot in zip(rows, slots):
+                next_day = row["next_day"]
+                if CATCHUP_POLICY == "coalesce":
+                    next_day = min(row["total_days"], next_day + missed_days(row, now))
+                updates.append((row, next_day, datetime.fromtimestamp(slot)))
+        skipped = 0
+        for row, next_day, send_at in updates:
+            skipped += min(next_day, row["total_days"] + 1) - row["next_day"]
+            if next_day > row["total_days"]:
+                conn.execute(
+                    "UPDATE enrollments SET next_day = ?, next_send_at = NULL, status = 'completed', completed_at = ?, updated_at = ? "
+                    "WHERE phone = ? AND course = ? AND schedule_id = ?",
+                    (row["total_days"] + 1, now.strftime(DB_TIME_FORMAT), time.time(), row["phone"], row["course"], row["schedule_id"])
+                )
+                continue
+            send_at = send_at or lesson_send_time(row["start_date"], row["preferred_time"], next_day)
+            conn.execute(
+                "UPDATE enrollments SET next_day = ?, next_send_at = ?, updated_at = ? "
+                "WHERE phone = ? AND course = ? AND schedule_id = ?",
+                (next_day, send_at.strftime(DB_TIME_FORMAT), time.time(), row["phone"], row["course"], row["schedule_id"])
+            )
+    if skipped:
+        CATCHUP_LESSONS.inc(skipped, policy=CATCHUP_POLICY, action="skipped")
+    if CATCHUP_POLICY != "skip":
+        CATCHUP_LESSONS.inc(len(rows), policy=CATCHUP_POLICY, action="rescheduled")
+        last = max(send_at for _, _, send_at in updates)
+        logger.info(f"⏪ Catch-up ({CATCHUP_POLICY}): {len(rows)} overdue lessons paced until {last:%H:%M:%S}, "
+                    f"{skipped} skipped")
+    else:
+        logger.info(f"⏪ Catch-up (skip): {skipped} missed lessons skipped for {len(rows)} learners")
+    return len(rows)
+
+def scheduler_job_defaults():
+    """APScheduler defaults; lesson jobs are not dropped unless the policy is skip
+
+    APScheduler pickles these into every stored job, so jobs already in the
+    job store keep their old values until refresh_lesson_job_defaults
+    rewrites them.
+    """
+    return {
+        'coalesce': True,
+        'max_instances': 1,
+        # APScheduler's default of 1s silently drops any job that was due while we were down
+        'misfire_grace_time': CATCHUP_GRACE_SECONDS if CATCHUP_POLICY == "skip" else None,
+    }
+
+def refresh_lesson_job_defaults(defaults):
+    """Rewrite the misfire settings stored in legacy lesson jobs that differ from `defaults`"""
+    scheduler = get_scheduler()
+    stale = [job for job in scheduler.get_jobs() if LESSON_JOB_ID_RE.match(job.id) and any(
+        getattr(job, name) != value for name, value in defaults.items())]
+    for job in stale:
+        try:
+            scheduler.modify_job(job.id, **defaults)
+        except JobLookupError:
+            pass
+    if stale:
+        logger.info(f"🔧 Updated misfire settings of {len(stale)} lesson jobs")
+    return len(stale)
+
+def reschedule_overdue_jobs():
+    """Pace legacy lesson jobs that fell due while the scheduler was down
+
+    Call with the scheduler started paused. Every lesson job first gets the
+    current job defaults. Under 'coalesce' only each learner's latest
+    overdue day is kept; under 'skip' the job defaults let APScheduler drop
+    them instead.
+    """
+    defaults = scheduler_job_defaults()
+    refresh_lesson_job_defaults(defaults)
+    if CATCHUP_POLICY == "skip":
+        return 0
+    scheduler = get_scheduler()
+    cutoff = time.time() - CATCHUP_GRACE_SECONDS
+    try:
+        with jobstore_connection() as conn:
+            overdue = conn.execute(
+                "SELECT id FROM apscheduler_jobs WHERE next_run_time < ? ORDER BY next_run_time", (cutoff,)
+            ).fetchall()
+    except sqlite3.OperationalError:
+        return 0  # no job store yet
+    lessons = [(job_id, LESSON_JOB_ID_RE.match(job_id)) for (job_id,) in overdue]
+    lessons = [(job_id, match) for job_id, match in lessons if match]
+    if CATCHUP_POLICY == "coalesce":
+        latest = {}
+        for job_id, match in lessons:
+            key = (match["phone"], match["course"])
+            if key not in latest or int(match["day"]) > int(latest[key][1]["day"]):
+                latest[key] = (job_id, match)
+        keep = {job_id for job_id, _ in latest.values()}
+        for job_id, _ in lessons:
+            if job_id not in keep:
+                try:
+                    scheduler.remove_job(job_id)
+                except JobLookupError:
+                    pass
+        CATCHUP_LESSONS.inc(len(lessons) - len(keep), policy=CATCHUP_POLICY, action="skipped")
+        lessons = [(job_id, match) for job_id, match in lessons if job_id in keep]
+    slots = catchup_pacer.slots(len(lessons), catchup_spacing(len(lessons)))
+    for (job_id, _), slot in zip(lessons, slots):
+        try:
+            scheduler.modify_job(job_id, next_run_time=datetime.fromtimestamp(slot, timezone.utc), **defaults)
+        except JobLookupError:
+            pass
+    if lessons:
+        CATCHUP_LESSONS.inc(len(lessons), policy=CATCHUP_POLICY, action="rescheduled")
+        logger.info(f"⏪ Catch-up ({CATCHUP_POLICY}): {len(lessons)} overdue lesson jobs paced")
+    return len(lessons)
+
+def dispatch_due_lessons():
+    """Scheduler tick: deliver every lesson that is due, batch by batch"""
+    try:
+        reschedule_backlog()
+    except Exception as e:
+        logger.error(f"❌ Error applying catch-up policy: {str(e)}")
+    delivered = 0
+    try:
+        if DELIVERY_ENGINE == "asyncio":
+            delivered = async_delivery_engine.dispatch_due()
+        else:
+            with ThreadPoolExecutor(max_workers=DISPATCH_CONCURRENCY) as executor:
+                while True:
+                    rows = claim_due_enrollments(shard=_delivery_shard)
+                    if not rows:
+                        break
+                    logger.info(f"📬 Dispatching {len(rows)} due lessons")
+                    delivered += sum(1 for ok in executor.map(deliver_due_lesson, rows) if ok)
+                    if len(rows) < DISPATCH_BATCH_SIZE:
+                        break
+    except Exception as e:
+        logger.error(f"❌ Error dispatching due lessons: {str(e)}")
+    try:
+        record_dispatcher_tick()
+    except Exception as e:
+        logger.error(f"❌ Could not record the dispatcher tick: {str(e)}")
+    return delivered
+
+init_enrollments()
+init_dispatcher_ticks()
+
+# === ASYNCIO DELIVERY ENGINE ===
+# DELIVERY_ENGINE=asyncio delivers due lessons as coroutines on one event loop
+# thread instead of a thread per lesson: Together and Twilio calls use their
+# async clients, so thousands of lessons can wait on the network at once.
+# Concurrency is bounded by semaphores; retries, circuit breakers, the sender
+# rate limit and metrics are shared with the threaded path. Welcome messages
+# and one-off sends keep using the outbound dispatcher.
+DELIVERY_ENGINE = os.environ.get("DELIVERY_ENGINE", "threads")  # threads | asyncio
+ASYNC_DELIVERY_CONCURRENCY = int(os.environ.get("ASYNC_DELIVERY_CONCURRENCY", 1000))
+ASYNC_LLM_CONCURRENCY = int(os.environ.get("ASYNC_LLM_CONCURRENCY", 50))
+
+async def call_upstream_async(breaker, is_retryable, max_retries, func, *args, **kwargs):
+    """call_upstream for coroutine functions"""
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.record_success()  # The upstream answered; the request itself was bad
+                raise
+            breaker.record_failure()
+            if attempt >= max_retries:
+                raise
+            delay = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** attempt))
+            attempt += 1
+            logger.warning(f"🔁 {breaker.name} call failed ({str(e)}), retry {attempt}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+def is_together_retryable_async(error):
+    import aiohttp
+    return is_together_retryable(error) or isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+def is_twilio_retryable_async(error):
+    # Only a failed connect is safe to retry; a timed out request may have been delivered
+    import aiohttp
+    return is_twilio_retryable(error) or isinstance(error, aiohttp.ClientConnectorError)
+
+async def acquire_token(bucket):
+    """Wait for a TokenBucket token without blocking the event loop"""
+    while True:
+        wait = bucket.try_acquire()
+        if wait <= 0:
+            return
+        await asyncio.sleep(wait)
+
+class AsyncDeliveryEngine:
+    """Event loop thread delivering lessons with bounded concurrency"""
+
+    def __init__(self, concurrency, llm_concurrency):
+        self.concurrency = concurrency
+        self.llm_concurrency = llm_concurrency
+        self.loop = None
+        self.lock = threading.Lock()
+        self.recipient_locks = weakref.WeakValueDictionary()
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.loop is not None:
+                return
+            ready = threading.Event()
+            thread = threading.Thread(target=self._run, args=(ready,), name="async-delivery", daemon=True)
+            thread.start()
+            ready.wait()
+            if self.loop is None:
+                raise RuntimeError("Async delivery engine failed to start")
+            logger.info(f"⚡ Async delivery engine started ({self.concurrency} lessons, {self.llm_concurrency} generations)")
+
+    def _run(self, ready):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._setup())
+            self.loop = loop
+        except Exception as e:
+            logger.error(f"❌ Async delivery engine setup failed: {str(e)}")
+            return
+        finally:
+            ready.set()
+        loop.run_forever()
+
+    async def _setup(self):
+        """Semaphores and HTTP clients must be created on the engine's own loop"""
+        import aiohttp
+        import together as together_sdk
+        from twilio.rest import Client
+        from twilio.http.async_http_client import AsyncTwilioHttpClient
+        self.delivery_slots = asyncio.Semaphore(self.concurrency)
+        self.llm_slots = asyncio.Semaphore(self.llm_concurrency)
+        self.together_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.llm_concurrency),
+            timeout=aiohttp.ClientTimeout(sock_connect=TOGETHER_CONNECT_TIMEOUT, sock_read=TOGETHER_READ_TIMEOUT)
+        )
+        self.together = together_sdk.AsyncTogether(api_key=TOGETHER_API_KEY, timeout=TOGETHER_READ_TIMEOUT, max_retries=0)
+        self.twilio = Client(
+            TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN,
+            http_client=AsyncTwilioHttpClient(pool_connections=True, timeout=TWILIO_READ_TIMEOUT, max_retries=0)
+        )
+
+    def submit(self, coro):
+        """Schedule a coroutine on the engine's loop, returns a concurrent Future"""
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def dispatch_due(self):
+        """Scheduler tick: claim due enrollments and keep up to `concurrency` lessons in flight"""
+        delivered = 0
+        pending = set()
+        try:
+            while True:
+                rows = claim_due_enrollments(shard=_delivery_shard)
+                if not rows:
+                    break
+                logger.info(f"📬 Dispatching {len(rows)} due lessons (asyncio)")
+                pending.update(self.submit(self.deliver_due_lesson(row)) for row in rows)
+                while len(pending) >= self.concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    delivered += sum(1 for future in done if future.result())
+                if len(rows) < DISPATCH_BATCH_SIZE:
+                    break
+            done, _ = wait(pending)
+            delivered += sum(1 for future in done if future.result())
+        except Exception as e:
+            logger.error(f"❌ Error dispatching due lessons: {str(e)}")
+        return delivered
+
+    async def deliver_due_lesson(self, row):
+        try:
+            ok = await self.send_course_lesson(row["phone"], row["course"], row["next_day"], row["total_days"])
+            if not ok:
+                logger.error(f"❌ Day {row['next_day']} failed for {row['phone']} - {row['course']}")
+            await asyncio.to_thread(settle_enrollment, row)
+            return ok
+        except Exception as e:
+            logger.error(f"❌ Error delivering due lesson: {str(e)}")
+            return False
+
+    async def send_course_lesson(self, phone, course, day, total_days):
+        """Async send_course_lesson: one lesson at a time per recipient, parts in order"""
+        async with self.delivery_slots:
+            lock = self.recipient_locks.get(phone)
+            if lock is None:
+                lock = self.recipient_locks[phone] = asyncio.Lock()
+            async with lock:
+                return await self._send_course_lesson(phone, course, day, total_days)
+
+    async def _send_course_lesson(self, phone, course, day, total_days):
+        started = time.perf_counter()
+        opened = False
+        try:
+            logger.info(f"🎯 SENDING DETAILED LESSON (async): {phone} - {course} - Day {day}")
+            existing = await asyncio.to_thread(open_lesson_delivery, phone, course, day, total_days)
+            if existing is not None:
+                logger.info(f"📮 Day {day} for {phone} is already in the outbox ({existing})")
+                return existing == 'delivered'
+            opened = True
+            header = lesson_header(course, day, total_days)
+            footer = lesson_footer(day, total_days)
+            
+            cached = await asyncio.to_thread(get_cached_lesson, course, day, total_days)
+            results = None
+            if cached is None and LLM_STREAMING:
+                results = await self.stream_lesson_parts(phone, course, day, total_days, header, footer)
+            if results is None:
+                content = cached if cached is not None else await self.generate_lesson(course, day, total_days)
+                message_parts = split_long_message(header + content + footer)
+                await asyncio.to_thread(record_lesson_parts, phone, course, day, message_parts, final=True)
+                results = []
+                for part, body in enumerate(message_parts, 1):
+                    results.append(await self.send_lesson_part(phone, course, day, part, body))
+            
+            ok = all(results)
+            LESSON_PARTS.observe(len(results))
+            LESSON_DELIVERY_SECONDS.observe(time.perf_counter() - started, outcome="success" if ok else "failure")
+            if not ok or not await asyncio.to_thread(finish_lesson_delivery, phone, course, day):
+                logger.error(f"❌ Failed to send all parts of Day {day} to {phone}, the outbox retries the rest")
+                return False
+            logger.info(f"✅ Successfully delivered Day {day} ({len(results)} parts) to {phone}")
+            if day == total_days:
+                await self.send_whatsapp(phone, build_completion_message(course, total_days))
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error sending course lesson: {str(e)}")
+            if opened:
+                try:
+                    await asyncio.to_thread(close_lesson_delivery, phone, course, day, failed=True)
+                except Exception as e:
+                    logger.error(f"❌ Could not mark Day {day} failed for {phone}: {str(e)}")
+            return False
+
+    async def create_completion(self, **kwargs):
+        import together as together_sdk
+        together_sdk.aiosession.set(self.together_session)  # task-local: reuse the pooled session
+        return await self.together.chat.completions.create(**kwargs)
+
+    async def generate_lesson(self, course, day, total_days):
+        """Async generate_detailed_course_content for a cache miss, shared with concurrent callers"""
+        key = lesson_cache_key(course, day, total_days)
+        while True:
+            future, leader = lesson_flight.join(key)
+            if not leader:
+                LESSON_GENERATIONS_SHARED.inc()
+                content = await asyncio.wrap_future(future)
+                if content is not None:
+                    return content
+                continue  # the leader produced nothing; try again, possibly as leader
+            content = None
+            try:
+                content = await self.generate_uncached(course, day, total_days)
+                return content
+            finally:
+                lesson_flight.finish(key, content)
+
+    async def generate_uncached(self, course, day, total_days):
+        async with self.llm_slots:
+            try:
+                # Planning the outline is a one-off blocking call per course, keep it off the loop
+                prompt = await asyncio.to_thread(build_lesson_prompt, course, day, total_days)
+                logger.info(f"🤖 Generating detailed content for {course} - Day {day}/{total_days}")
+                with LLM_GENERATION_SECONDS.time(mode="async", outcome="error") as labels:
+                    response = await call_upstream_async(
+                        together_breaker, is_together_retryable_async, TOGETHER_MAX_RETRIES,
+                        self.create_completion,
+                        model=LESSON_MODEL,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=0.7,
+                        max_tokens=LESSON_MAX_TOKENS
+                    )
+                    content = response.choices[0].message.content.strip()
+                    labels["outcome"] = "success"
+                await asyncio.to_thread(store_cached_lesson, course, day, total_days, content)
+                return content
+            except Exception as e:
+                logger.error(f"❌ Error generating detailed content: {str(e)}")
+                return fallback_course_content(course, day)
+
+    async def stream_lesson_parts(self, phone, course, day, total_days, header, footer):
+        """Async stream_lesson_parts: a sender task drains parts while generation continues
+
+        Returns per-part results, or None if streaming failed before any part
+        was produced or another caller is already generating this lesson.
+        """
+        key = lesson_cache_key(course, day, total_days)
+        _, leader = lesson_flight.join(key)
+        if not leader:
+            return None
+        content = None
+        try:
+            results, content = await self._stream_lesson_parts(phone, course, day, total_days, header, footer)
+            return results
+        finally:
+            lesson_flight.finish(key, content)
+
+    async def _stream_lesson_parts(self, phone, course, day, total_days, header, footer):
+        """(per-part results or None, generated text or None)"""
+        parts = asyncio.Queue()
+        results = []
+
+        async def sender():
+            while True:
+                body = await parts.get()
+                if body is None:
+                    return
+                part = len(results) + 1
+                await asyncio.to_thread(record_lesson_parts, phone, course, day, [body], first_part=part)
+                results.append(await self.send_lesson_part(phone, course, day, part, body))
+
+        splitter = IncrementalSplitter()
+        chunks = []
+        produced = 0
+        started = time.perf_counter()
+        sending = asyncio.create_task(sender())
+        try:
+            async with self.llm_slots:
+                for part in splitter.feed(header):
+                    parts.put_nowait(part)
+                    produced += 1
+                prompt = await asyncio.to_thread(build_lesson_prompt, course, day, total_days)
+                stream = await call_upstream_async(
+                    together_breaker, is_together_retryable_async, TOGETHER_MAX_RETRIES,
+                    self.create_completion,
+                    model=LESSON_MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.7,
+                    max_tokens=LESSON_MAX_TOKENS,
+                    stream=True
+                )
+                async for chunk in stream:
+                    if not (chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content):
+                        continue
+                    chunks.append(chunk.choices[0].delta.content)
+                    for part in splitter.feed(chunks[-1]):
+                        if not produced:
+                            LESSON_FIRST_PART_SECONDS.observe(time.perf_counter() - started)
+                        parts.put_nowait(part)
+                        produced += 1
+            LLM_GENERATION_SECONDS.observe(time.perf_counter() - started, mode="async_stream", outcome="success")
+        except Exception as e:
+            LLM_GENERATION_SECONDS.observe(time.perf_counter() - started, mode="async_stream", outcome="error")
+            logger.error(f"❌ Streaming generation failed: {str(e)}")
+            parts.put_nowait(None)
+            await sending
+            if not produced:
+                return None, None
+            # Some parts are already out and the rest of the text is lost: follow them with the full lesson
+            content = await self.generate_uncached(course, day, total_days)
+            resumed = await asyncio.to_thread(resume_lesson_parts, phone, course, day, total_days, content)
+            for part, body in resumed:
+                results.append(await self.send_lesson_part(phone, course, day, part, body))
+            return results, content
+        
+        content = "".join(chunks).strip() or None
+        if content is None:
+            parts.put_nowait(None)
+            await sending
+            return None, None
+        await asyncio.to_thread(store_cached_lesson, course, day, total_days, content)
+        for part in splitter.feed(footer) + splitter.finish():
+            parts.put_nowait(part)
+        parts.put_nowait(None)
+        await sending
+        await asyncio.to_thread(close_lesson_delivery, phone, course, day, parts=len(results))
+        return results, content
+
+    async def send_lesson_part(self, phone, course, day, part, body):
+        """Async deliver_lesson_part"""
+        if not await asyncio.to_thread(start_part_send, phone, course, day, part):
+            return None
+        sid = await self.send_whatsapp(phone, body)
+        await asyncio.to_thread(finish_part_send, phone, course, day, part, sid)
+        return sid
+
+    async def send_whatsapp(self, to_phone, message, from_number=TWILIO_WHATSAPP_NUMBER):
+        """Async deliver_whatsapp, paced by the outbound dispatcher's sender and recipient buckets
+
+        Returns the Twilio message SID, or False if the send failed.
+        """
+        await acquire_token(outbound_dispatcher.recipient_bucket(to_phone))
+        await acquire_token(outbound_dispatcher.sender_bucket(from_number))
+        try:
+            logger.info(f"📤 Sending WhatsApp ({len(message)} chars) to: {to_phone}")
+            with TWILIO_SEND_SECONDS.time(outcome="failure") as labels:
+                sent = await call_upstream_async(
+                    twilio_breaker, is_twilio_retryable_async, TWILIO_MAX_RETRIES,
+                    self.twilio.messages.create_async,
+                    body=message,
+                    from_=from_number,
+                    to=f"whatsapp:{to_phone}"
+                )
+                labels["outcome"] = "success"
+            return sent.sid
+        except Exception as e:
+            logger.error(f"❌ Error sending WhatsApp: {str(e)}")
+            TWILIO_SEND_FAILURES.inc(reason=twilio_failure_reason(e))
+            return False
+
+async_delivery_engine = AsyncDeliveryEngine(ASYNC_DELIVERY_CONCURRENCY, ASYNC_LLM_CONCURRENCY)
+
+def build_welcome_message(course, days, time_str):
+    return (
+        f"Welcome to {course}! 🎉\n\n"
+        f"Your {days}-day detailed learning journey starts NOW!\n\n"
+        "📚 What you'll get each day:\n"
+        "• Clear learning objectives\n"
+        "• Detailed core concepts\n"
+        "• Hands-on exercises\n"
+        "• YouTube video references\n"
+        "• Additional resources\n"
+        "• Key takeaways\n\n"
+        f"⏰ Lessons will arrive daily at {time_str}\n\n"
+        "Reply STOP to unsubscribe."
+    )
+
+def schedule_course_messages_detailed(phone, course, days, time_str, user_name=None):
+    """Schedule detailed course messages with proper time handling"""
+    try:
+        logger.info(f"🚀 DETAILED COURSE MODE: Scheduling {course} for {phone} over {days} days at {time_str}")
+        
+        # Store user name if provided
+        if user_name:
+            store_user_name(phone, user_name)
+        
+        # Remove any jobs left over from the old one-job-per-day scheduling
+        removed_count = remove_existing_jobs(phone, course)
+        if removed_count > 0:
+            logger.info(f"🗑️ Removed {removed_count} existing jobs")
+        
+        # Reset progress for this course
+        reset_progress(phone, course)
+        forget_lesson_deliveries([(phone, course)])
+        
+        # Create a unique schedule ID
+        schedule_id = str(uuid.uuid4())[:8]
+        
+        # Convert user's preferred time to 24-hour format
+        time_obj = datetime.strptime(time_str, "%I:%M %p")
+        now = datetime.now()
+        
+        # Create today's scheduled time with user's preferred time
+        scheduled_time_today = now.replace(
+            hour=time_obj.hour, 
+            minute=time_obj.minute, 
+            second=0, 
+            microsecond=0
+        )
+        
+        # FIXED: SMART TIME HANDLING LOGIC
+        current_progress = get_progress(phone, course)
+        day_to_start = current_progress + 1
+        
+        # Send welcome message immediately
+        welcome_message = build_welcome_message(course, days, time_str)
+        
+        if not send_whatsapp(phone, welcome_message):
+            logger.error("❌ Failed to send welcome message")
+            return False
+        
+        # FIXED: SMART SCHEDULING BASED ON TIME
+        if scheduled_time_today <= now:
+            # PAST TIME: Send today's lesson immediately, remaining days follow at selected time
+            logger.info(f"⏰ Past time detected: {time_str} - Sending Day {day_to_start} immediately")
+            
+            # Send current day immediately
+            if day_to_start <= days:
+                send_success = send_course_lesson(phone, course, day_to_start, days)
+                if send_success:
+                    logger.info(f"✅ Day {day_to_start} sent immediately (past time)")
+                    day_to_start += 1
+                else:
+                    logger.error(f"❌ Failed to send Day {day_to_start}")
+        else:
+            # FUTURE TIME: All lessons start from today at selected time
+            logger.info(f"⏰ Future time detected: {time_str} - Scheduling all lessons at selected time")
+        
+        # Day 1 is anchored on today, so Day N is due N-1 days from now at the selected time
+        next_send_at = save_enrollment(
+            phone, course, days, now.strftime("%Y-%m-%d"), time_str, day_to_start, schedule_id, user_name
+        )
+        logger.info(f"✅ Enrollment saved: Day {day_to_start} due at {next_send_at}")
+        
+        logger.info(f"🎯 Successfully scheduled {days} days of detailed content with smart time handling")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Failed to schedule detailed course: {str(e)}")
+        return False
+
+# === ENROLLMENT QUEUE ===
+# /schedule only records the enrollment and returns; the welcome message and any
+# catch-up lesson are delivered by the worker process (see worker.py), which
+# polls this table. Rows survive restarts and are picked up by whichever
+# process currently holds the delivery leader lock.
+# kind='enroll' rows run the full scheduling flow for one learner; kind='welcome'
+# rows come from bulk enrollment, which has already written the enrollment, and
+# are sent in batches through the outbound dispatcher. A welcome that fails is
+# set to 'retry' and sent again after WELCOME_RETRY_SECONDS, up to
+# WELCOME_MAX_ATTEMPTS times, before it and its enrollment are marked failed.
+ENROLLMENT_POLL_SECONDS = int(os.environ.get("ENROLLMENT_POLL_SECONDS", 5))
+ENROLLMENT_LEASE_SECONDS = int(os.environ.get("ENROLLMENT_LEASE_SECONDS", 600))
+WELCOME_BATCH_SIZE = int(os.environ.get("WELCOME_BATCH_SIZE", 100))
+WELCOME_MAX_ATTEMPTS = int(os.environ.get("WELCOME_MAX_ATTEMPTS", 5))
+WELCOME_RETRY_SECONDS = int(os.environ.get("WELCOME_RETRY_SECONDS", 300))
+
+_enrollment_wakeup = queue.Queue()
+_enrollment_worker_lock = threading.Lock()
+_enrollment_worker_thread = None
+
+def init_enrollment_queue():
+    """Create the enrollment queue table if it does not exist yet"""
+    with db_connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS enrollment_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                phone TEXT NOT NULL,
+                course TEXT NOT NULL,
+                days INTEGER NOT NULL,
+                time_str TEXT NOT NULL,
+                user_name TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        ensure_column(conn, "enrollment_queue", "kind", "TEXT NOT NULL DEFAULT 'enroll'")
+        ensure_column(conn, "enrollment_queue", "attempts", "INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_enrollment_queue_status ON enrollment_queue (status, updated_at)")
+
+def enqueue_enrollment(phone, course, days, time_str, user_name=None):
+    """Durably record an enrollment request and wake the worker, returns its id"""
+    now = time.time()
+    with db_connection() as conn:
+        cursor = conn.execute(
+            "INSERT INTO enrollment_queue (phone, course, days, time_str, user_name, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)",
+            (phone, course, days, time_str, user_name, now, now)
+        )
+        enrollment_id = cursor.lastrowid
+    logger.info(f"📝 Enrollment {enrollment_id} queued: {phone} - {course}")
+    wake_enrollment_worker()
+    return enrollment_id
+
+def get_enrollment_status(enrollment_id):
+    """Return 'pending', 'processing', 'retry', 'sent' or 'failed' for an enrollment, or None"""
+    with db_connection() as conn:
+        row = conn.execute("SELECT status FROM enrollment_queue WHERE id = ?", (enrollment_id,)).fetchone()
+    return row["status"] if row else None
+
+def claim_enrollment(enrollment_id):
+    """Atomically take ownership of a pending (or abandoned, or due for retry) enrollment"""
+    now = time.time()
+    with db_connection() as conn:
+        cursor = conn.execute(
+            "UPDATE enrollment_queue SET status = 'processing', attempts = attempts + 1, updated_at = ? "
+            "WHERE id = ? AND (status = 'pending' OR (status = 'processing' AND updated_at < ?) "
+            "OR (status = 'retry' AND updated_at < ?))",
+            (now, enrollment_id, now - ENROLLMENT_LEASE_SECONDS, now - WELCOME_RETRY_SECONDS)
+        )
+        if cursor.rowcount == 0:
+            return None
+        return conn.execute("SELECT * FROM enrollment_queue WHERE id = ?", (enrollment_id,)).fetchone()
+
+def finish_enrollment(enrollment_id, status, error=None):
+    with db_connection() as conn:
+        conn.execute(
+            "UPDATE enrollment_queue SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            (status, error, time.time(), enrollment_id)
+        )
+
+def process_enrollment(enrollment_id):
+    """Send the welcome message and schedule lessons for one queued enrollment"""
+    row = claim_enrollment(enrollment_id)
+    if row is None:
+        return False
+    try:
+        ok = schedule_course_messages_detailed(
+            row["phone"], row["course"], row["days"], row["time_str"], row["user_name"]
+        )
+        finish_enrollment(enrollment_id, 'sent' if ok else 'failed', None if ok else "Failed to schedule course messages")
+        return ok
+    except Exception as e:
+        logger.error(f"❌ Error processing enrollment {enrollment_id}: {str(e)}")
+        finish_enrollment(enrollment_id, 'failed', str(e))
+        return False
+
+def process_welcome_batch(enrollment_ids):
+    """Send welcome messages for bulk-enrolled learners and activate their enrollments"""
+    claimed = [row for row in map(claim_enrollment, enrollment_ids) if row is not None]
+    futures = [
+        queue_whatsapp(row["phone"], build_welcome_message(row["course"], row["days"], row["time_str"]))
+        for row in claimed
+    ]
+    sent = 0
+    for row, future in zip(claimed, futures):
+        ok = future.result()
+        if not ok and row["attempts"] < WELCOME_MAX_ATTEMPTS:
+            # The enrollment stays pending until the welcome is out
+            finish_enrollment(row["id"], 'retry', "Failed to send welcome message")
+            continue
+        with db_connection() as conn:
+            conn.execute(
+                "UPDATE enrollments SET status = ?, updated_at = ? WHERE phone = ? AND course = ? AND status = 'pending'",
+                ('active' if ok else 'failed', time.time(), row["phone"], row["course"])
+            )
+        finish_enrollment(row["id"], 'sent' if ok else 'failed', None if ok else "Failed to send welcome message")
+        sent += 1 if ok else 0
+    if claimed:
+        logger.info(f"👋 Welcome batch: {sent}/{len(claimed)} sent")
+    return sent
+
+def pending_enrollments():
+    """(id, kind) of enrollments waiting for delivery, including abandoned in-flight ones and due retries"""
+    now = time.time()
+    with db_connection() as conn:
+        rows = conn.execute(
+            "SELECT id, kind FROM enrollment_queue WHERE status = 'pending' "
+            "OR (status = 'processing' AND updated_at < ?) OR (status = 'retry' AND updated_at < ?) ORDER BY id",
+            (now - ENROLLMENT_LEASE_SECONDS, now - WELCOME_RETRY_SECONDS)
+        ).fetchall()
+    return [(row["id"], row["kind"]) for row in rows]
+
+def enrollment_worker():
+    """Background loop delivering queued enrollments"""
+    while True:
+        try:
+            try:
+                _enrollment_wakeup.get(timeout=ENROLLMENT_POLL_SECONDS)
+            except queue.Empty:
+                pass
+            pending = pending_enrollments()
+            welcome_ids = [enrollment_id for enrollment_id, kind in pending if kind == 'welcome']
+            for start in range(0, len(welcome_ids), WELCOME_BATCH_SIZE):
+                process_welcome_batch(welcome_ids[start:start + WELCOME_BATCH_SIZE])
+            for enrollment_id, kind in pending:
+                if kind != 'welcome':
+                    process_enrollment(enrollment_id)
+        except Exception as e:
+            logger.error(f"❌ Enrollment worker error: {str(e)}")
+            time.sleep(ENROLLMENT_POLL_SECONDS)
+
+def ensure_enrollment_worker():
+    """Start the enrollment worker thread once per process"""
+    global _enrollment_worker_thread
+    with _enrollment_worker_lock:
+        if _enrollment_worker_thread is None or not _enrollment_worker_thread.is_alive():
+            _enrollment_worker_thread = threading.Thread(target=enrollment_worker, name="enrollment-worker", daemon=True)
+            _enrollment_worker_thread.start()
+            _enrollment_wakeup.put(None)  # Pick up anything left over from a previous run
+            logger.info("✅ Enrollment worker started")
+
+def wake_enrollment_worker():
+    """Skip the poll wait when the worker runs in this process; otherwise it finds new rows on its next poll"""
+    if _enrollment_worker_thread is not None:
+        _enrollment_wakeup.put(None)
+
+init_enrollment_queue()
+
+# === BULK COHORT ENROLLMENT ===
+BULK_ENROLL_TOKEN = os.environ.get("BULK_ENROLL_TOKEN")  # Bearer token for /enroll/bulk; unset disables it
+BULK_ENROLL_MAX_ROWS = int(os.environ.get("BULK_ENROLL_MAX_ROWS", 20000))
+
+def validate_enrollment(name, phone, days, time_str):
+    """Apply the enrollment form rules, returning cleaned values or raising ValueError"""
+    name = (name or "").strip()
+    phone = (phone or "").strip()
+    days = str(days or "").strip()
+    time_str = (time_str or "").strip()
+    
+    if not all([name, phone, days, time_str]):
+        raise ValueError("All fields are required")
+    
+    if len(name) < 2:
+        raise ValueError("Please enter a valid name")
+    
+    if not phone.startswith('+'):
+        raise ValueError("Please enter a valid WhatsApp number with country code (e.g., +1 for US)")
+    
+    if not days.isdigit() or int(days) <= 0 or int(days) > 365:
+        raise ValueError("Please enter a valid number of days (1-365)")
+    
+    try:
+        datetime.strptime(time_str, "%I:%M %p")
+    except ValueError:
+        raise ValueError("Please select a valid time (e.g., 8:00 AM)")
+    
+    return name, phone, int(days), time_str
+
+def bulk_enroll(learners):
+    """Enroll many (name, phone, course, days, time_str) learners in one transaction
+
+    Enrollments are written as 'pending' so the dispatcher leaves them alone
+    until their welcome message has gone out; welcomes are queued for the
+    enrollment worker, which sends them in rate-limited batches.
+    """
+    now = datetime.now()
+    start_date = now.strftime("%Y-%m-%d")
+    created = time.time()
+    
+    with db_connection() as conn:
+        indexed = set(
+            (row["phone"], row["course"])
+            for row in conn.execute("SELECT DISTINCT phone, course FROM job_index")
+        )
+    for name, phone, course, days, time_str in learners:
+        if (phone, course) in indexed:
+            remove_existing_jobs(phone, course)
+    
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(ENROLLMENT_UPSERT_SQL, [
+            enrollment_values(phone, course, days, start_date, time_str, 1, str(uuid.uuid4())[:8], name, status='pending')
+            for name, phone, course, days, time_str in learners
+        ])
+        conn.executemany(
+            "INSERT INTO enrollment_queue (phone, course, days, time_str, user_name, kind, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 'welcome', 'pending', ?, ?)",
+            [(phone, course, days, time_str, name, created, created) for name, phone, course, days, time_str in learners]
+        )
+    progress_backend.reset_progress_many([(phone, course) for _, phone, course, _, _ in learners])
+    forget_lesson_deliveries([(phone, course) for _, phone, course, _, _ in learners])
+    progress_backend.store_user_names([(phone, name) for name, phone, _, _, _ in learners])
+    
+    logger.info(f"👥 Bulk enrolled {len(learners)} learners")
+    wake_enrollment_worker()
+    return len(learners)
+
+def parse_bulk_rows():
+    """Read learner rows from a JSON body, a CSV upload or a text/csv body"""
+    defaults = {
+        'course': request.values.get('course'),
+        'days': request.values.get('days'),
+        'time': request.values.get('time'),
+    }
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            defaults.update({key: payload[key] for key in defaults if payload.get(key)})
+            rows = payload.get('learners')
+        else:
+            rows = payload
+        if not isinstance(rows, list):
+            raise ValueError("Expected a JSON list of learners or an object with a 'learners' list")
+    else:
+        upload = request.files.get('file')
+        text = upload.read().decode('utf-8-sig') if upload else request.get_data(as_text=True)
+        rows = list(csv.DictReader(io.StringIO(text)))
+    return [
+        {key: (row.get(key) or defaults.get(key)) for key in ('name', 'phone', 'course', 'days', 'time')}
+        if isinstance(row, dict) else None
+        for row in rows
+    ]
+
+@app.route("/enroll/bulk", methods=["POST"])
+@csrf.exempt
+def bulk_enroll_endpoint():
+    """Enroll a whole cohort from JSON or CSV in one request"""
+    if not BULK_ENROLL_TOKEN:
+        return jsonify({'error': 'Bulk enrollment is disabled'}), 403
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {BULK_ENROLL_TOKEN}"):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        rows = parse_bulk_rows()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': str(e)}), 400
+    if not rows:
+        return jsonify({'error': 'No learners provided'}), 400
+    if len(rows) > BULK_ENROLL_MAX_ROWS:
+        return jsonify({'error': f'At most {BULK_ENROLL_MAX_ROWS} learners per request'}), 400
+    
+    learners = {}
+    errors = []
+    for index, row in enumerate(rows, start=1):
+        try:
+            if row is None:
+                raise ValueError("Each learner must be an object")
+            for key in ('name', 'phone', 'course', 'time'):
+                if row[key] is not None and not isinstance(row[key], str):
+                    raise ValueError(f"'{key}' must be a string")
+            if not row['course']:
+                raise ValueError("Course is required")
+            name, phone, days, time_str = validate_enrollment(row['name'], row['phone'], row['days'], row['time'])
+            # A later row for the same learner and course wins, as with re-enrolling
+            learners[(phone, row['course'].strip())] = (name, phone, row['course'].strip(), days, time_str)
+        except ValueError as e:
+            errors.append({'row': index, 'error': str(e)})
+    if errors:
+        return jsonify({'error': 'Validation failed', 'errors': errors}), 400
+    
+    try:
+        enrolled = bulk_enroll(list(learners.values()))
+    except Exception as e:
+        logger.error(f"❌ Bulk enrollment failed: {str(e)}")
+        return jsonify({'error': f'Bulk enrollment failed: {str(e)}'}), 500
+    
+    return jsonify({'enrolled': enrolled, 'welcome_messages_queued': enrolled}), 202
+
+# === INBOUND WHATSAPP COMMANDS ===
+# Twilio posts every reply a learner sends to /whatsapp/inbound. The webhook
+# only checks the signature, stores the command and answers with empty TwiML,
+# so Twilio gets its response in milliseconds. The worker process that owns
+# the global jobs applies commands in arrival order, finding the learner's
+# enrollments through the (phone, course) primary key and legacy jobs
+# through the job index. Twilio retries webhooks, so commands are keyed by
+# MessageSid and a retry is stored only once.
+INBOUND_WEBHOOK_URL = os.environ.get("INBOUND_WEBHOOK_URL")  # public URL Twilio signs, if PROXY_HOPS cannot recover it
+INBOUND_POLL_SECONDS = int(os.environ.get("INBOUND_POLL_SECONDS", 2))
+INBOUND_LEASE_SECONDS = int(os.environ.get("INBOUND_LEASE_SECONDS", 300))
+INBOUND_BATCH_SIZE = int(os.environ.get("INBOUND_BATCH_SIZE", 100))
+INBOUND_COMMANDS = {
+    "STOP": "STOP", "UNSUBSCRIBE": "STOP", "CANCEL": "STOP", "QUIT": "STOP",
+    "PAUSE": "PAUSE",
+    "RESUME": "RESUME", "START": "RESUME",
+    "NEXT": "NEXT",
+    "PROGRESS": "PROGRESS", "STATUS": "PROGRESS",
+}
+EMPTY_TWIML = '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
+HELP_MESSAGE = (
+    "🤖 LearnHub commands:\n"
+    "• NEXT - get your next lesson now\n"
+    "• PROGRESS - see how far you are\n"
+    "• PAUSE / RESUME - take a break from lessons\n"
+    "• STOP - unsubscribe"
+)
+
+INBOUND_MESSAGES = metrics.counter(
+    "learnhub_inbound_messages_total", "Inbound WhatsApp messages by command", ("command",))
+
+_inbound_wakeup = queue.Queue()
+_inbound_worker_lock = threading.Lock()
+_inbound_worker_thread = None
+_request_validator = None
+
+def init_inbound_commands():
+    """Create the inbound command queue if it does not exist yet"""
+    with db_connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS inbound_commands (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_sid TEXT NOT NULL UNIQUE,
+                phone TEXT NOT NULL,
+                command TEXT NOT NULL,
+                body TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_inbound_commands_status ON inbound_commands (status, id)")
+
+def twilio_request_valid():
+    """Check X-Twilio-Signature against the auth token"""
+    global _request_validator
+    if _request_validator is None:
+        from twilio.request_validator import RequestValidator
+        _request_validator = RequestValidator(TWILIO_AUTH_TOKEN)
+    url = INBOUND_WEBHOOK_URL or request.url
+    return _request_validator.validate(url, request.form, request.headers.get("X-Twilio-Signature", ""))
+
+def parse_inbound_command(body):
+    """Command for a message body: its first word if known, else HELP"""
+    words = (body or "").strip().split()
+    return INBOUND_COMMANDS.get(words[0].strip(".!").upper(), "HELP") if words else "HELP"
+
+@app.route("/whatsapp/inbound", methods=["POST"])
+@csrf.exempt
+def whatsapp_inbound():
+    """Twilio webhook for learner replies: store the command, answer right away"""
+    if not twilio_request_valid():
+        logger.warning("⚠️ Rejected inbound WhatsApp with a bad signature")
+        return "Invalid signature", 403
+    phone = request.form.get("From", "").replace("whatsapp:", "", 1)
+    message_sid = request.form.get("MessageSid")
+    if not phone or not message_sid:
+        return "Missing From or MessageSid", 400
+    command = parse_inbound_command(request.form.get("Body"))
+    now = time.time()
+    with db_connection() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO inbound_commands (message_sid, phone, command, body, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+            (message_sid, phone, command, request.form.get("Body", "")[:1600], now, now)
+        )
+    INBOUND_MESSAGES.inc(command=command)
+    wake_inbound_worker()
+    return Response(EMPTY_TWIML, content_type="text/xml")
+
+def learner_enrollments(phone, statuses):
+    """A learner's enrollments in the given statuses, soonest lesson first"""
+    # Select by phone alone so SQLite uses the (phone, course) key, not the status index
+    with db_connection() as conn:
+        rows = conn.execute("SELECT * FROM enrollments WHERE phone = ?", (phone,)).fetchall()
+    rows = [row for row in rows if row["status"] in statuses]
+    return sorted(rows, key=lambda row: row["next_send_at"] or "")
+
+def stop_learner(phone):
+    """Unsubscribe from every course: no more lessons, retries or legacy jobs"""
+    now = time.time()
+    rows = learner_enrollments(phone, ('active', 'paused', 'pending'))
+    with db_connection() as conn:
+        conn.executemany(
+            "UPDATE enrollments SET status = 'stopped', next_send_at = NULL, updated_at = ? WHERE phone = ? AND course = ?",
+            [(now, phone, row["course"]) for row in rows]
+        )
+        sending = conn.execute(
+            "SELECT course, day, status FROM lesson_deliveries WHERE phone = ?", (phone,)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE lesson_deliveries SET status = 'stopped', updated_at = ? WHERE phone = ? AND course = ? AND day = ?",
+            [(now, phone, row["course"], row["day"]) for row in sending if row["status"] == 'sending']
+        )
+        courses = [row["course"] for row in conn.execute("SELECT DISTINCT course FROM job_index WHERE phone = ?", (phone,))]
+    removed = sum(remove_existing_jobs(phone, course) for course in courses)
+    logger.info(f"🛑 {phone} unsubscribed: {len(rows)} enrollments stopped, {removed} legacy jobs removed")
+    return "✅ You have been unsubscribed and will not receive more lessons. Enroll again on the LearnHub website anytime."
+
+def pause_learner(phone):
+    rows = learner_enrollments(phone, ('active',))
+    if not rows:
+        return "You have no active course to pause."
+    with db_connection() as conn:
+        conn.executemany(
+            "UPDATE enrollments SET status = 'paused', updated_at = ? WHERE phone = ? AND course = ? AND status = 'active'",
+            [(time.time(), phone, row["course"]) for row in rows]
+        )
+    logger.info(f"⏸️ {phone} paused {len(rows)} courses")
+    return "⏸️ Lessons paused. Reply RESUME when you want to continue."
+
+def resume_learner(phone):
+    """Reactivate paused courses, moving the rest of each schedule so the next lesson is the next regular slot"""
+    rows = learner_enrollments(phone, ('paused',))
+    if not rows:
+        return "You have no paused course. Reply NEXT for your next lesson."
+    now = datetime.now()
+    with db_connection() as conn:
+        for row in rows:
+            start = datetime.strptime(row["start_date"], "%Y-%m-%d")
+            due = lesson_send_time(row["start_date"], row["preferred_time"], row["next_day"])
+            shift = (now - due).days + 1 if due < now else 0
+            start_date = (start + timedelta(days=shift)).strftime("%Y-%m-%d")
+            conn.execute(
+                "UPDATE enrollments SET status = 'active', start_date = ?, next_send_at = ?, updated_at = ? "
+                "WHERE phone = ? AND course = ? AND status = 'paused'",
+                (start_date, lesson_send_time(start_date, row["preferred_time"], row["next_day"]).strftime(DB_TIME_FORMAT),
+                 time.time(), phone, row["course"])
+            )
+    logger.info(f"▶️ {phone} resumed {len(rows)} courses")
+    return f"▶️ Welcome back! Day {rows[0]['next_day']} of {rows[0]['course']} arrives at your usual time. Reply NEXT to get it now."
+
+def send_next_lesson(phone):
+    """Make the learner's soonest lesson due now; the dispatcher sends it on its next tick"""
+    rows = learner_enrollments(phone, ('active',))
+    if not rows:
+        return "You have no active course. Reply RESUME if you paused one."
+    with db_connection() as conn:
+        conn.execute(
+            "UPDATE enrollments SET next_send_at = ?, updated_at = ? WHERE phone = ? AND course = ? AND status = 'active'",
+            (datetime.now().strftime(DB_TIME_FORMAT), time.time(), phone, rows[0]["course"])
+        )
+    return None  # the lesson itself is the reply
+
+def describe_progress(phone):
+    rows = learner_enrollments(phone, ('active', 'paused', 'completed'))
+    if not rows:
+        return "You are not enrolled in any course yet."
+    lines = ["📊 Your progress:"]
+    for row in rows:
+        line = f"• {row['course']}: {get_progress(phone, row['course'])}/{row['total_days']} days"
+        if row["status"] == 'paused':
+            line += " (paused)"
+        elif row["status"] == 'completed':
+            line += " 🎉"
+        elif row["next_send_at"]:
+            line += f", Day {row['next_day']} at {row['next_send_at'][:16]}"
+        lines.append(line)
+    return "\n".join(lines)
+
+INBOUND_HANDLERS = {
+    "STOP": stop_learner,
+    "PAUSE": pause_learner,
+    "RESUME": resume_learner,
+    "NEXT": send_next_lesson,
+    "PROGRESS": describe_progress,
+    "HELP": lambda phone: HELP_MESSAGE,
+}
+
+def claim_inbound_commands(limit=INBOUND_BATCH_SIZE):
+    """Take pending (or abandoned) commands in arrival order"""
+    now = time.time()
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT * FROM inbound_commands WHERE status = 'pending' "
+            "OR (status = 'processing' AND updated_at < ?) ORDER BY id LIMIT ?",
+            (now - INBOUND_LEASE_SECONDS, limit)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE inbound_commands SET status = 'processing', updated_at = ? WHERE id = ?",
+            [(now, row["id"]) for row in rows]
+        )
+    return rows
+
+def process_inbound_command(row):
+    try:
+        reply = INBOUND_HANDLERS[row["command"]](row["phone"])
+        if reply:
+            queue_whatsapp(row["phone"], reply)
+        status, error = 'done', None
+    except Exception as e:
+        logger.error(f"❌ Error processing {row['command']} from {row['phone']}: {str(e)}")
+        status, error = 'failed', str(e)
+    with db_connection() as conn:
+        conn.execute(
+            "UPDATE inbound_commands SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            (status, error, time.time(), row["id"])
+        )
+    return status == 'done'
+
+def inbound_worker():
+    """Background loop applying queued inbound commands"""
+    while True:
+        try:
+            try:
+                _inbound_wakeup.get(timeout=INBOUND_POLL_SECONDS)
+            except queue.Empty:
+                pass
+            while True:
+                rows = claim_inbound_commands()
+                for row in rows:
+                    process_inbound_command(row)
+                if len(rows) < INBOUND_BATCH_SIZE:
+                    break
+        except Exception as e:
+            logger.error(f"❌ Inbound worker error: {str(e)}")
+            time.sleep(INBOUND_POLL_SECONDS)
+
+def ensure_inbound_worker():
+    """Start the inbound command worker thread once per process"""
+    global _inbound_worker_thread
+    with _inbound_worker_lock:
+        if _inbound_worker_thread is None or not _inbound_worker_thread.is_alive():
+            _inbound_worker_thread = threading.Thread(target=inbound_worker, name="inbound-worker", daemon=True)
+            _inbound_worker_thread.start()
+            logger.info("✅ Inbound command worker started")
+
+def wake_inbound_worker():
+    """Skip the poll wait when the worker runs in this process; otherwise it finds new rows on its next poll"""
+    if _inbound_worker_thread is not None:
+        _inbound_wakeup.put(None)
+
+init_inbound_commands()
+
+# === AHEAD-OF-TIME LESSON PRE-GENERATION ===
+# Warms the lesson cache for lessons that are about to be sent, so the dispatcher
+# only has to format and deliver instead of waiting on the LLM.
+PREGENERATE_HOURS_AHEAD = float(os.environ.get("PREGENERATE_HOURS_AHEAD", 3))
+PREGENERATE_INTERVAL_MINUTES = int(os.environ.get("PREGENERATE_INTERVAL_MINUTES", 15))
+PREGENERATE_CONCURRENCY = int(os.environ.get("PREGENERATE_CONCURRENCY", 4))
+PREGENERATE_BATCH_SIZE = int(os.environ.get("PREGENERATE_BATCH_SIZE", 20))
+
+def parse_lesson_job(job):
+    """Return (phone, course, day, total_days) for a lesson job, or None for other jobs"""
+    match = LESSON_JOB_ID_RE.match(job.id or "")
+    if not match:
+        return None
+    if job.func_ref.endswith(":send_course_lesson") and len(job.args) == 4:
+        return tuple(job.args)
+    return None
+
+def find_upcoming_lessons(hours_ahead=PREGENERATE_HOURS_AHEAD):
+    """Collect distinct (course, day, total_days) lessons scheduled within the look-ahead window"""
+    lessons = {}
+    horizon = (datetime.now() + timedelta(hours=hours_ahead)).strftime(DB_TIME_FORMAT)
+    with db_connection() as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT course, next_day, total_days FROM enrollments "
+            "WHERE status = 'active' AND next_send_at <= ?",
+            (horizon,)
+        ).fetchall()
+    for row in rows:
+        lessons.setdefault(lesson_cache_key(row["course"], row["next_day"], row["total_days"]),
+                           (row["course"], row["next_day"], row["total_days"]))
+    # Lessons still scheduled as legacy per-day jobs
+    for job in get_scheduler().get_jobs():
+        if job.next_run_time is None:
+            continue
+        lesson = parse_lesson_job(job)
+        if lesson is None:
+            continue
+        now = datetime.now(job.next_run_time.tzinfo)
+        if job.next_run_time > now + timedelta(hours=hours_ahead):
+            continue
+        _, course, day, total_days = lesson
+        lessons.setdefault(lesson_cache_key(course, day, total_days), (course, day, total_days))
+    return list(lessons.values())
+
+def with_following_days(lessons, batch_days=LESSON_BATCH_DAYS):
+    """Add the next batch_days - 1 days of each lesson's course, which learners reach next"""
+    extended = {}
+    for course, day, total_days in lessons:
+        for ahead in range(day, min(day + max(1, batch_days), total_days + 1)):
+            extended.setdefault(lesson_cache_key(course, ahead, total_days), (course, ahead, total_days))
+    return list(extended.values())
+
+def pregenerate_upcoming_lessons():
+    """Generate and cache content for lessons due in the next few hours
+
+    Each due lesson pulls in the days after it so they can share a batched
+    request; those are cached for when learners get there.
+    """
+    try:
+        upcoming = find_upcoming_lessons()
+        missing = [lesson for lesson in with_following_days(upcoming) if get_cached_lesson(*lesson) is None]
+        if not missing:
+            logger.info(f"🔥 Pre-generation: {len(upcoming)} upcoming lessons already cached")
+            return 0
+
+        batches = plan_lesson_batches(missing)
+        logger.info(f"🔥 Pre-generating {len(missing)} lessons in {len(batches)} requests "
+                    f"for {len(upcoming)} upcoming lessons")
+        generated = 0
+        with ThreadPoolExecutor(max_workers=PREGENERATE_CONCURRENCY) as executor:
+            for start in range(0, len(batches), PREGENERATE_BATCH_SIZE):
+                chunk = batches[start:start + PREGENERATE_BATCH_SIZE]
+                generated += sum(executor.map(lambda batch: generate_lesson_batch(*batch), chunk))
+                logger.info(f"🔥 Pre-generated {generated} of {len(missing)} lessons")
+        return generated
+    except Exception as e:
+        logger.error(f"❌ Error pre-generating lessons: {str(e)}")
+        return 0
+
+def start_background_jobs():
+    """Register the recurring maintenance jobs on the running scheduler"""
+    scheduler = get_scheduler()
+    scheduler.add_job(
+        dispatch_due_lessons,
+        'cron',
+        second=0,
+        id='lesson_dispatcher',
+        coalesce=True,
+        max_instances=1,
+        replace_existing=True
+    )
+    logger.info("✅ Lesson dispatcher runs every minute")
+    scheduler.add_job(
+        retry_lesson_outbox,
+        'interval',
+        seconds=OUTBOX_RETRY_INTERVAL_SECONDS,
+        id='lesson_outbox_retry',
+        next_run_time=datetime.now(),
+        coalesce=True,
+        max_instances=1,
+        replace_existing=True
+    )
+    logger.info(f"✅ Lesson outbox retries every {OUTBOX_RETRY_INTERVAL_SECONDS}s")
+    if not owns_global_jobs():
+        return
+    scheduler.add_job(
+        pregenerate_upcoming_lessons,
+        'interval',
+        minutes=PREGENERATE_INTERVAL_MINUTES,
+        id='lesson_pregeneration',
+        next_run_time=datetime.now(),
+        replace_existing=True
+    )
+    logger.info(f"✅ Lesson pre-generation every {PREGENERATE_INTERVAL_MINUTES} min, {PREGENERATE_HOURS_AHEAD}h ahead")
+
+# Health check endpoint
+@app.route("/health")
+def health_check():
+    return jsonify({
+        "status": "healthy",
+        "scheduler_running": scheduler_running(),
+        "jobs_count": job_counter.value(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+def count_due_enrollments():
+    with db_connection() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM enrollments WHERE status = 'active' AND next_send_at <= ?",
+            (datetime.now().strftime(DB_TIME_FORMAT),)
+        ).fetchone()[0]
+
+def count_queued_enrollments():
+    with db_connection() as conn:
+        rows = conn.execute("SELECT status, COUNT(*) FROM enrollment_queue WHERE status IN ('pending', 'processing', 'retry') GROUP BY status").fetchall()
+    return {(row[0],): row[1] for row in rows}
+
+CIRCUIT_STATE_VALUES = {'closed': 0, 'half-open': 1, 'open': 2}
+
+metrics.gauge("learnhub_outbound_queue_depth", "WhatsApp messages waiting in the outbound dispatcher",
+              callback=lambda: outbound_dispatcher.queue_depth())
+metrics.gauge("learnhub_due_enrollments", "Active enrollments whose next lesson is due now",
+              callback=count_due_enrollments)
+metrics.gauge("learnhub_enrollment_queue_depth", "Sign-ups waiting for their welcome message", ("status",),
+              callback=count_queued_enrollments)
+metrics.gauge("learnhub_circuit_state", "Upstream circuit breaker state (0 closed, 1 half-open, 2 open)", ("upstream",),
+              callback=lambda: {(breaker.name.lower(),): CIRCUIT_STATE_VALUES[breaker.state] for breaker in (together_breaker, twilio_breaker)})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition of this process's metrics"""
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ... (KEEP THE SAME HTML TEMPLATE AS BEFORE - it already has the name field)
+
+FULL_TEMPLATE = '''
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>LearnHub - Personalized Learning Scheduler</title>
+    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
+    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css">
+    <script src="https://cdn.tailwindcss.com"></script>
+    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+    <script>
+        tailwind.config = {
+            theme: {
+                extend: {
+                    colors: {
+                        primary: {
+                            50: '#f0f9ff',
+                            100: '#e0f2fe',
+                            200: '#bae6fd',
+                            300: '#7dd3fc',
+                            400: '#38bdf8',
+                            500: '#0ea5e9',
+                            600: '#0284c7',
+                            700: '#0369a1',
+                            800: '#075985',
+                            900: '#0c4a6e',
+                        },
+                        secondary: {
+                            50: '#f5f3ff',
+                            100: '#ede9fe',
+                            200: '#ddd6fe',
+                            300: '#c4b5fd',
+                            400: '#a78bfa',
+                            500: '#8b5cf6',
+                            600: '#7c3aed',
+                            700: '#6d28d9',
+                            800: '#5b21b6',
+                            900: '#4c1d95',
+                        }
+                    },
+                    fontFamily: {
+                        sans: ['Inter', 'sans-serif'],
+                    },
+                    animation: {
+                        'float': 'float 6s ease-in-out infinite',
+                        'pulse-slow': 'pulse 4s cubic-bezier(0.4, 0, 0.6, 1) infinite',
+                    }
+                }
+            }
+        }
+    </script>
+    <style>
+        @keyframes float {
+            0% { transform: translateY(0px); }
+            50% { transform: translateY(-10px); }
+            100% { transform: translateY(0px); }
+        }
+        
+        .progress-ring__circle {
+            transition: stroke-dashoffset 0.5s;
+            transform: rotate(-90deg);
+            transform-origin: 50% 50%;
+        }
+        
+        .gradient-text {
+            background-clip: text;
+            -webkit-background-clip: text;
+            color: transparent;
+        }
+        
+        .card-hover-effect {
+            transition: all 0.3s ease;
+        }
+        
+        .card-hover-effect:hover {
+            transform: translateY(-5px);
+            box-shadow: 0 20px 25px -5px rgba(0, 0, 0, 0.1), 0 10px 10px -5px rgba(0, 0, 0, 0.04);
+        }
+        
+        .course-icon {
+            transition: all 0.3s ease;
+        }
+        
+        .course-card:hover .course-icon {
+            transform: scale(1.1);
+        }
+        
+        .glow-effect {
+            box-shadow: 0 0 15px rgba(59, 130, 246, 0.3);
+        }
+        
+        .input-focus:focus {
+            box-shadow: 0 0 0 3px rgba(59, 130, 246, 0.3);
+            border-color: #3b82f6;
+        }
+        
+        .test-mode-banner {
+            background: linear-gradient(90deg, #ff6b6b, #ff8e53);
+            color: white;
+            padding: 8px 16px;
+            border-radius: 8px;
+            margin-bottom: 16px;
+            text-align: center;
+            font-weight: bold;
+        }
+        
+        .time-info-banner {
+            background: linear-gradient(90deg, #60a5fa, #3b82f6);
+            color: white;
+            padding: 8px 16px;
+            border-radius: 8px;
+            margin-bottom: 16px;
+            text-align: center;
+            font-weight: bold;
+        }
+    </style>
+</head>
+<body class="bg-gradient-to-br from-primary-50 to-primary-100 min-h-screen">
+    <div class="container mx-auto px-4 py-12 max-w-6xl">
+        {% if test_mode %}
+        <div class="test-mode-banner">
+            🚀 TEST MODE: 1 Day = 1 Minute - Lessons will arrive every minute instead of daily
+        </div>
+        {% endif %}
+        
+        {% if time_str %}
+        <div class="time-info-banner">
+            ⏰ Smart Time Detection: Lessons will be delivered at {{ time_str }} based on your selection
+        </div>
+        {% endif %}
+        
+        <!-- Header Section -->
+        <header class="text-center mb-16">
+            <div class="flex justify-center mb-6">
+                <div class="w-20 h-20 rounded-xl bg-white shadow-md flex items-center justify-center">
+                    <svg xmlns="http://www.w3.org/2000/svg" class="h-10 w-10 text-primary-600" fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                        <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9.663 17h4.673M12 3v1m6.364 1.636l-.707.707M21 12h-1M4 12H3m3.343-5.657l-.707-.707m2.828 9.9a5 5 0 117.072 0l-.548.547A3.374 3.374 0 0014 18.469V19a2 2 0 11-4 0v-.531c0-.895-.356-1.754-.988-2.386l-.548-.547z" />
+                    </svg>
+                </div>
+            </div>
+            <h1 class="text-4xl md:text-5xl font-bold text-gray-900 mb-4">
+                <span class="gradient-text bg-gradient-to-r from-primary-600 to-secondary-600">LearnHub</span>
+            </h1>
+            <p class="text-lg md:text-xl text-gray-600 max-w-2xl mx-auto">
+                Your personalized learning journey, tailored to your schedule and goals
+            </p>
+        </header>
+        
+        {% if template == 'course_selection' %}
+        <!-- Course Selection Section -->
+        <section class="mb-20">
+            <div class="grid grid-cols-1 md:grid-cols-3 gap-8 mb-16">
+                <!-- Programming Languages -->
+                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
+                    <div class="p-6">
+                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
+                            <span>🐍</span>
+                        </div>
+                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Python Programming</h3>
+                        <p class="text-gray-600 text-center mb-6">Master Python from basics to advanced concepts with real-world applications</p>
+                        <form method="GET" action="/schedule">
+                            <input type="hidden" name="course" value="Python Programming">
+                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
+                                Select Course
+                            </button>
+                        </form>
+                    </div>
+                </div>
+
+                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
+                    <div class="p-6">
+                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
+                            <span>☕</span>
+                        </div>
+                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Java Development</h3>
+                        <p class="text-gray-600 text-center mb-6">Learn Java programming, OOP concepts, and build robust applications</p>
+                        <form method="GET" action="/schedule">
+                            <input type="hidden" name="course" value="Java Development">
+                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
+                                Select Course
+                            </button>
+                        </form>
+                    </div>
+                </div>
+
+                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
+                    <div class="p-6">
+                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
+                            <span>🟨</span>
+                        </div>
+                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">JavaScript Mastery</h3>
+                        <p class="text-gray-600 text-center mb-6">From fundamentals to advanced JS concepts including ES6+ features</p>
+                        <form method="GET" action="/schedule">
+                            <input type="hidden" name="course" value="JavaScript Mastery">
+                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
+                                Select Course
+                            </button>
+                        </form>
+                    </div>
+                </div>
+
+                <!-- Web Development -->
+                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
+                    <div class="p-6">
+                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
+                            <span>🌐</span>
+                        </div>
+                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Full-Stack Web Development</h3>
+                        <p class="text-gray-600 text-center mb-6">Build complete web applications with frontend and backend technologies</p>
+                        <form method="GET" action="/schedule">
+                            <input type="hidden" name="course" value="Full-Stack Web Development">
+                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
+                                Select Course
+                            </button>
+                        </form>
+                    </div>
+                </div>
+
+                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
+                    <div class="p-6">
+                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
+                            <span>⚛️</span>
+                        </div>
+                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">React Framework</h3>
+                        <p class="text-gray-600 text-center mb-6">Master React.js for building modern, interactive user interfaces</p>
+                        <form method="GET" action="/schedule">
+                            <input type="hidden" name="course" value="React Framework">
+                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
+                                Select Course
+                            </button>
+                        </form>
+                    </div>
+                </div>
+
+                <!-- Data Science -->
+                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
+                    <div class="p-6">
+                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
+                            <span>📊</span>
+                        </div>
+                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Data Science Fundamentals</h3>
+                        <p class="text-gray-600 text-center mb-6">Learn data analysis, visualization, and machine learning basics</p>
+                        <form method="GET" action="/schedule">
+                            <input type="hidden" name="course" value="Data Science Fundamentals">
+                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
+                                Select Course
+                            </button>
+                        </form>
+                    </div>
+                </div>
+
+                <!-- Mobile Development -->
+                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
+                    <div class="p-6">
+                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
+                            <span>📱</span>
+                        </div>
+                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Mobile App Development</h3>
+                        <p class="text-gray-600 text-center mb-6">Build cross-platform mobile apps with React Native or Flutter</p>
+                        <form method="GET" action="/schedule">
+                            <input type="hidden" name="course" value="Mobile App Development">
+                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
+                                Select Course
+                            </button>
+                        </form>
+                    </div>
+                </div>
+
+                <!-- Cloud & DevOps -->
+                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
+                    <div class="p-6">
+                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
+                            <span>☁️</span>
+                        </div>
+                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Cloud Computing & DevOps</h3>
+                        <p class="text-gray-600 text-center mb-6">Learn AWS, Docker, Kubernetes and CI/CD pipelines</p>
+                        <form method="GET" action="/schedule">
+                            <input type="hidden" name="course" value="Cloud Computing & DevOps">
+                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
+                                Select Course
+                            </button>
+                        </form>
+                    </div>
+                </div>
+
+                <!-- Cybersecurity -->
+                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
+                    <div class="p-6">
+                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
+                            <span>🔒</span>
+                        </div>
+                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Cybersecurity Essentials</h3>
+                        <p class="text-gray-600 text-center mb-6">Learn to protect systems and networks from digital attacks</p>
+                        <form method="GET" action="/schedule">
+                            <input type="hidden" name="course" value="Cybersecurity Essentials">
+                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
+                                Select Course
+                            </button>
+                        </form>
+                    </div>
+                </div>
+
+                <!-- Design -->
+                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
+                    <div class="p-6">
+                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
+                            <span>🎨</span>
+                        </div>
+                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">UI/UX Design</h3>
+                        <p class="text-gray-600 text-center mb-6">Master design principles, tools like Figma, and user experience concepts</p>
+                        <form method="GET" action="/schedule">
+                            <input type="hidden" name="course" value="UI/UX Design">
+                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
+                                Select Course
+                            </button>
+                        </form>
+                    </div>
+                </div>
+
+                <!-- AI/ML -->
+                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
+                    <div class="p-6">
+                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
+                            <span>🤖</span>
+                        </div>
+                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">AI & Machine Learning</h3>
+                        <p class="text-gray-600 text-center mb-6">Introduction to AI concepts and practical machine learning applications</p>
+                        <form method="GET" action="/schedule">
+                            <input type="hidden" name="course" value="AI & Machine Learning">
+                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
+                                Select Course
+                            </button>
+                        </form>
+                    </div>
+                </div>
+
+                <!-- Blockchain -->
+                <div class="course-card bg-white rounded-xl shadow-md overflow-hidden card-hover-effect">
+                    <div class="p-6">
+                        <div class="course-icon w-16 h-16 rounded-lg bg-gradient-to-r from-primary-500 to-primary-600 flex items-center justify-center mx-auto mb-5 text-white text-2xl">
+                            <span>⛓️</span>
+                        </div>
+                        <h3 class="text-xl font-semibold text-center text-gray-800 mb-3">Blockchain Development</h3>
+                        <p class="text-gray-600 text-center mb-6">Learn smart contracts, DApps, and blockchain fundamentals</p>
+                        <form method="GET" action="/schedule">
+                            <input type="hidden" name="course" value="Blockchain Development">
+                            <button type="submit" class="w-full py-3 px-6 bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 text-white font-medium rounded-lg transition duration-300 transform hover:-translate-y-1">
+                                Select Course
+                            </button>
+                        </form>
+                    </div>
+                </div>
+            </div>
+            
+            <!-- How It Works Section -->
+            <div class="bg-white rounded-xl shadow-md overflow-hidden">
+                <div class="p-8 md:p-10">
+                    <h2 class="text-2xl md:text-3xl font-bold text-center text-gray-900 mb-10">How LearnHub Works</h2>
+                    <div class="grid grid-cols-1 md:grid-cols-3 gap-8">
+                        <div class="text-center">
+                            <div class="w-20 h-20 bg-primary-100 rounded-full flex items-center justify-center mx-auto mb-5 relative">
+                                <span class="text-primary-600 text-2xl font-bold">1</span>
+                                <div class="absolute -bottom-5 left-1/2 transform -translate-x-1/2 w-0 h-0 border-l-8 border-r-8 border-t-8 border-l-transparent border-r-transparent border-t-primary-100"></div>
+                            </div>
+                            <h3 class="text-lg font-semibold text-gray-800 mb-3">Choose Your Course</h3>
+                            <p class="text-gray-600">Select from our expert-curated learning paths designed for all skill levels</p>
+                        </div>
+                        
+                        <div class="text-center">
+                            <div class="w-20 h-20 bg-primary-100 rounded-full flex items-center justify-center mx-auto mb-5 relative">
+                                <span class="text-primary-600 text-2xl font-bold">2</span>
+                                <div class="absolute -bottom-5 left-1/2 transform -translate-x-1/2 w-0 h-0 border-l-8 border-r-8 border-t-8 border-l-transparent border-r-transparent border-t-primary-100"></div>
+                            </div>
+                            <h3 class="text-lg font-semibold text-gray-800 mb-3">Personalize Your Plan</h3>
+                            <p class="text-gray-600">Set your preferred schedule and learning pace that fits your lifestyle</p>
+                        </div>
+                        
+                        <div class="text-center">
+                            <div class="w-20 h-20 bg-primary-100 rounded-full flex items-center justify-center mx-auto mb-5 relative">
+                                <span class="text-primary-600 text-2xl font-bold">3</span>
+                                <div class="absolute -bottom-5 left-1/2 transform -translate-x-1/2 w-0 h-0 border-l-8 border-r-8 border-t-8 border-l-transparent border-r-transparent border-t-primary-100"></div>
+                            </div>
+                            <h3 class="text-lg font-semibold text-gray-800 mb-3">Start Learning</h3>
+                            <p class="text-gray-600">Receive daily bite-sized lessons via WhatsApp and track your progress</p>
+                        </div>
+                    </div>
+                </div>
+            </div>
+        </section>
+        
+        {% elif template == 'user_form' %}
+        <!-- Schedule Form Section -->
+        <section class="max-w-2xl mx-auto">
+            <div class="bg-white rounded-xl shadow-xl overflow-hidden glow-effect">
+                <div class="p-8">
+                    <div class="flex justify-between items-center mb-8">
+                        <div>
+                            <h2 class="text-2xl font-bold text-gray-900">Schedule Your Learning</h2>
+                            <p class="text-gray-600">Complete your enrollment for {{ course }}</p>
+                        </div>
+                        <div class="flex items-center">
+                            <span class="bg-primary-100 text-primary-800 text-sm font-semibold px-3 py-1 rounded-full">Step 2 of 2</span>
+                        </div>
+                    </div>
+                    
+                    {% if error %}
+                    <div class="bg-red-50 border-l-4 border-red-500 p-4 mb-6 rounded-r">
+                        <div class="flex">
+                            <div class="flex-shrink-0">
+                                <svg class="h-5 w-5 text-red-500" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
+                                    <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zM8.707 7.293a1 1 0 00-1.414 1.414L8.586 10l-1.293 1.293a1 1 0 101.414 1.414L10 11.414l1.293 1.293a1 1 0 001.414-1.414L11.414 10l1.293-1.293a1 1 0 00-1.414-1.414L10 8.586 8.707 7.293z" clip-rule="evenodd" />
+                                </svg>
+                            </div>
+                            <div class="ml-3">
+                                <p class="text-sm text-red-700">{{ error }}</p>
+                            </div>
+                        </div>
+                    </div>
+                    {% endif %}
+                    
+                    <form method="POST" class="space-y-6" onsubmit="return validateForm()">
+                        <input type="hidden" name="csrf_token" value="{{ csrf_token }}">
+                        <input type="hidden" name="course" value="{{ course }}">
+                        
+                        <!-- FIXED: ADDED NAME FIELD -->
+                        <div>
+                            <label for="name" class="block text-sm font-medium text-gray-700 mb-1">Full Name</label>
+                            <div class="relative">
+                                <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none">
+                                    <i class="fas fa-user text-gray-400"></i>
+                                </div>
+                                <input type="text" name="name" id="name" class="block w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg input-focus focus:outline-none focus:ring-primary-500 focus:border-primary-500" placeholder="Enter your full name" required>
+                            </div>
+                            <p class="mt-1 text-sm text-gray-500">This name will be printed on your completion certificate</p>
+                        </div>
+                        
+                        <div>
+                            <label for="phone" class="block text-sm font-medium text-gray-700 mb-1">WhatsApp Number</label>
+                            <div class="relative">
+                                <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none">
+                                    <i class="fab fa-whatsapp text-gray-400"></i>
+                                </div>
+                                <input type="tel" name="phone" id="phone" class="block w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg input-focus focus:outline-none focus:ring-primary-500 focus:border-primary-500" placeholder="+1234567890" required>
+                            </div>
+                            <p class="mt-1 text-sm text-gray-500">Enter your WhatsApp number with country code (e.g., +1 for US)</p>
+                            <p class="mt-1 text-sm text-primary-600 font-medium">📱 First, join our WhatsApp sandbox by sending "join {{ sandbox_code }}" to {{ twilio_whatsapp_number }}</p>
+                        </div>
+                        
+                        <div>
+                            <label for="days" class="block text-sm font-medium text-gray-700 mb-1">Learning Duration (Days)</label>
+                            <div class="relative">
+                                <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none">
+                                    <svg class="h-5 w-5 text-gray-400" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
+                                        <path fill-rule="evenodd" d="M6 2a1 1 0 00-1 1v1H4a2 2 0 00-2 2v10a2 2 0 002 2h12a2 2 0 002-2V6a2 2 0 00-2-2h-1V3a1 1 0 10-2 0v1H7V3a1 1 0 00-1-1zm0 5a1 1 0 000 2h8a1 1 0 100-2H6z" clip-rule="evenodd" />
+                                    </svg>
+                                </div>
+                                <input type="number" name="days" id="days" min="1" max="365" class="block w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg input-focus focus:outline-none focus:ring-primary-500 focus:border-primary-500" placeholder="30" required>
+                            </div>
+                            <p class="mt-1 text-sm text-gray-500">How many days would you like to complete the course in?</p>
+                            {% if test_mode %}
+                            <p class="mt-1 text-sm text-orange-600 font-medium">⏰ TEST MODE: Each day = 1 minute for quick testing</p>
+                            {% endif %}
+                        </div>
+                        
+                        <div>
+                            <label for="time" class="block text-sm font-medium text-gray-700 mb-1">Preferred Learning Time</label>
+                            <div class="relative">
+                                <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none">
+                                    <svg class="h-5 w-5 text-gray-400" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
+                                        <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zm1-12a1 1 0 10-2 0v4a1 1 0 00.293.707l2.828 2.829a1 1 0 101.415-1.415L11 9.586V6z" clip-rule="evenodd" />
+                                    </svg>
+                                </div>
+                                <select name="time" id="time" class="block w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg input-focus focus:outline-none focus:ring-primary-500 focus:border-primary-500" required>
+                                    <option value="">Select a time</option>
+                                    {% for hour in range(1, 13) %}
+                                        <option value="{{ hour }}:00 AM">{{ hour }}:00 AM</option>
+                                        <option value="{{ hour }}:30 AM">{{ hour }}:30 AM</option>
+                                    {% endfor %}
+                                    {% for hour in range(1, 13) %}
+                                        <option value="{{ hour }}:00 PM">{{ hour }}:00 PM</option>
+                                        <option value="{{ hour }}:30 PM">{{ hour }}:30 PM</option>
+                                    {% endfor %}
+                                </select>
+                            </div>
+                            <p class="mt-1 text-sm text-gray-500">When would you like to receive your daily lessons?</p>
+                            <p class="mt-1 text-sm text-blue-600 font-medium">⏰ Smart Scheduling: If time is past today, first lesson comes immediately. Future times start at selected time.</p>
+                        </div>
+                        
+                        <div class="pt-2">
+                            <button type="submit" class="w-full flex justify-center py-4 px-6 border border-transparent rounded-lg shadow-sm text-lg font-medium text-white bg-gradient-to-r from-primary-500 to-primary-600 hover:from-primary-600 hover:to-primary-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-primary-500 transition duration-300 transform hover:-translate-y-1">
+                                Schedule My Learning
+                                <svg class="ml-2 -mr-1 w-5 h-5" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
+                                    <path fill-rule="evenodd" d="M10.293 5.293a1 1 0 011.414 0l4 4a1 1 0 010 1.414l-4 4a1 1 0 01-1.414-1.414L12.586 11H5a1 1 0 110-2h7.586l-2.293-2.293a1 1 0 010-1.414z" clip-rule="evenodd" />
+                                </svg>
+                            </button>
+                        </div>
+                    </form>
+                </div>
+            </div>
+        </section>
+        
+        <script>
+            function validateForm() {
+                const name = document.getElementById('name').value;
+                const phone = document.getElementById('phone').value;
+                const days = document.getElementById('days').value;
+                const time = document.getElementById('time').value;
+                
+                // Basic validation
+                if (!name || !phone || !days || !time) {
+                    alert('Please fill in all required fields');
+                    return false;
+                }
+                
+                // Name validation
+                if (name.trim().length < 2) {
+                    alert('Please enter your full name');
+                    return false;
+                }
+                
+                // Phone validation - basic check for country code
+                const phoneRegex = /^\+[1-9]\d{1,14}$/;
+                if (!phoneRegex.test(phone)) {
+                    alert('Please enter a valid WhatsApp number with country code (e.g., +1234567890)');
+                    return false;
+                }
+                
+                // Days validation
+                if (isNaN(days) || days <= 0 || days > 365) {
+                    alert('Please enter a valid number of days (1-365)');
+                    return false;
+                }
+                
+                return true;
+            }
+        </script>
+        
+        {% elif template == 'confirm' %}
+        <!-- Confirmation Section -->
+        <section class="max-w-2xl mx-auto">
+            <div class="bg-white rounded-xl shadow-xl overflow-hidden text-center">
+                <div class="p-10">
+                    <div class="w-24 h-24 bg-green-100 rounded-full flex items-center justify-center mx-auto mb-6">
+                        <svg class="w-12 h-12 text-green-600" fill="none" stroke="currentColor" viewBox="0 0 24 24" xmlns="http://www.w3.org/2000/svg">
+                            <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M5 13l4 4L19 7"></path>
+                        </svg>
+                    </div>
+                    
+                    <h2 class="text-2xl md:text-3xl font-bold text-gray-900 mb-3">Course Scheduled Successfully!</h2>
+                    <p class="text-lg text-gray-600 mb-8">
+                        Your <span class="font-semibold text-primary-600">{{ course }}</span> course will begin as scheduled.
+                    </p>
+                    
+                    {% if enrollment_status %}
+                    <!-- Enrollment delivery status -->
+                    {% if enrollment_status == 'sent' %}
+                    <div class="bg-green-50 border-l-4 border-green-500 p-4 mb-8 rounded-r text-left">
+                        <p class="text-sm text-green-700">✅ Welcome message sent - check your WhatsApp</p>
+                    </div>
+                    {% elif enrollment_status == 'failed' %}
+                    <div class="bg-red-50 border-l-4 border-red-500 p-4 mb-8 rounded-r text-left">
+                        <p class="text-sm text-red-700">❌ We couldn't reach your WhatsApp number. Make sure you joined the sandbox and try again.</p>
+                    </div>
+                    {% else %}
+                    <div class="bg-yellow-50 border-l-4 border-yellow-500 p-4 mb-8 rounded-r text-left">
+                        <p class="text-sm text-yellow-700">⏳ Pending - your welcome message is on its way. Refresh this page to update.</p>
+                    </div>
+                    {% endif %}
+                    {% endif %}
+                    
+                    <!-- Progress Tracker - Moved to top -->
+                    <div class="bg-white border border-gray-200 rounded-xl p-6 mb-10">
+                        <h3 class="font-semibold text-lg text-gray-900 mb-6 flex items-center justify-center">
+                            <svg class="w-5 h-5 mr-2 text-primary-600" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 19v-6a2 2 0 00-2-2H5a2 2 0 00-2 2v6a2 2 0 002 2h2a2 2 0 002-2zm0 0V9a2 2 0 012-2h2a2 2 0 012 2v10m-6 0a2 2 0 002 2h2a2 2 0 002-2m0 0V5a2 2 0 012-2h2a2 2 0 012 2v14a2 2 0 01-2 2h-2a2 2 0 01-2-2z" />
+                            </svg>
+                            Your Learning Progress
+                        </h3>
+                        
+                        <div class="space-y-4">
+                            {% for day in range(1, total_days+1) %}
+                            <div class="flex items-center gap-4">
+                                <div class="flex-shrink-0 w-10 h-10 rounded-full flex items-center justify-center
+                                    {% if day <= completed_days %}
+                                        bg-green-100 text-green-800
+                                    {% elif day == completed_days + 1 %}
+                                        bg-yellow-100 text-yellow-800
+                                    {% else %}
+                                        bg-gray-100 text-gray-500
+                                    {% endif %}">
+                                    <span class="font-medium">{{ day }}</span>
+                                </div>
+                                <div class="flex-1">
+                                    <div class="flex justify-between items-center">
+                                        <span class="font-medium text-gray-800">
+                                            Day {{ day }}
+                                            {% if day <= completed_days %}
+                                                <span class="ml-2 text-green-600 text-sm">Completed</span>
+                                            {% elif day == completed_days + 1 %}
+                                                <span class="ml-2 text-yellow-600 text-sm">In Progress</span>
+                                            {% else %}
+                                                <span class="ml-2 text-gray-500 text-sm">Upcoming</span>
+                                            {% endif %}
+                                        </span>
+                                        <span class="text-sm text-gray-500">
+                                            {% if day <= completed_days %}
+                                                {{ (day/total_days*100)|round|int }}%
+                                            {% elif day == completed_days + 1 %}
+                                                {{ (completed_days/total_days*100)|round|int }}%
+                                            {% else %}
+                                                0%
+                                            {% endif %}
+                                        </span>
+                                    </div>
+                                    <div class="w-full bg-gray-200 h-2 rounded-full mt-1">
+                                        {% if day <= completed_days %}
+                                            <div class="bg-green-500 h-2 rounded-full" style="width:100%"></div>
+                                        {% elif day == completed_days + 1 %}
+                                            <div class="bg-yellow-500 h-2 rounded-full" style="width:{{ (completed_days/total_days*100)|round|int }}%"></div>
+                                        {% endif %}
+                                    </div>
+                                </div>
+                            </div>
+                            {% endfor %}
+                        </div>
+                    </div>
+                    
+                    <!-- What's Next Section - Moved below progress tracker -->
+                    <div class="bg-primary-50 rounded-xl p-6 mb-10 text-left">
+                        <h3 class="font-semibold text-primary-800 text-lg mb-4 flex items-center">
+                            <svg class="w-5 h-5 mr-2" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
+                                <path d="M10 2a6 6 0 00-6 6v3.586l-.707.707A1 1 0 004 14h12a1 1 0 00.707-1.707L16 11.586V8a6 6 0 00-6-6zM10 18a3 3 0 01-3-3h6a3 3 0 01-3 3z" />
+                            </svg>
+                            What's Next?
+                        </h3>
+                        <ul class="space-y-3">
+                            <li class="flex items-start">
+                                <svg class="flex-shrink-0 w-5 h-5 text-primary-600 mt-0.5 mr-2" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
+                                    <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zm3.707-9.293a1 1 0 00-1.414-1.414L9 10.586 7.707 9.293a1 1 0 00-1.414 1.414l2 2a1 1 0 001.414 0l4-4z" clip-rule="evenodd" />
+                                </svg>
+                                <span class="text-gray-700">
+                                    {% if time_str %}
+                                    Lessons will arrive daily at <strong>{{ time_str }}</strong>
+                                    {% else %}
+                                    Check your WhatsApp for the first lesson
+                                    {% endif %}
+                                </span>
+                            </li>
+                            <li class="flex items-start">
+                                <svg class="flex-shrink-0 w-5 h-5 text-primary-600 mt-0.5 mr-2" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
+                                    <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zm3.707-9.293a1 1 0 00-1.414-1.414L9 10.586 7.707 9.293a1 1 0 00-1.414 1.414l2 2a1 1 0 001.414 0l4-4z" clip-rule="evenodd" />
+                                </svg>
+                                <span class="text-gray-700">Save <span class="font-mono text-primary-600">{{ twilio_whatsapp_number }}</span> to your contacts</span>
+                            </li>
+                            <li class="flex items-start">
+                                <svg class="flex-shrink-0 w-5 h-5 text-primary-600 mt-0.5 mr-2" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
+                                    <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zm3.707-9.293a1 1 0 00-1.414-1.414L9 10.586 7.707 9.293a1 1 0 00-1.414 1.414l2 2a1 1 0 001.414 0l4-4z" clip-rule="evenodd" />
+                                </svg>
+                                <span class="text-gray-700">Join our <a href="#" class="text-primary-600 hover:underline">community forum</a> for peer support and additional resources</span>
+                            </li>
+                        </ul>
+                    </div>
+                    
+                    <!-- Action Buttons -->
+                    <div class="grid grid-cols-1 md:grid-cols-2 gap-4">
+                        <a href="/" class="px-6 py-3 border border-gray-300 rounded-lg text-gray-700 font-medium hover:bg-gray-50 transition duration-300 flex items-center justify-center">
+                            <svg class="w-5 h-5 mr-2" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M3 12l2-2m0 0l7-7 7 7M5 10v10a1 1 0 001 1h3m10-11l2 2m-2-2v10a1 1 0 01-1 1h-3m-6 0a1 1 0 001-1v-4a1 1 0 011-1h2a1 1 0 011 1v4a1 1 0 001 1m-6 0h6" />
+                            </svg>
+                            Back to Home
+                        </a>
+                        <a href="/progress" class="px-6 py-3 bg-primary-600 rounded-lg text-white font-medium hover:bg-primary-700 transition duration-300 flex items-center justify-center">
+                            <svg class="w-5 h-5 mr-2" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 19v-6a2 2 0 00-2-2H5a2 2 0 00-2 2v6a2 2 0 002 2h2a2 2 0 002-2zm0 0V9a2 2 0 012-2h2a2 2 0 012 2v10m-6 0a2 2 0 002 2h2a2 2 0 002-2m0 0V5a2 2 0 012-2h2a2 2 0 012 2v14a2 2 0 01-2 2h-2a2 2 0 01-2-2z" />
+                            </svg>
+                            View Progress
+                        </a>
+                    </div>
+                    
+                    <!-- FIXED: Only show certificate button when course is actually completed -->
+                    {% if completed_days >= total_days %}
+                    <div class="mt-8">
+                        <a href="/certificate" class="inline-flex items-center px-8 py-3 border border-transparent text-lg font-medium rounded-full shadow-sm text-white bg-gradient-to-r from-green-500 to-green-600 hover:from-green-600 hover:to-green-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-green-500 transition duration-300 transform hover:-translate-y-1">
+                            <svg class="w-6 h-6 mr-2" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 12l2 2 4-4m6 2a9 9 0 11-18 0 9 9 0 0118 0z" />
+                            </svg>
+                            Download Certificate
+                        </a>
+                        <p class="mt-3 text-sm text-gray-500">
+                            or <a href="/certificate.pdf" class="text-primary-600 hover:underline">download it as a PDF</a>
+                        </p>
+                    </div>
+                    {% endif %}
+                </div>
+            </div>
+        </section>
+        {% endif %}
+        
+        <!-- Footer -->
+        <footer class="mt-20 text-center text-gray-500 text-sm">
+            <div class="flex justify-center space-x-6 mb-4">
+                <a href="#" class="text-gray-400 hover:text-gray-500">
+                    <span class="sr-only">Twitter</span>
+                    <svg class="h-6 w-6" fill="currentColor" viewBox="0 0 24 24">
+                        <path d="M8.29 20.251c7.547 0 11.675-6.253 11.675-11.675 0-.178 0-.355-.012-.53A8.348 8.348 0 0022 5.92a8.19 8.19 0 01-2.357.646 4.118 4.118 0 001.804-2.27 8.224 8.224 0 01-2.605.996 4.107 4.107 0 00-6.993 3.743 11.65 11.65 0 01-8.457-4.287 4.106 4.106 0 001.27 5.477A4.072 4.072 0 012.8 9.713v.052a4.105 4.105 0 003.292 4.022 4.095 4.095 0 01-1.853.07 4.108 4.108 0 003.834 2.85A8.233 8.233 0 012 18.407a11.616 11.616 0 006.29 1.84" />
+                    </svg>
+                </a>
+                <a href="#" class="text-gray-400 hover:text-gray-500">
+                    <span class="sr-only">GitHub</span>
+                    <svg class="h-6 w-6" fill="currentColor" viewBox="0 0 24 24">
+                        <path fill-rule="evenodd" d="M12 2C6.477 2 2 6.484 2 12.017c0 4.425 2.865 8.18 6.839 9.504.5.092.682-.217.682-.483 0-.237-.008-.868-.013-1.703-2.782.605-3.369-1.343-3.369-1.343-.454-1.158-1.11-1.466-1.11-1.466-.908-.62.069-.608.069-.608 1.003.07 1.531 1.032 1.531 1.032.892 1.53 2.341 1.088 2.91.832.092-.647.35-1.088.636-1.338-2.22-.253-4.555-1.113-4.555-4.951 0-1.093.39-1.988 1.029-2.688-.103-.253-.446-1.272.098-2.65 0 0 .84-.27 2.75 1.026A9.564 9.564 0 0112 6.844c.85.004 1.705.115 2.504.337 1.909-1.296 2.747-1.027 2.747-1.027.546 1.379.202 2.398.1 2.651.64.7 1.028 1.595 1.028 2.688 0 3.848-2.339 4.695-4.566 4.943.359.309.678.92.678 1.855 0 1.338-.012 2.419-.012 2.747 0 .268.18.58.688.482A10.019 10.019 0 0022 12.017C22 6.484 17.522 2 12 2z" clip-rule="evenodd" />
+                    </svg>
+                </a>
+            </div>
+            <p>&copy; 2023 LearnHub. All rights reserved.</p>
+            <p class="mt-1">
+                <a href="#" class="hover:text-primary-600">Privacy Policy</a> · 
+                <a href="#" class="hover:text-primary-600">Terms of Service</a>
+            </p>
+        </footer>
+    </div>
+    
+    <script>
+        // Animate course cards on hover
+        document.addEventListener('DOMContentLoaded', function() {
+            const courseCards = document.querySelectorAll('.course-card');
+            courseCards.forEach(card => {
+                card.addEventListener('mouseenter', () => {
+                    card.querySelector('.course-icon').classList.add('animate-float');
+                });
+                card.addEventListener('mouseleave', () => {
+                    card.querySelector('.course-icon').classList.remove('animate-float');
+                });
+            });
+            
+            // Animate progress rings
+            const progressRings = document.querySelectorAll('.progress-ring');
+            progressRings.forEach(ring => {
+                const circle = ring.querySelector('.progress-ring__circle');
+                const radius = circle.r.baseVal.value;
+                const circumference = 2 * Math.PI * radius;
+                const progress = ring.dataset.progress;
+                
+                circle.style.strokeDasharray = circumference;
+                circle.style.strokeDashoffset = circumference - (progress / 100) * circumference;
+            });
+        });
+    </script>
+</body>
+</html>
+'''
+
+# Compiled once at startup; render_template_string would re-parse the whole
+# template on every request.
+full_template = app.jinja_env.from_string(FULL_TEMPLATE)
+COURSE_SELECTION_CACHE_SECONDS = int(os.environ.get("COURSE_SELECTION_CACHE_SECONDS", 300))
+_course_selection_page = None  # (body, etag), built on first request
+
+def render_page(**context):
+    """Render a view of the precompiled FULL_TEMPLATE"""
+    return render_template(full_template, **context)
+
+def course_selection_response():
+    """Serve the static course catalogue from a prerendered body with ETag/Cache-Control"""
+    global _course_selection_page
+    if _course_selection_page is None:
+        body = render_page(template='course_selection')
+        _course_selection_page = (body, hashlib.sha1(body.encode('utf-8')).hexdigest())
+    body, etag = _course_selection_page
+    response = make_response(body)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"public, max-age={COURSE_SELECTION_CACHE_SECONDS}"
+    return response.make_conditional(request)
+
+@app.route('/', methods=['GET', 'POST'])
+def select_course():
+    if request.method == "POST":
+        course = request.form.get("course")
+        if course:
+            return redirect(url_for("schedule_form", course=course))
+    return course_selection_response()
+
+@app.route("/schedule", methods=["GET", "POST"])
+def schedule_form():
+    course = request.args.get("course") or request.form.get("course")
+    if not course:
+        return redirect(url_for("select_course"))
+    
+    if request.method == "POST":
+        try:
+            # Validation
+            name, phone, days, time_str = validate_enrollment(
+                request.form.get("name"),
+                request.form.get("phone"),
+                request.form.get("days"),
+                request.form.get("time")
+            )
+            
+            # Record the enrollment; the welcome message and lessons are sent in the background
+            enrollment_id = enqueue_enrollment(phone, course, days, time_str, name)
+            session['phone'] = phone
+            session['course'] = course
+            session['total_days'] = days
+            session['user_name'] = name
+            session['time_str'] = time_str  # Store time for display
+            session['enrollment_id'] = enrollment_id
+            return redirect(url_for('progress'))
+                
+        except ValueError as e:
+            error_message = str(e)
+            return render_page(
+                template='user_form',
+                course=course,
+                error=error_message,
+                sandbox_code="aloud-coming",
+                twilio_whatsapp_number="+14155238886",
+                csrf_token=generate_csrf()
+            )
+        except Exception as e:
+            error_message = f"An error occurred: {str(e)}"
+            return render_page(
+                template='user_form',
+                course=course,
+                error=error_message,
+                sandbox_code="sea-sun",
+                twilio_whatsapp_number="+14155238886",
+                csrf_token=generate_csrf()
+            )
+    
+    return render_page(
+        template='user_form',
+        course=course,
+        sandbox_code="sea-sun",
+        twilio_whatsapp_number="+14155238886",
+        csrf_token=generate_csrf()
+    )
+
+@app.route("/progress")
+def progress():
+    phone = session.get('phone')
+    course = session.get('course')
+    total_days = session.get('total_days', 0)
+    time_str = session.get('time_str', '')
+    
+    if not phone or not course or not total_days:
+        return redirect(url_for('select_course'))
+    
+    completed_days = get_progress(phone, course)
+    enrollment_id = session.get('enrollment_id')
+    enrollment_status = get_enrollment_status(enrollment_id) if enrollment_id else None
+    
+    logger.info(f"📊 Progress check: {phone} - {course} - {completed_days}/{total_days} days")
+    
+    return render_page(
+        template='confirm',
+        course=course,
+        total_days=total_days,
+        completed_days=completed_days,
+        enrollment_status=enrollment_status,
+        time_str=time_str,
+        twilio_whatsapp_number="+14155238886",
+        csrf_token=generate_csrf()
+    )
+
+DEBUG_PAGE_SIZE = 50
+DEBUG_MAX_PAGE_SIZE = 500
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor, size):
+    """The list of `size` strings encoded by encode_cursor; ValueError for anything else"""
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, str) for v in values):
+        raise ValueError(f"cursor must be a list of {size} strings")
+    return values
+
+def parse_debug_date(value, end=False):
+    """YYYY-MM-DD or 'YYYY-MM-DD HH:MM:SS'; a bare end date covers that whole day"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, DB_TIME_FORMAT)
+    except ValueError:
+        day = datetime.strptime(value, "%Y-%m-%d")
+        return day + timedelta(days=1) if end else day
+
+def debug_enrollments_page(phone, course, start, end, cursor, limit):
+    """One keyset page of enrollments ordered by (phone, course)"""
+    clauses, params = [], []
+    if phone:
+        clauses.append("phone = ?")
+        params.append(phone)
+    if course:
+        clauses.append("course = ?")
+        params.append(course)
+    if start:
+        clauses.append("next_send_at >= ?")
+        params.append(start.strftime(DB_TIME_FORMAT))
+    if end:
+        clauses.append("next_send_at < ?")
+        params.append(end.strftime(DB_TIME_FORMAT))
+    if cursor:
+        clauses.append("(phone, course) > (?, ?)")
+        params.extend(cursor)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with db_connection() as conn:
+        rows = conn.execute(
+            f"SELECT * FROM enrollments {where} ORDER BY phone, course LIMIT ?", params + [limit + 1]
+        ).fetchall()
+    items = []
+    for row in rows[:limit]:
+        item = dict(row)
+        item['progress'] = get_progress(row["phone"], row["course"])
+        items.append(item)
+    next_cursor = [rows[limit - 1]["phone"], rows[limit - 1]["course"]] if len(rows) > limit else None
+    return items, next_cursor
+
+def debug_jobs_page(phone, course, start, end, cursor, limit):
+    """One keyset page of legacy lesson jobs, read without unpickling them"""
+    clauses, params = [], []
+    # Lesson job ids start with "<phone>_<course>_day", so a phone/course filter is an id prefix range
+    if phone:
+        prefix = f"{phone}_{course}_day" if course else f"{phone}_"
+        clauses.append("id >= ? AND id < ?")
+        params.extend([prefix, prefix + "\uffff"])
+    if start:
+        clauses.append("next_run_time >= ?")
+        params.append(start.timestamp())
+    if end:
+        clauses.append("next_run_time < ?")
+        params.append(end.timestamp())
+    if cursor:
+        clauses.append("id > ?")
+        params.append(cursor[0])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    if not os.path.exists(JOBSTORE_DB_PATH):
+        return [], None
+    with jobstore_connection() as conn:
+        try:
+            rows = conn.execute(
+                f"SELECT id, next_run_time FROM apscheduler_jobs {where} ORDER BY id LIMIT ?", params + [limit + 1]
+            ).fetchall()
+        except sqlite3.OperationalError:
+            rows = []  # the scheduler has not created its table yet
+    items = []
+    for job_id, next_run_time in rows[:limit]:
+        match = LESSON_JOB_ID_RE.match(job_id)
+        if course and not phone and (not match or match.group("course") != course):
+            continue
+        items.append({
+            'id': job_id,
+            'next_run': datetime.fromtimestamp(next_run_time).isoformat() if next_run_time else None,
+            'args': [match.group("phone"), match.group("course"), int(match.group("day"))] if match else None
+        })
+    next_cursor = [rows[limit - 1][0]] if len(rows) > limit else None
+    return items, next_cursor
+
+@app.route("/debug-schedules")
+def debug_schedules():
+    """Debug endpoint to see scheduled jobs, one page at a time
+
+    ?kind=enrollments (default) or jobs, filtered by phone, course and a
+    from/to range on the next send time; follow next_cursor for more.
+    """
+    kind = request.args.get('kind', 'enrollments')
+    phone = request.args.get('phone', '').strip()
+    course = request.args.get('course', '').strip()
+    try:
+        limit = max(1, min(int(request.args.get('limit', DEBUG_PAGE_SIZE)), DEBUG_MAX_PAGE_SIZE))
+        start = parse_debug_date(request.args.get('from'))
+        end = parse_debug_date(request.args.get('to'), end=True)
+        cursor_size = 2 if kind == 'enrollments' else 1  # (phone, course) or job id
+        cursor = decode_cursor(request.args['cursor'], cursor_size) if request.args.get('cursor') else None
+    except Exception:
+        return jsonify({'error': 'invalid limit, from, to or cursor'}), 400
+    
+    if kind == 'enrollments':
+        items, next_cursor = debug_enrollments_page(phone, course, start, end, cursor, limit)
+    elif kind == 'jobs':
+        items, next_cursor = debug_jobs_page(phone, course, start, end, cursor, limit)
+    else:
+        return jsonify({'error': "kind must be 'enrollments' or 'jobs'"}), 400
+    
+    return jsonify({
+        'kind': kind,
+        'total_jobs': job_counter.value(),
+        'items': items,
+        'next_cursor': encode_cursor(next_cursor) if next_cursor else None
+    })
+
+@app.route("/send-now")
+def send_now():
+    """Send a lesson immediately for testing"""
+    phone = session.get('phone')
+    course = session.get('course')
+    total_days = session.get('total_days', 3)
+    
+    if not phone or not course:
+        return "No phone or course in session"
+    
+    try:
+        current_progress = get_progress(phone, course)
+        day_to_send = current_progress + 1
+        
+        if day_to_send > total_days:
+            return "Course already completed!"
+        
+        # Delivery belongs to the worker process: make the next lesson due now
+        with db_connection() as conn:
+            cursor = conn.execute(
+                "UPDATE enrollments SET next_send_at = ?, updated_at = ? WHERE phone = ? AND course = ? AND status = 'active'",
+                (datetime.now().strftime(DB_TIME_FORMAT), time.time(), phone, course)
+            )
+        if cursor.rowcount == 0:
+            return "No active enrollment for this course"
+        return f"Day {day_to_send} queued, it will be sent within a minute"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+@app.route("/course-agent", methods=["GET", "POST"])
+def course_agent():
+    return course_selection_response()
+
+@app.route("/signup", methods=["POST"])
+def signup():
+    fullname = request.form["fullname"].strip()
+    phone = request.form["phone"].strip()
+    password = request.form["password"]
+
+    try:
+        conn = sqlite3.connect("userform.db")
+        cur = conn.cursor()
+        cur.execute("INSERT INTO users (fullname, phone, password) VALUES (?, ?, ?)", 
+                    (fullname, phone, password))
+        conn.commit()
+        conn.close()
+
+        session["phone"] = phone
+        return redirect(url_for("schedule_form"))
+    except Exception as e:
+        return f"Signup failed: {str(e)}"
+
+# === PDF CERTIFICATES ===
+# Certificates are rendered with reportlab and stored content-addressed: the
+# file name is a hash of everything printed on the certificate, so a repeat
+# download is a plain file serve and a changed name yields a new file.
+CERTIFICATE_CACHE_DIR = os.environ.get("CERTIFICATE_CACHE_DIR", "certificates")
+CERTIFICATE_LAYOUT_VERSION = "v1"  # Bump when the PDF layout changes
+CERTIFICATE_IMAGE_MAX_PX = 400  # Images are downscaled once to print size
+CERTIFICATE_IMAGES = {
+    'logo': 'logo.png',
+    'seal': 'seal.png',
+    'signature': 'signature.png',
+}
+
+_certificate_images = None
+_certificate_images_lock = threading.Lock()
+
+def get_certificate_images():
+    """Decode and downscale the certificate images once per process"""
+    global _certificate_images
+    with _certificate_images_lock:
+        if _certificate_images is None:
+            from PIL import Image
+            from reportlab.lib.utils import ImageReader
+            images = {}
+            for key, filename in CERTIFICATE_IMAGES.items():
+                with Image.open(os.path.join(app.static_folder, 'images', filename)) as image:
+                    image.load()
+                    image.thumbnail((CERTIFICATE_IMAGE_MAX_PX, CERTIFICATE_IMAGE_MAX_PX))
+                    images[key] = ImageReader(image.copy())
+            _certificate_images = images
+        return _certificate_images
+
+def get_completion_date(phone, course):
+    """Date the course was completed, falling back to today"""
+    enrollment = get_enrollment(phone, course)
+    if enrollment is not None and enrollment["completed_at"]:
+        completed = datetime.strptime(enrollment["completed_at"], DB_TIME_FORMAT)
+    else:
+        completed = datetime.now()
+    return completed.strftime("%B %d, %Y")
+
+def certificate_path(phone, course, date, name):
+    """Content-addressed location of a certificate PDF"""
+    digest = hashlib.sha256(
+        f"{CERTIFICATE_LAYOUT_VERSION}|{phone}|{course}|{date}|{name}".encode('utf-8')
+    ).hexdigest()
+    return os.path.join(CERTIFICATE_CACHE_DIR, digest[:2], f"{digest}.pdf")
+
+def render_certificate_pdf(name, course, date):
+    """Draw the certificate with reportlab and return the PDF bytes"""
+    from reportlab.lib.pagesizes import landscape, letter
+    from reportlab.lib.colors import HexColor
+    from reportlab.pdfgen import canvas
+    images = get_certificate_images()
+    buffer = BytesIO()
+    width, height = landscape(letter)
+    pdf = canvas.Canvas(buffer, pagesize=(width, height))
+    pdf.setTitle(f"{course} Certificate - {name}")
+    
+    # Parchment background and borders
+    pdf.setFillColor(HexColor("#f5e7d0"))
+    pdf.rect(0, 0, width, height, stroke=0, fill=1)
+    pdf.setStrokeColor(HexColor("#2c3e50"))
+    pdf.setLineWidth(3)
+    pdf.rect(20, 20, width - 40, height - 40)
+    pdf.setStrokeColor(HexColor("#8b4513"))
+    pdf.setLineWidth(1)
+    pdf.setDash(4, 3)
+    pdf.rect(32, 32, width - 64, height - 64)
+    pdf.setDash()
+    
+    pdf.drawImage(images['logo'], 50, height - 130, width=80, height=80, mask='auto', preserveAspectRatio=True)
+    pdf.drawImage(images['seal'], width - 150, height - 150, width=100, height=100, mask='auto', preserveAspectRatio=True)
+    
+    pdf.setFillColor(HexColor("#2c3e50"))
+    pdf.setFont("Times-Bold", 46)
+    pdf.drawCentredString(width / 2, height - 120, "Certificate")
+    pdf.setFont("Helvetica", 16)
+    pdf.drawCentredString(width / 2, height - 148, "of Achievement")
+    
+    pdf.setFillColor(HexColor("#34495e"))
+    pdf.setFont("Helvetica", 14)
+    pdf.drawCentredString(width / 2, height - 200, "This certificate is proudly presented to")
+    pdf.setFillColor(HexColor("#e74c3c"))
+    pdf.setFont("Times-BoldItalic", 36)
+    pdf.drawCentredString(width / 2, height - 250, name)
+    
+    pdf.setFillColor(HexColor("#34495e"))
+    pdf.setFont("Helvetica", 14)
+    pdf.drawCentredString(width / 2, height - 290, "for successfully completing the course")
+    pdf.setFillColor(HexColor("#2c3e50"))
+    pdf.setFont("Helvetica-Bold", 22)
+    pdf.drawCentredString(width / 2, height - 325, course)
+    pdf.setFillColor(HexColor("#34495e"))
+    pdf.setFont("Helvetica", 14)
+    pdf.drawCentredString(width / 2, height - 360, "with honors and distinction")
+    pdf.setFont("Helvetica-Oblique", 13)
+    pdf.drawCentredString(width / 2, height - 390, f"on this {date}")
+    
+    # Director signature centered at bottom
+    pdf.drawImage(images['signature'], width / 2 - 80, 95, width=160, height=56, mask='auto', preserveAspectRatio=True)
+    pdf.setStrokeColor(HexColor("#2c3e50"))
+    pdf.line(width / 2 - 100, 90, width / 2 + 100, 90)
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawCentredString(width / 2, 72, "Director")
+    
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+def get_certificate_pdf(phone, course, name, date):
+    """Path to the certificate PDF, rendering it only if it is not cached yet"""
+    path = certificate_path(phone, course, date, name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pdf_bytes = render_certificate_pdf(name, course, date)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, path)  # Atomic, so concurrent downloads never see a partial file
+        logger.info(f"🏅 Certificate rendered: {phone} - {course} ({len(pdf_bytes)} bytes)")
+    return path
+
+@app.route("/certificate")
+def certificate():
+    if "phone" not in session:
+        return redirect(url_for("schedule_form"))
+
+    phone = session["phone"]
+    course = session.get("course", "Your Course")
+    total_days = session.get("total_days", 0)
+    
+    # FIXED: Check if course is actually completed
+    if not is_course_completed(phone, course, total_days):
+        return redirect(url_for('progress'))
+
+    date = get_completion_date(phone, course)
+
+    # FIXED: Get user name from our stored names
+    name = get_user_name(phone)
+
+    return render_template("cert.html", name=name, course=course, date=date)
+
+@app.route("/certificate.pdf")
+def certificate_pdf():
+    if "phone" not in session:
+        return redirect(url_for("schedule_form"))
+
+    phone = session["phone"]
+    course = session.get("course", "Your Course")
+    total_days = session.get("total_days", 0)
+    
+    if not is_course_completed(phone, course, total_days):
+        return redirect(url_for('progress'))
+
+    date = get_completion_date(phone, course)
+    name = get_user_name(phone)
+
+    try:
+        path = get_certificate_pdf(phone, course, name, date)
+    except Exception as e:
+        logger.error(f"❌ Error generating certificate PDF: {str(e)}")
+        return redirect(url_for('certificate'))
+
+    return send_file(
+        os.path.abspath(path),
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f"{course} Certificate.pdf",
+        max_age=3600
+    )
+
+# === DELIVERY LEADER LOCK ===
+# Exactly one process may run the scheduler and deliver lessons, or every job
+# would fire once per process. Candidates race for a lease row in the app DB;
+# the holder renews it every LEADER_RENEW_SECONDS and standbys take over once
+# it has not been renewed for LEADER_LEASE_SECONDS.
+LEADER_LOCK_NAME = "delivery"
+LEADER_LEASE_SECONDS = int(os.environ.get("LEADER_LEASE_SECONDS", 30))
+LEADER_RENEW_SECONDS = int(os.environ.get("LEADER_RENEW_SECONDS", 10))
+
+def init_leader_locks():
+    """Create the leader lock table if it does not exist yet"""
+    with db_connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS leader_locks (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+
+def try_acquire_leader_lock(name, holder, lease_seconds=LEADER_LEASE_SECONDS):
+    """Take or renew the lock; True if holder owns it afterwards"""
+    now = time.time()
+    with db_connection() as conn:
+        conn.execute(
+            "INSERT INTO leader_locks (name, holder, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+            "WHERE leader_locks.holder = excluded.holder OR leader_locks.expires_at < ?",
+            (name, holder, now + lease_seconds, now)
+        )
+        row = conn.execute("SELECT holder FROM leader_locks WHERE name = ?", (name,)).fetchone()
+    return row is not None and row["holder"] == holder
+
+def release_leader_lock(name, holder):
+    with db_connection() as conn:
+        conn.execute("DELETE FROM leader_locks WHERE name = ? AND holder = ?", (name, holder))
+
+init_leader_locks()
+
+# === PROCESS STARTUP ===
+# Importing this module only does shared setup (config, app DB tables, routes).
+# Web processes call init_web() and only write enrollments; run_worker() waits
+# for the delivery leader lock and then calls init_worker(), which is the only
+# place the scheduler is started.
+def init_web():
+    """Web-only startup: prerender the course catalogue so the first visitor doesn't pay for it"""
+    with app.test_request_context('/'):
+        course_selection_response()
+    logger.info("🌐 Web process ready")
+
+def init_worker():
+    """Worker-only startup: persistent scheduler, recurring jobs and the enrollment worker"""
+    if _delivery_shard is not None:
+        # The Twilio sender limit is account-wide, so each shard gets its share
+        outbound_dispatcher.sender_rate = TWILIO_SENDER_RATE / DELIVERY_SHARDS
+        logger.info(f"🧩 Delivering shard {_delivery_shard}/{DELIVERY_SHARDS}")
+    scheduler = get_scheduler()
+    # FIXED: Start persistent scheduler
+    if not scheduler.running:
+        # Paused until overdue jobs are repaced, so they don't all fire at once
+        scheduler.start(paused=True)
+        if owns_global_jobs():
+            logger.info(f"✅ Persistent scheduler started with {job_counter.value()} jobs")
+            rebuild_job_index()
+            reschedule_overdue_jobs()
+        start_background_jobs()
+        scheduler.resume()
+    if owns_global_jobs():
+        ensure_enrollment_worker()
+        ensure_inbound_worker()
+
+def run_worker(shard=None):
+    """Delivery process main loop: become leader (of one shard, if given), deliver, keep the lease alive"""
+    global _delivery_shard
+    if shard is None and DELIVERY_SHARDS > 1:
+        raise ValueError(f"DELIVERY_SHARDS is {DELIVERY_SHARDS}: run one worker per shard")
+    if shard is not None and not 0 <= shard < DELIVERY_SHARDS:
+        raise ValueError(f"Shard must be between 0 and {DELIVERY_SHARDS - 1}")
+    _delivery_shard = shard
+    lock_name = LEADER_LOCK_NAME if shard is None else f"{LEADER_LOCK_NAME}:{shard}/{DELIVERY_SHARDS}"
+    holder = WORKER_ID  # lesson outbox rows are owned by this id
+    renewed_at = None
+    if METRICS_PORT:
+        try:
+            start_metrics_server(METRICS_PORT + (shard or 0))
+        except OSError as e:
+            logger.error(f"❌ Could not serve worker metrics: {str(e)}")
+    logger.info(f"🗳️ Worker {holder} waiting for the {lock_name} lock")
+    try:
+        while True:
+            try:
+                if try_acquire_leader_lock(lock_name, holder):
+                    if renewed_at is None:
+                        logger.info(f"👑 Worker {holder} is the {lock_name} leader")
+                        init_worker()
+                    renewed_at = time.monotonic()
+                elif renewed_at is not None:
+                    logger.error(f"❌ Worker {holder} lost the {lock_name} lock")
+                    os._exit(1)  # jobs may be mid-flight; let the process manager restart us as a standby
+            except Exception as e:
+                logger.error(f"❌ Leader lock error: {str(e)}")
+                if renewed_at is not None and time.monotonic() - renewed_at > LEADER_LEASE_SECONDS:
+                    logger.error(f"❌ Worker {holder} could not renew the {lock_name} lock in time")
+                    os._exit(1)
+            time.sleep(LEADER_RENEW_SECONDS)
+    finally:
+        shutdown_scheduler()
+        if renewed_at is not None:
+            release_leader_lock(lock_name, holder)
+            logger.info(f"👋 Worker {holder} released the {lock_name} lock")
+
+def create_web_app():
+    """gunicorn entry point ("test:create_web_app()")"""
+    init_web()
+    return app
+
+def shutdown_scheduler():
+    if scheduler_running():
+        _scheduler.shutdown()
+
+# Graceful shutdown
+import atexit
+atexit.register(shutdown_scheduler)
+
+if __name__ == "__main__":
+    # Development: web and a delivery worker in one process
+    threading.Thread(target=run_worker, name="delivery-worker", daemon=True).start()
+    init_web()
+    
+    port = int(os.environ.get("PORT", 8000))
+    logger.info(f"🚀 Starting Flask app on port {port}")
+    app.run(host='0.0.0.0', port=port, debug=False)
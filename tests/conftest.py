@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# test.py reads its settings and opens its databases at import time
+_import_dir = tempfile.mkdtemp(prefix="learnhub-tests-")
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACtest")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "test")
+os.environ.setdefault("TOGETHER_API_KEY", "test")
+os.environ["APP_DB_PATH"] = os.path.join(_import_dir, "learnhub.sqlite")
+os.environ["JOBSTORE_DB_PATH"] = os.path.join(_import_dir, "jobs.sqlite")
+os.environ["PROGRESS_STORE"] = "sqlite"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import test as learnhub  # noqa: E402
+
+
+@pytest.fixture
+def app_db(tmp_path, monkeypatch):
+    """A fresh app database for one test, with this process holding the delivery lock"""
+    monkeypatch.setattr(learnhub, "db_pool", learnhub.SQLiteConnectionPool(str(tmp_path / "learnhub.sqlite"), 4))
+    monkeypatch.setattr(learnhub, "progress_backend", learnhub.SQLiteProgressStore())
+    learnhub.init_lesson_outbox()
+    learnhub.init_enrollments()
+    learnhub.init_job_index()
+    learnhub.init_dispatcher_ticks()
+    learnhub.init_leader_locks()
+    assert learnhub.try_acquire_leader_lock(learnhub.LEADER_LOCK_NAME, learnhub.WORKER_ID)
+    return learnhub
+
+
+@pytest.fixture
+def whatsapp(monkeypatch):
+    """Stub deliver_whatsapp: records sent bodies, fails the ones listed in `fail`"""
+
+    class FakeWhatsApp:
+        def __init__(self):
+            self.sent = []
+            self.fail = set()
+
+        def __call__(self, to_phone, message, from_number=None):
+            if message in self.fail:
+                return False
+            self.sent.append(message)
+            return f"SM{len(self.sent)}"
+
+    fake = FakeWhatsApp()
+    monkeypatch.setattr(learnhub, "deliver_whatsapp", fake)
+    return fake
@@ -0,0 +1,77 @@
+import pytest
+
+TOKEN = "cohort-token"
+
+
+@pytest.fixture
+def client(app_db, monkeypatch):
+    monkeypatch.setattr(app_db, "BULK_ENROLL_TOKEN", TOKEN)
+    app_db.init_enrollment_queue()
+    return app_db.app.test_client()
+
+
+def post_learners(client, learners):
+    return client.post("/enroll/bulk", json={"course": "Python", "days": 5, "time": "08:00 AM", "learners": learners},
+                       headers={"Authorization": f"Bearer {TOKEN}"})
+
+
+def queued_welcomes(app):
+    with app.db_connection() as conn:
+        return conn.execute("SELECT id, phone, status, attempts FROM enrollment_queue WHERE kind = 'welcome'").fetchall()
+
+
+def test_valid_cohort_is_enrolled_pending_its_welcome(client, app_db):
+    response = post_learners(client, [{"name": "Ada", "phone": "+15550101"}, {"name": "Alan", "phone": "+15550102"}])
+
+    assert response.status_code == 202
+    assert response.get_json()["enrolled"] == 2
+    assert app_db.get_enrollment("+15550101", "Python")["status"] == "pending"
+    assert [row["status"] for row in queued_welcomes(app_db)] == ["pending", "pending"]
+
+
+@pytest.mark.parametrize("row, message", [
+    ({"name": "Ada", "phone": 15550101}, "'phone' must be a string"),
+    ({"name": ["Ada"], "phone": "+15550101"}, "'name' must be a string"),
+    ({"name": "Ada", "phone": "+15550101", "course": {"id": 1}}, "'course' must be a string"),
+    ({"name": "Ada", "phone": "15550101"}, "country code"),
+    ({"name": "Ada", "phone": "+15550101", "days": 400}, "valid number of days"),
+    ("Ada", "Each learner must be an object"),
+])
+def test_bad_rows_are_reported_per_row(client, app_db, row, message):
+    response = post_learners(client, [{"name": "Alan", "phone": "+15550102"}, row])
+
+    assert response.status_code == 400
+    errors = response.get_json()["errors"]
+    assert [error["row"] for error in errors] == [2]
+    assert message in errors[0]["error"]
+    assert queued_welcomes(app_db) == []
+
+
+def test_failed_welcome_is_retried_before_the_enrollment_fails(client, app_db, whatsapp, monkeypatch):
+    monkeypatch.setattr(app_db, "WELCOME_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(app_db, "WELCOME_RETRY_SECONDS", 0)
+    post_learners(client, [{"name": "Ada", "phone": "+15550101"}])
+    welcome = app_db.build_welcome_message("Python", 5, "08:00 AM")
+    whatsapp.fail.add(welcome)
+    enrollment_id = queued_welcomes(app_db)[0]["id"]
+
+    assert app_db.process_welcome_batch([enrollment_id]) == 0
+    assert app_db.get_enrollment_status(enrollment_id) == "retry"
+    assert app_db.get_enrollment("+15550101", "Python")["status"] == "pending"
+    assert app_db.pending_enrollments() == [(enrollment_id, "welcome")]
+
+    whatsapp.fail.clear()
+    assert app_db.process_welcome_batch([enrollment_id]) == 1
+    assert app_db.get_enrollment_status(enrollment_id) == "sent"
+    assert app_db.get_enrollment("+15550101", "Python")["status"] == "active"
+
+
+def test_welcome_out_of_attempts_fails_the_enrollment(client, app_db, whatsapp, monkeypatch):
+    monkeypatch.setattr(app_db, "WELCOME_MAX_ATTEMPTS", 1)
+    post_learners(client, [{"name": "Ada", "phone": "+15550101"}])
+    whatsapp.fail.add(app_db.build_welcome_message("Python", 5, "08:00 AM"))
+    enrollment_id = queued_welcomes(app_db)[0]["id"]
+
+    assert app_db.process_welcome_batch([enrollment_id]) == 0
+    assert app_db.get_enrollment_status(enrollment_id) == "failed"
+    assert app_db.get_enrollment("+15550101", "Python")["status"] == "failed"
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+COURSE = "Python"
+
+
+@pytest.fixture
+def catchup(app_db, monkeypatch):
+    """Catch-up with a fresh pacer: one backlog lesson a minute, no spreading window"""
+    monkeypatch.setattr(app_db, "catchup_pacer", app_db.CatchupPacer())
+    monkeypatch.setattr(app_db, "CATCHUP_MAX_PER_MINUTE", 1)
+    monkeypatch.setattr(app_db, "CATCHUP_WINDOW_SECONDS", 0)
+    return app_db
+
+
+def enroll_before_outage(app, phone, days_down, total_days=6):
+    """An enrollment on day 1 whose lessons kept falling due while the worker was down for `days_down` days"""
+    now = datetime.now()
+    preferred = (now - timedelta(hours=1)).strftime("%I:%M %p")
+    start = (now - timedelta(hours=1) - timedelta(days=days_down)).strftime("%Y-%m-%d")
+    app.save_enrollment(phone, COURSE, total_days, start, preferred, 1, "abcd1234")
+
+
+def next_send_at(app, phone):
+    value = app.get_enrollment(phone, COURSE)["next_send_at"]
+    return datetime.strptime(value, app.DB_TIME_FORMAT) if value else None
+
+
+def test_spread_paces_every_missed_day_after_a_three_day_outage(catchup, monkeypatch):
+    monkeypatch.setattr(catchup, "CATCHUP_POLICY", "spread")
+    phones = ["+15550101", "+15550102"]
+    for phone in phones:
+        enroll_before_outage(catchup, phone, days_down=3)
+
+    assert catchup.reschedule_backlog() == 2
+    catchup.record_dispatcher_tick()
+    slots = [next_send_at(catchup, phone) for phone in phones]
+
+    # Each learner's missed days 2-4 follow from the same pacer as the day before is delivered
+    for _ in range(3):
+        for phone in phones:
+            catchup.advance_enrollment(catchup.get_enrollment(phone, COURSE))
+            slots.append(next_send_at(catchup, phone))
+        # The worker is up, so the paced days are not treated as backlog again
+        assert catchup.reschedule_backlog() == 0
+
+    assert [catchup.get_enrollment(phone, COURSE)["next_day"] for phone in phones] == [4, 4]
+    paced = sorted(slots)
+    assert all(slot > datetime.now() for slot in paced[1:])
+    assert all(later - earlier >= timedelta(seconds=59) for earlier, later in zip(paced, paced[1:]))
+
+    # Day 5 is in the future again: back on the learner's regular time
+    for phone in phones:
+        catchup.advance_enrollment(catchup.get_enrollment(phone, COURSE))
+        row = catchup.get_enrollment(phone, COURSE)
+        assert next_send_at(catchup, phone) == catchup.lesson_send_time(row["start_date"], row["preferred_time"], 5)
+
+
+def test_skip_drops_missed_days_and_resumes_on_the_regular_time(catchup, monkeypatch):
+    monkeypatch.setattr(catchup, "CATCHUP_POLICY", "skip")
+    enroll_before_outage(catchup, "+15550101", days_down=3)
+
+    assert catchup.reschedule_backlog() == 1
+    row = catchup.get_enrollment("+15550101", COURSE)
+    # Days 1-4 fell due during the outage; day 5 is the first one still ahead
+    assert row["next_day"] == 5
+    assert next_send_at(catchup, "+15550101") == catchup.lesson_send_time(row["start_date"], row["preferred_time"], 5)
+
+
+def test_skip_past_the_last_day_completes_the_course(catchup, monkeypatch):
+    monkeypatch.setattr(catchup, "CATCHUP_POLICY", "skip")
+    enroll_before_outage(catchup, "+15550101", days_down=3, total_days=3)
+
+    assert catchup.reschedule_backlog() == 1
+    row = catchup.get_enrollment("+15550101", COURSE)
+    assert (row["status"], row["next_day"], row["next_send_at"]) == ("completed", 4, None)
+
+
+def test_coalesce_sends_only_the_latest_missed_day_now(catchup, monkeypatch):
+    monkeypatch.setattr(catchup, "CATCHUP_POLICY", "coalesce")
+    enroll_before_outage(catchup, "+15550101", days_down=3)
+
+    assert catchup.reschedule_backlog() == 1
+    assert catchup.get_enrollment("+15550101", COURSE)["next_day"] == 4
+    assert abs(next_send_at(catchup, "+15550101") - datetime.now()) < timedelta(seconds=5)
+
+
+def test_spread_spaces_the_backlog_over_the_window(catchup, monkeypatch):
+    monkeypatch.setattr(catchup, "CATCHUP_POLICY", "spread")
+    monkeypatch.setattr(catchup, "CATCHUP_WINDOW_SECONDS", 3600)
+    phones = ["+15550101", "+15550102", "+15550103"]
+    for phone in phones:
+        enroll_before_outage(catchup, phone, days_down=1)
+
+    assert catchup.reschedule_backlog() == 3
+    slots = sorted(next_send_at(catchup, phone) for phone in phones)
+    assert [catchup.get_enrollment(phone, COURSE)["next_day"] for phone in phones] == [1, 1, 1]
+    assert all(later - earlier >= timedelta(seconds=1199) for earlier, later in zip(slots, slots[1:]))
+
+
+def test_late_lessons_are_not_backlog_while_the_dispatcher_is_ticking(catchup, monkeypatch):
+    monkeypatch.setattr(catchup, "CATCHUP_POLICY", "skip")
+    enroll_before_outage(catchup, "+15550101", days_down=3)
+    catchup.record_dispatcher_tick()
+
+    assert catchup.reschedule_backlog() == 0
+    assert catchup.get_enrollment("+15550101", COURSE)["next_day"] == 1
+
+
+def test_unknown_policy_leaves_the_backlog_alone(catchup, monkeypatch):
+    monkeypatch.setattr(catchup, "CATCHUP_POLICY", "replay")
+    enroll_before_outage(catchup, "+15550101", days_down=3)
+
+    assert catchup.reschedule_backlog() == 0
+    assert catchup.get_enrollment("+15550101", COURSE)["next_day"] == 1
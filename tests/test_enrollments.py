@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+PHONE = "+15550100"
+COURSE = "Python"
+
+
+def claimed_enrollment(app, days_ago=2):
+    """An active enrollment on day 1 whose lesson is due, as the dispatcher claims it"""
+    start = (datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
+    app.save_enrollment(PHONE, COURSE, 3, start, "08:00 AM", 1, "abcd1234")
+    return app.get_enrollment(PHONE, COURSE)
+
+
+def test_advance_moves_to_the_next_day(app_db):
+    row = claimed_enrollment(app_db, days_ago=0)
+
+    assert app_db.advance_enrollment(row) is True
+    enrollment = app_db.get_enrollment(PHONE, COURSE)
+    assert enrollment["next_day"] == 2
+    assert enrollment["next_send_at"] == app_db.lesson_send_time(row["start_date"], "08:00 AM", 2).strftime(
+        app_db.DB_TIME_FORMAT)
+
+
+def test_stop_during_a_lesson_is_not_undone(app_db):
+    row = claimed_enrollment(app_db)
+    app_db.stop_learner(PHONE)
+
+    assert app_db.advance_enrollment(row) is False
+    enrollment = app_db.get_enrollment(PHONE, COURSE)
+    assert (enrollment["status"], enrollment["next_day"], enrollment["next_send_at"]) == ("stopped", 1, None)
+
+
+def test_advance_keeps_the_schedule_shift_of_a_resume(app_db):
+    row = claimed_enrollment(app_db)
+    app_db.pause_learner(PHONE)
+    app_db.resume_learner(PHONE)
+    resumed = app_db.get_enrollment(PHONE, COURSE)
+    assert resumed["start_date"] != row["start_date"]
+
+    assert app_db.advance_enrollment(row) is True
+    assert app_db.get_enrollment(PHONE, COURSE)["next_send_at"] == app_db.lesson_send_time(
+        resumed["start_date"], "08:00 AM", 2).strftime(app_db.DB_TIME_FORMAT)
+
+
+def test_web_process_removes_legacy_jobs_from_the_shared_store(app_db, tmp_path, monkeypatch):
+    from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    monkeypatch.setattr(app_db, "JOBSTORE_DB_PATH", str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(app_db, "_jobstore_writer", None)
+    job_id = f"{PHONE}_{COURSE}_day2_abcd1234"
+    # The worker's scheduler wrote the job; this process's scheduler never started
+    worker = BackgroundScheduler(jobstores={"default": SQLAlchemyJobStore(url=f"sqlite:///{tmp_path / 'jobs.sqlite'}")})
+    worker.start(paused=True)
+    worker.add_job(print, "date", run_date=datetime.now() + timedelta(days=1), id=job_id)
+    worker.shutdown(wait=False)
+    app_db.index_job(job_id)
+
+    assert app_db.remove_existing_jobs(PHONE, COURSE) == 1
+    assert app_db.count_stored_jobs() == 0
+    assert app_db.lookup_job_ids(PHONE, COURSE) == []
@@ -0,0 +1,27 @@
+def test_every_complete_day_is_parsed(app_db):
+    text = "=== DAY 3 ===\nLesson three\n\n=== DAY 4 ===\nLesson four\n=== END ==="
+
+    assert app_db.parse_lesson_batch(text, [3, 4]) == {3: "Lesson three", 4: "Lesson four"}
+
+
+def test_day_cut_off_by_max_tokens_is_dropped(app_db):
+    text = "=== DAY 3 ===\nLesson three\n=== DAY 4 ===\nLesson fo"
+
+    assert app_db.parse_lesson_batch(text, [3, 4]) == {3: "Lesson three"}
+
+
+def test_marker_variants_are_recognised(app_db):
+    text = "**=== Day 3 ===**\nLesson three\n## ==DAY 4==\nLesson four\n=== end ==="
+
+    assert app_db.parse_lesson_batch(text, [3, 4]) == {3: "Lesson three", 4: "Lesson four"}
+
+
+def test_unrequested_empty_and_repeated_days_are_ignored(app_db):
+    text = ("Intro the model added\n=== DAY 3 ===\nLesson three\n=== DAY 9 ===\nNot asked for\n"
+            "=== DAY 4 ===\n\n=== DAY 3 ===\nSecond copy\n=== END ===")
+
+    assert app_db.parse_lesson_batch(text, [3, 4]) == {3: "Lesson three"}
+
+
+def test_reply_without_markers_yields_nothing(app_db):
+    assert app_db.parse_lesson_batch("Day 3: a lesson without the requested markers", [3]) == {}
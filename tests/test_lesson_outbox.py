@@ -0,0 +1,242 @@
+import threading
+from concurrent.futures import wait
+
+import pytest
+
+PHONE = "+15550100"
+COURSE = "Python"
+
+
+def queue_lesson(app, bodies, day=1, total_days=3):
+    """Open a lesson and record its parts, as send_course_lesson does before sending"""
+    assert app.open_lesson_delivery(PHONE, COURSE, day, total_days) is None
+    app.record_lesson_parts(PHONE, COURSE, day, bodies, final=True)
+
+
+def send_all(app, bodies, day=1):
+    return [app.deliver_lesson_part(PHONE, COURSE, day, part, body) for part, body in enumerate(bodies, 1)]
+
+
+def track_queued_parts(app, monkeypatch):
+    """Collect the futures of parts queued on the outbound dispatcher"""
+    queued = []
+    queue = app.queue_lesson_part
+
+    def tracked(*args):
+        queued.append(queue(*args))
+        return queued[-1]
+
+    monkeypatch.setattr(app, "queue_lesson_part", tracked)
+    return queued
+
+
+def retry_and_wait(app, monkeypatch):
+    """Run the retry tick and wait for the parts it queued; a second tick finishes lessons they completed"""
+    queued = track_queued_parts(app, monkeypatch)
+    app.retry_lesson_outbox()
+    wait(queued)
+    app.retry_lesson_outbox()
+    return len(queued)
+
+
+def part_rows(app, day=1):
+    with app.db_connection() as conn:
+        return conn.execute(
+            "SELECT part, status, attempts, twilio_sid FROM lesson_outbox WHERE phone = ? AND course = ? AND day = ? "
+            "ORDER BY part", (PHONE, COURSE, day)
+        ).fetchall()
+
+
+def test_open_lesson_delivery_starts_a_lesson_once(app_db):
+    assert app_db.open_lesson_delivery(PHONE, COURSE, 1, 3) is None
+    assert app_db.open_lesson_delivery(PHONE, COURSE, 1, 3) == "sending"
+    assert app_db.open_lesson_delivery(PHONE, COURSE, 2, 3) is None
+
+
+def test_sent_parts_are_recorded_with_their_sid(app_db, whatsapp):
+    queue_lesson(app_db, ["one", "two"])
+
+    assert send_all(app_db, ["one", "two"]) == ["SM1", "SM2"]
+    assert [tuple(row) for row in part_rows(app_db)] == [(1, "sent", 1, "SM1"), (2, "sent", 1, "SM2")]
+
+
+def test_part_out_of_attempts_fails_the_lesson(app_db, whatsapp, monkeypatch):
+    monkeypatch.setattr(app_db, "OUTBOX_MAX_ATTEMPTS", 2)
+    queue_lesson(app_db, ["one"])
+    whatsapp.fail.add("one")
+
+    assert app_db.deliver_lesson_part(PHONE, COURSE, 1, 1, "one") is False
+    assert app_db.lesson_delivery_status(PHONE, COURSE, 1) == "sending"
+    assert app_db.deliver_lesson_part(PHONE, COURSE, 1, 1, "one") is False
+    assert app_db.lesson_delivery_status(PHONE, COURSE, 1) == "failed"
+    assert [tuple(row) for row in part_rows(app_db)] == [(1, "failed", 2, None)]
+
+
+def test_later_parts_are_held_behind_a_failed_part(app_db, whatsapp):
+    queue_lesson(app_db, ["one", "two", "three"])
+    whatsapp.fail.add("two")
+
+    assert send_all(app_db, ["one", "two", "three"]) == ["SM1", False, None]
+    assert whatsapp.sent == ["one"]
+    # The held part does not use up an attempt
+    assert [(row["status"], row["attempts"]) for row in part_rows(app_db)] == [("sent", 1), ("failed", 1), ("failed", 0)]
+
+
+def test_retry_resends_only_missing_parts_in_order(app_db, whatsapp, monkeypatch):
+    monkeypatch.setattr(app_db, "OUTBOX_RETRY_BASE_SECONDS", 0)
+    queue_lesson(app_db, ["one", "two", "three"])
+    whatsapp.fail.add("two")
+    send_all(app_db, ["one", "two", "three"])
+    whatsapp.fail.clear()
+
+    assert retry_and_wait(app_db, monkeypatch) == 2
+    assert whatsapp.sent == ["one", "two", "three"]
+    assert app_db.lesson_delivery_status(PHONE, COURSE, 1) == "delivered"
+    assert app_db.get_progress(PHONE, COURSE) == 1
+
+
+def test_retry_waits_out_the_backoff(app_db, whatsapp):
+    queue_lesson(app_db, ["one", "two"])
+    whatsapp.fail.add("one")
+    send_all(app_db, ["one", "two"])
+    whatsapp.fail.clear()
+
+    assert app_db.claim_retry_parts() == []
+    assert app_db.retry_lesson_outbox() == 0
+    assert whatsapp.sent == []
+
+
+def test_parts_of_a_stopped_lesson_are_not_sent(app_db, whatsapp, monkeypatch):
+    monkeypatch.setattr(app_db, "OUTBOX_RETRY_BASE_SECONDS", 0)
+    queue_lesson(app_db, ["one", "two"])
+    whatsapp.fail.add("two")
+    send_all(app_db, ["one", "two"])
+    whatsapp.fail.clear()
+    with app_db.db_connection() as conn:
+        conn.execute("UPDATE lesson_deliveries SET status = 'stopped'")
+
+    assert app_db.deliver_lesson_part(PHONE, COURSE, 1, 2, "two") is None
+    assert retry_and_wait(app_db, monkeypatch) == 0
+    assert whatsapp.sent == ["one"]
+
+
+def test_finish_lesson_delivery_needs_every_part(app_db, whatsapp):
+    queue_lesson(app_db, ["one", "two"])
+    app_db.deliver_lesson_part(PHONE, COURSE, 1, 1, "one")
+
+    assert app_db.finish_lesson_delivery(PHONE, COURSE, 1) is False
+    assert app_db.get_progress(PHONE, COURSE) == 0
+
+
+def test_finish_lesson_delivery_advances_progress_exactly_once(app_db, whatsapp):
+    queue_lesson(app_db, ["one", "two"])
+    send_all(app_db, ["one", "two"])
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(app_db.finish_lesson_delivery(PHONE, COURSE, 1)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False] * 7 + [True]
+    assert app_db.lesson_delivery_status(PHONE, COURSE, 1) == "delivered"
+    assert app_db.get_progress(PHONE, COURSE) == 1
+
+
+def test_recover_reconciles_unconfirmed_parts_with_twilio(app_db, whatsapp, monkeypatch):
+    with monkeypatch.context() as crashed:
+        crashed.setattr(app_db, "WORKER_ID", "crashed-worker")
+        queue_lesson(app_db, ["one", "two", "three"])
+        app_db.deliver_lesson_part(PHONE, COURSE, 1, 1, "one")
+        # The worker died after handing parts 2 and 3 to Twilio, before hearing back
+        app_db.start_part_send(PHONE, COURSE, 1, 2)
+    with app_db.db_connection() as conn:
+        conn.execute("UPDATE lesson_outbox SET status = 'sending', attempts = 1 WHERE part = 3")
+    monkeypatch.setattr(app_db, "find_sent_message", lambda phone, body, since: "SMtwilio" if body == "two" else None)
+
+    app_db.recover_orphaned_parts()
+
+    assert [(row["status"], row["twilio_sid"]) for row in part_rows(app_db)] == [
+        ("sent", "SM1"), ("sent", "SMtwilio"), ("failed", None)]
+    assert retry_and_wait(app_db, monkeypatch) == 1
+    assert whatsapp.sent == ["one", "three"]
+    assert app_db.get_progress(PHONE, COURSE) == 1
+
+
+def test_recover_leaves_live_workers_alone(app_db, whatsapp, monkeypatch):
+    queue_lesson(app_db, ["one"])
+    app_db.start_part_send(PHONE, COURSE, 1, 1)
+    monkeypatch.setattr(app_db, "find_sent_message", lambda *args: pytest.fail("looked up a live worker's part"))
+
+    app_db.recover_orphaned_parts()
+
+    assert part_rows(app_db)[0]["status"] == "sending"
+
+
+def test_lesson_interrupted_during_generation_is_generated_again(app_db, whatsapp, monkeypatch):
+    with monkeypatch.context() as crashed:
+        crashed.setattr(app_db, "WORKER_ID", "crashed-worker")
+        assert app_db.open_lesson_delivery(PHONE, COURSE, 1, 3) is None
+
+    app_db.recover_orphaned_parts()
+
+    assert app_db.lesson_delivery_status(PHONE, COURSE, 1) is None
+    assert app_db.open_lesson_delivery(PHONE, COURSE, 1, 3) is None
+
+
+def test_stream_interrupted_after_sending_is_resent_in_full(app_db, whatsapp, monkeypatch):
+    with monkeypatch.context() as crashed:
+        crashed.setattr(app_db, "WORKER_ID", "crashed-worker")
+        assert app_db.open_lesson_delivery(PHONE, COURSE, 1, 3) is None
+        app_db.record_lesson_parts(PHONE, COURSE, 1, ["one"])
+        app_db.deliver_lesson_part(PHONE, COURSE, 1, 1, "one")
+    monkeypatch.setattr(app_db, "generate_detailed_course_content", lambda course, day, total_days: "The whole lesson")
+    queued = track_queued_parts(app_db, monkeypatch)
+
+    app_db.recover_orphaned_parts()
+    wait(queued)
+    app_db.retry_lesson_outbox()
+
+    assert whatsapp.sent[0] == "one"
+    assert len(whatsapp.sent) == 2
+    assert whatsapp.sent[1].startswith(app_db.LESSON_RESUME_NOTE) and "The whole lesson" in whatsapp.sent[1]
+    assert app_db.lesson_delivery_status(PHONE, COURSE, 1) == "delivered"
+    assert app_db.get_progress(PHONE, COURSE) == 1
+
+
+def test_stream_breaking_off_is_followed_by_the_full_lesson(app_db, whatsapp, monkeypatch):
+    def stream(course, day, total_days):
+        yield "A section. " * 200 + "\n\n"  # more than one part, so part 1 goes out
+        yield "Another section"
+        raise ConnectionError("stream reset")
+
+    monkeypatch.setattr(app_db, "stream_course_content", stream)
+    monkeypatch.setattr(app_db, "generate_uncached_content", lambda course, day, total_days: "The whole lesson")
+    assert app_db.open_lesson_delivery(PHONE, COURSE, 1, 3) is None
+
+    futures = app_db.stream_lesson_parts(PHONE, COURSE, 1, 3, "Header\n\n", "Footer")
+    wait(futures)
+
+    assert len(futures) == 2
+    assert whatsapp.sent[0].startswith(app_db.part_header(1) + "Header")
+    assert whatsapp.sent[1].startswith(app_db.LESSON_RESUME_NOTE)
+    assert app_db.complete_lesson(PHONE, COURSE, 1, 3)
+
+
+def test_enrollment_waits_for_an_unsettled_lesson(app_db, whatsapp):
+    app_db.save_enrollment(PHONE, COURSE, 3, "2026-01-01", "08:00 AM", 1, "abcd1234")
+    row = app_db.get_enrollment(PHONE, COURSE)
+    queue_lesson(app_db, ["one", "two"])
+    whatsapp.fail.add("two")
+    send_all(app_db, ["one", "two"])
+
+    assert app_db.settle_enrollment(row) is False
+    assert app_db.get_enrollment(PHONE, COURSE)["next_day"] == 1
+
+    whatsapp.fail.clear()
+    app_db.deliver_lesson_part(PHONE, COURSE, 1, 2, "two")
+    assert app_db.finish_lesson_delivery(PHONE, COURSE, 1)
+    assert app_db.settle_enrollment(row) is True
+    assert app_db.get_enrollment(PHONE, COURSE)["next_day"] == 2
+
@@ -0,0 +1,62 @@
+import pytest
+
+EMOJI = "🎓"  # outside the BMP: two UTF-16 code units
+
+
+def test_message_length_counts_utf16_code_units(app_db):
+    assert app_db.message_length("abc") == 3
+    assert app_db.message_length(EMOJI) == 2
+    assert app_db.message_length("é") == 1
+
+
+def test_short_message_is_one_part_without_header(app_db):
+    assert app_db.split_long_message("Hello\n\nWorld") == ["Hello\n\nWorld"]
+
+
+@pytest.mark.parametrize("text", [
+    "\n\n".join(f"Section {i}. " + "Some words here. " * 20 for i in range(30)),
+    (EMOJI + " Emoji heavy line. ") * 400,
+    "x" * 5000,
+    EMOJI * 3000,
+])
+def test_every_part_fits_the_whatsapp_budget(app_db, text):
+    parts = app_db.split_long_message(text)
+
+    assert len(parts) > 1
+    assert all(app_db.message_length(part) <= app_db.WHATSAPP_MAX_LENGTH for part in parts)
+    assert all(part.startswith(app_db.part_header(i, len(parts))) for i, part in enumerate(parts, 1))
+
+
+def test_hard_split_never_cuts_a_surrogate_pair(app_db):
+    chunks = app_db.hard_split("a" + EMOJI * 10, 4)
+
+    assert "".join(chunks) == "a" + EMOJI * 10
+    assert all(app_db.message_length(chunk) <= 4 for chunk in chunks)
+
+
+def test_split_keeps_all_the_text_in_order(app_db):
+    sections = [f"Section {i}: " + "word " * 150 for i in range(12)]
+    parts = app_db.split_long_message("\n\n".join(sections))
+    bodies = [part.split("\n\n", 1)[1] for part in parts]
+
+    assert " ".join(" ".join(bodies).split()) == " ".join(" ".join(sections).split())
+
+
+def test_incremental_splitter_matches_the_budget_and_numbers_parts(app_db):
+    splitter = app_db.IncrementalSplitter()
+    text = "\n\n".join(f"Section {i}. " + EMOJI * 100 + " words " * 60 for i in range(10))
+    parts = []
+    for start in range(0, len(text), 37):
+        parts.extend(splitter.feed(text[start:start + 37]))
+    parts.extend(splitter.finish())
+
+    assert len(parts) > 1
+    assert all(app_db.message_length(part) <= app_db.WHATSAPP_MAX_LENGTH for part in parts)
+    assert all(part.startswith(app_db.part_header(i)) for i, part in enumerate(parts, 1))
+
+
+def test_incremental_splitter_leaves_a_short_message_whole(app_db):
+    splitter = app_db.IncrementalSplitter()
+
+    assert splitter.feed("Hello\n\n") == []
+    assert splitter.finish() == ["Hello"]
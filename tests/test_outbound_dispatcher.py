@@ -0,0 +1,22 @@
+import asyncio
+import time
+
+
+def test_tokens_taken_outside_the_queue_pace_queued_messages(app_db):
+    dispatcher = app_db.OutboundDispatcher(1, 100, 100, 2, 1)
+    # The async delivery engine takes its tokens from the same bucket
+    asyncio.run(app_db.acquire_token(dispatcher.recipient_bucket("+15550101")))
+
+    future = dispatcher.submit("+15550101", "hello", send=lambda to_phone, message, from_number: "SM1")
+
+    time.sleep(0.2)
+    assert not future.done()  # the recipient's only token is spent, the next one comes after 0.5s
+    assert future.result(timeout=2) == "SM1"
+
+
+def test_recipients_share_one_bucket_per_phone(app_db):
+    dispatcher = app_db.OutboundDispatcher(1, 100, 100, 1, 1)
+
+    assert dispatcher.recipient_bucket("+15550101") is dispatcher.recipient_bucket("+15550101")
+    assert dispatcher.recipient_bucket("+15550101") is not dispatcher.recipient_bucket("+15550102")
+    assert dispatcher.sender_bucket("whatsapp:+1") is dispatcher.sender_bucket("whatsapp:+1")
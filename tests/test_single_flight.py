@@ -0,0 +1,77 @@
+import threading
+import time
+
+
+def run_concurrently(count, target):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    return results
+
+
+def slow(value, calls):
+    def func():
+        calls.append(1)
+        time.sleep(0.2)  # long enough for every caller to join
+        return value
+    return func
+
+
+def test_concurrent_callers_share_one_call(app_db):
+    flight = app_db.SingleFlight()
+    calls = []
+
+    results = run_concurrently(8, lambda: flight.do("key", slow("lesson", calls)))
+
+    assert results == ["lesson"] * 8
+    assert len(calls) == 1
+    assert flight.calls == {}
+
+
+def test_none_from_the_leader_is_shared_without_retrying(app_db):
+    flight = app_db.SingleFlight()
+    calls = []
+
+    results = run_concurrently(8, lambda: flight.do("key", slow(None, calls)))
+
+    assert results == [None] * 8
+    assert len(calls) == 1
+
+
+def test_waiters_retry_after_the_leader_raises(app_db):
+    flight = app_db.SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def failing():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        raise ConnectionError("upstream down")
+
+    def leader():
+        try:
+            flight.do("key", failing)
+        except ConnectionError as e:
+            errors.append(e)
+
+    errors = []
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait(timeout=5)
+    result = flight.do("key", lambda: calls.append(1) or "lesson")
+    thread.join(timeout=5)
+
+    assert len(errors) == 1
+    assert result == "lesson"
+    assert len(calls) == 2
+
+
+def test_keys_are_independent(app_db):
+    flight = app_db.SingleFlight()
+
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
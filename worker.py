@@ -0,0 +1,86 @@
+"""Delivery worker entry point.
+
+    python worker.py              one worker, or with DELIVERY_SHARDS=K one
+                                  process per shard, restarted if they exit
+    python worker.py --web CMD…   the same, plus the web server command CMD
+                                  (e.g. gunicorn ...) on the same instance;
+                                  stops everything when CMD exits
+    python worker.py --shard N    only shard N (one per container/service,
+                                  which the platform must restart on exit)
+
+A worker exits when it loses its leader lease, so run it under this
+supervisor unless something else restarts it. SIGTERM and SIGINT are passed
+on to every child. Start as many copies as you like for failover; only the
+holder of each shard's leader lock delivers, the rest stand by. Workers must
+share the app and job store SQLite files with the web processes.
+"""
+import argparse
+import multiprocessing
+import signal
+import subprocess
+import sys
+import time
+
+import test
+
+SUPERVISOR_POLL_SECONDS = 2
+
+
+def handle_sigterm(signum, frame):
+    # Raise SystemExit in the main thread so run_worker releases the lock on the way out
+    sys.exit(0)
+
+
+def run_shard(shard):
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    test.run_worker(shard)
+
+
+def start_shard(context, shard):
+    name = "delivery-worker" if shard is None else f"delivery-shard-{shard}"
+    process = context.Process(target=run_shard, args=(shard,), name=name)
+    process.start()
+    return process
+
+
+def supervise(shards, web_command=None):
+    """Run one worker process per shard (a single unsharded one when shards is 1)
+    and restart any that exit until terminated; returns the web command's exit code"""
+    context = multiprocessing.get_context("spawn")
+    processes = {shard: start_shard(context, shard) for shard in (range(shards) if shards > 1 else [None])}
+    test.logger.info(f"🧩 Supervising {len(processes)} delivery worker processes")
+    web = subprocess.Popen(web_command) if web_command else None
+    try:
+        while True:
+            time.sleep(SUPERVISOR_POLL_SECONDS)
+            if web is not None and web.poll() is not None:
+                test.logger.error(f"❌ Web server exited with {web.returncode}, stopping the workers")
+                return web.returncode
+            for shard, process in processes.items():
+                if not process.is_alive():
+                    label = "Worker" if shard is None else f"Shard {shard}"
+                    test.logger.warning(f"⚠️ {label} exited with {process.exitcode}, restarting")
+                    processes[shard] = start_shard(context, shard)
+    finally:
+        if web is not None and web.poll() is None:
+            web.terminate()
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+        if web is not None:
+            web.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lesson delivery worker")
+    parser.add_argument("--shard", type=int, help="deliver only this shard (0..DELIVERY_SHARDS-1)")
+    parser.add_argument("--web", nargs=argparse.REMAINDER,
+                        help="web server command to run and stop alongside the workers (must come last)")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    if args.shard is not None:
+        test.run_worker(args.shard)
+    else:
+        sys.exit(supervise(test.DELIVERY_SHARDS, args.web) or 0)